@@ -10,20 +10,308 @@ __license__ = 'MIT'
 
 
 import os
-import re  
-import inspect
-import pkg_resources
+import re
+import ast
+import json
+import hashlib
+import sqlite3
+import time
+import html
+import lzma
+import mmap
+import struct
 import importlib
+import importlib.machinery
+import importlib.util
 import argparse
-import pyfiglet
 import sys
-import warnings
-from typing import List
+import sysconfig
+import threading
+import contextlib
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, groupby
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
 import shutil
-from colorama import Fore, Style
-import requests
-import networkx as nx
-import matplotlib.pyplot as plt
+
+
+SUSPECT_IMPORTS = ['eval', 'exec', 'pickle', 'marshal', 'shelve', 'os.system', 'subprocess', 'socket', 'requests',
+                   'urllib.request', 'urllib.parse', 'urllib.error', 'urllib.robotparser', 'http.client',
+                   'ftplib', 'poplib', 'imaplib', 'nntplib', 'smtplib', 'smtpd', 'telnetlib', 'uuid', 'hashlib',
+                   'hmac', 'secrets', 'ssl', 'py_compile', 'compileall', 'dis', 'pickletools', 'codecs', 'encodings',
+                   'zipimport', 'pkgutil', 'modulefinder', 'runpy', 'imp', 'importlib', 'bash', 'sh', 'zsh', 'csh',
+                   'tcsh', 'pwsh', 'powershell', 'cmd', 'mshta', 'rundll32', 'regsvr32', 'regasm', 'wscript',
+                   'cscript', 'msbuild', 'msxsl', 'msdeploy', 'msdt', 'msiexec'
+]
+
+
+class SuspectMatch(NamedTuple):
+    """One occurrence of a suspect string in a source file
+
+    The offset is in characters, or in bytes for the files scanned through
+    mmap or classified. kind and scope are only set by classify_suspects.
+    """
+    suspect: str
+    offset: int
+    line_number: int
+    line: str
+    true_positive: bool
+    kind: str = None
+    scope: str = None
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """Build a regex alternation factored as a prefix trie
+
+    At every position the pattern matches the longest word starting there.
+
+    Args:
+        words (List[str]): words to match
+
+    Returns:
+        str: regex pattern
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def to_pattern(node: dict) -> str:
+        branches = [re.escape(char) + to_pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if '' in node:
+            return "(?:" + body + ")?"
+        return body
+
+    return to_pattern(trie)
+
+
+class SuspectMatcher:
+    """Find every suspect string of a list in a single pass over a text
+
+    The suspects are compiled once into a trie shaped regex wrapped in a
+    lookahead, so overlapping occurrences (``sh`` inside ``shelve``) are
+    all reported, exactly like a per-suspect ``str.find`` loop would.
+    """
+
+    def __init__(self, suspects: List[str]):
+        self.suspects = list(dict.fromkeys(suspects))
+        pattern = "(?=(" + _trie_pattern(self.suspects) + "))"
+        self._regex = re.compile(pattern)
+        self._bytes_regex = re.compile(pattern.encode())
+        # Longest encoded suspect, a match starting in a chunk may end that far after it
+        self.max_length = max((len(suspect.encode()) for suspect in self.suspects), default=0)
+        # Every suspect which is a prefix of the longest match starts at the same offset
+        self._prefixes = {
+            suspect: sorted((other for other in self.suspects if other != suspect and suspect.startswith(other)),
+                            key=len, reverse=True)
+            for suspect in self.suspects
+        }
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield every (offset, suspect) occurrence in the text, ordered by offset
+
+        Args:
+            text (str): text to scan
+
+        Returns:
+            Iterator[Tuple[int, str]]: offsets and suspects
+        """
+        for match in self._regex.finditer(text):
+            longest = match.group(1)
+            yield match.start(), longest
+            for prefix in self._prefixes[longest]:
+                yield match.start(), prefix
+
+    def finditer_buffer(self, buffer, pos: int, endpos: int) -> Iterator[Tuple[int, str]]:
+        """Yield every (offset, suspect) occurrence starting in buffer[pos:endpos], ordered by offset
+
+        Works on bytes, mmap or any buffer without decoding it, suspects
+        starting before endpos are matched up to max_length bytes after it.
+
+        Args:
+            buffer: bytes-like object to scan
+            pos (int): first offset
+            endpos (int): offset after the last one
+
+        Returns:
+            Iterator[Tuple[int, str]]: byte offsets and suspects
+        """
+        for match in self._bytes_regex.finditer(buffer, pos, min(len(buffer), endpos + self.max_length)):
+            if match.start() >= endpos:
+                break
+            longest = match.group(1).decode()
+            yield match.start(), longest
+            for prefix in self._prefixes[longest]:
+                yield match.start(), prefix
+
+    def find_all(self, text: str) -> List[SuspectMatch]:
+        """Find all suspects in the text, grouped by suspect then ordered by offset
+
+        Args:
+            text (str): text to scan
+
+        Returns:
+            List[SuspectMatch]: list of matches
+        """
+        line_starts = line_index(text)
+        by_suspect = {}
+        for offset, suspect in self.finditer(text):
+            by_suspect.setdefault(suspect, []).append(offset)
+
+        matches = []
+        for suspect in self.suspects:
+            for offset in by_suspect.get(suspect, ()):
+                end = offset + len(suspect)
+                line_number = bisect_right(line_starts, offset)
+                line_end = text.find('\n', offset)
+                line = text[line_starts[line_number - 1]:line_end if line_end != -1 else len(text)]
+                true_positive = (offset == 0 or not text[offset - 1].isalpha()) and \
+                                (end == len(text) or not text[end].isalpha())
+                matches.append(SuspectMatch(suspect, offset, line_number, line.strip(), true_positive))
+        return matches
+
+
+def line_index(text: str) -> List[int]:
+    """Return the offset of the start of every line of the text
+
+    Args:
+        text (str): text to index
+
+    Returns:
+        List[int]: offsets, the line number of an offset is its bisect_right position
+    """
+    return [0] + [match.end() for match in re.finditer('\n', text)]
+
+
+def source_line_starts(source: bytes) -> List[int]:
+    """Return the offset of the start of every line of a Python source, lines ending as ast ends them
+
+    A lone \r ends a line as \n and \r\n do, so the line numbers of the
+    nodes of a CR-only file point at the right bytes.
+
+    Args:
+        source (bytes): content of the file
+
+    Returns:
+        List[int]: offsets, the line number of an offset is its bisect_right position
+    """
+    return list(accumulate(map(len, source.splitlines(keepends=True)), initial=0))
+
+
+def group_by_suspect(matches: List[SuspectMatch]) -> List[Tuple[str, List[SuspectMatch]]]:
+    """Group consecutive matches of the same suspect
+
+    Args:
+        matches (List[SuspectMatch]): matches as returned by SuspectMatcher.find_all
+
+    Returns:
+        List[Tuple[str, List[SuspectMatch]]]: suspects with their matches
+    """
+    return [(suspect, list(group)) for suspect, group in groupby(matches, key=lambda match: match.suspect)]
+
+
+class RunStats:
+    """Wall and CPU time of the phases of a run, with counters of the work done
+
+    Phases nest and repeat, their times add up. A single instance, STATS,
+    is filled by the scanning functions and reported by --stats.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.sources = []
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Time the block as a phase
+
+        Args:
+            name (str): name of the phase
+        """
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            totals = self.phases.setdefault(name, [0.0, 0.0, 0])
+            totals[0] += time.perf_counter() - wall
+            totals[1] += time.process_time() - cpu
+            totals[2] += 1
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Add to a counter
+
+        Args:
+            name (str): name of the counter
+            amount (int, optional): value added. Defaults to 1.
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def watch(self, name: str, source: object, attribute: str) -> None:
+        """Report a counter kept by another object, read when the stats are reported
+
+        Args:
+            name (str): name of the counter
+            source (object): object holding the counter, None is ignored
+            attribute (str): attribute of the counter
+        """
+        if source is not None:
+            self.sources.append((name, source, attribute))
+
+    def to_dict(self) -> dict:
+        """Return the stats as a JSON serializable dict
+
+        Returns:
+            dict: total times, phases and counters, with the hit rates of the caches
+        """
+        for name, source, attribute in self.sources:
+            self.counters[name] = getattr(source, attribute)
+        rates = {}
+        for cache in ('index', 'pypi_cache'):
+            hits = self.counters.get(f"{cache}_hits", 0)
+            lookups = hits + self.counters.get(f"{cache}_misses", 0)
+            if lookups:
+                rates[f"{cache}_hit_rate"] = hits / lookups
+        return {
+            'version': __version__,
+            'wall': time.perf_counter() - self.started,
+            'cpu': time.process_time() - self.cpu_started,
+            'phases': {name: {'wall': wall, 'cpu': cpu, 'calls': calls}
+                       for name, (wall, cpu, calls) in self.phases.items()},
+            'counters': dict(self.counters, **rates),
+        }
+
+    def print_summary(self) -> None:
+        """Print the phases and counters as a table"""
+        stats = self.to_dict()
+        print("\n\033[1m Phase                        Wall (s)    CPU (s)  Calls\033[0m")
+        for name, phase in sorted(stats['phases'].items(), key=lambda item: -item[1]['wall']):
+            print(f" {name:<26} {phase['wall']:10.3f} {phase['cpu']:10.3f} {phase['calls']:6}")
+        print(f" {'total':<26} {stats['wall']:10.3f} {stats['cpu']:10.3f}")
+        print("\n\033[1m Counter                      Value\033[0m")
+        for name, value in sorted(stats['counters'].items()):
+            print(f" {name:<26} {value:>10.1%}" if name.endswith('_rate') else f" {name:<26} {value:>10}")
+
+    def write(self, path: str) -> None:
+        """Write the stats as JSON
+
+        Args:
+            path (str): path of the file
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+
+STATS = RunStats()
+
 
 def parse_arguments():
     """Parse the arguments of the program
@@ -36,16 +324,98 @@ def parse_arguments():
                         help='Level of restriction of the program')
     parser.add_argument('-r', '--requirement', action='store_true',
                         help='Create a requirement.txt file with all the import found in the project')
+    parser.add_argument('--lock', nargs='?', const=LOCK_FILE, default=None, metavar='FILE',
+                        help='Write the imported distributions and all their dependencies, pinned to the installed '
+                             'versions (default: %(const)s)')
     parser.add_argument('-b', '--ascii_art', action='store_true',
                         help='Print banner of the program')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='Do not clear the screen nor print the startup banner')
     parser.add_argument('-s', '--delete_red_flag', action='store_true',
                         help='Delete all red flag import in files')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='With -s, print the removals as a unified diff instead of writing the files')
     parser.add_argument('-a', '--analyze_sources', action='store_true',
                         help='Analyze the source code of the project')
+    parser.add_argument('--report-format', choices=list(REPORT_FORMATS), default='html',
+                        help='Format of the -a report: one page, index with one page per file, JSON Lines or SARIF '
+                             '(default: %(default)s)')
+    parser.add_argument('--report-output', default=None,
+                        help='Path of the -a report (default: report.html, report/, findings.jsonl or findings.sarif)')
+    parser.add_argument('--semantic', action='store_true',
+                        help='With -a, tell imports, calls, attributes, strings and comments apart in Python files. '
+                             'Every Python file with a suspect is parsed, a first scan is about 3 to 4 times slower '
+                             'than the plain one, later scans only parse the changed files')
+    parser.add_argument('--mmap-threshold', type=int, default=MMAP_THRESHOLD, metavar='BYTES',
+                        help='Files of -a from this size are scanned through mmap with bounded memory, '
+                             '0 for every file (default: %(default)s)')
     parser.add_argument('-p', '--request_pypi', action='store_true',
                         help='Search the import on pypi')
+    parser.add_argument('--pypi-url', default=PYPI_URL,
+                        help='Base URL of the package index searched by -p (default: %(default)s)')
+    parser.add_argument('--pypi-concurrency', type=int, default=8,
+                        help='Number of concurrent requests sent by -p (default: %(default)s)')
+    parser.add_argument('--offline', action='store_true',
+                        help='Check -p against the local snapshot of PyPI names instead of the network')
+    parser.add_argument('--pypi-index', default=None,
+                        help='Path of the snapshot of PyPI names (default: <cache-dir>/pypi-names.idx)')
+    parser.add_argument('--build-pypi-index', metavar='SOURCE', default=None,
+                        help='Build the snapshot of PyPI names from a dumped simple index, JSON or text list, '
+                             'then exit')
     parser.add_argument('-g', '--graph', action='store_true',
-                        help='Generate a graph of the project')
+                        help='Show the module import graph of the project')
+    parser.add_argument('--graph-output', default=None,
+                        help='Write the import graph to this file instead of showing it (no matplotlib needed)')
+    parser.add_argument('--collapse-depth', type=int, default=None,
+                        help='Merge the project modules of the graph into their packages at this depth')
+    parser.add_argument('--graph-labels', type=int, default=200,
+                        help='Number of most imported modules labelled by -g (default: %(default)s)')
+    parser.add_argument('--graph-format', choices=['dot', 'graphml', 'json'], default=None,
+                        help='Format of --graph-output (default: from its extension)')
+    parser.add_argument('--path', nargs='+', default=None, metavar='ROOT',
+                        help='Roots of the project to scan (default: the folder of this program)')
+    parser.add_argument('--exclude', action='append', default=[], metavar='PATTERN',
+                        help='Leave out the files and folders matching this .gitignore style pattern, repeatable')
+    parser.add_argument('--exclude-from', action='append', default=[], metavar='FILE',
+                        help='Read --exclude patterns from a .gitignore style file, repeatable')
+    parser.add_argument('--max-file-size', type=int, default=None, metavar='BYTES',
+                        help='Skip the files larger than this size')
+    parser.add_argument('--follow-symlinks', action='store_true',
+                        help='Walk into symlinked folders, each real folder is walked once')
+    parser.add_argument('--walk-threads', type=int, default=WALK_THREADS,
+                        help='Folders listed concurrently, 1 to walk sequentially (default: %(default)s)')
+    parser.add_argument('--export-index', default=None, metavar='FILE',
+                        help='Write every imported top level module with its count and importing files as JSON')
+    parser.add_argument('--probe-timeout', type=float, default=PROBE_TIMEOUT, metavar='SECONDS',
+                        help='Time a module may take to import in a probe worker (default: %(default)s)')
+    parser.add_argument('--probe-memory', type=int, default=PROBE_MEMORY_LIMIT // (1024 * 1024), metavar='MIB',
+                        help='Memory limit of a probe worker (default: %(default)s)')
+    parser.add_argument('--watch', nargs='?', type=float, const=1.0, default=None, metavar='SECONDS',
+                        help='Keep running, update the imports of the changed files every SECONDS (default: %(const)s) '
+                             'with the asked -r, --export-index and --graph-output, and answer --query')
+    parser.add_argument('--batch', default=None, metavar='FILE',
+                        help='Scan every project listed in FILE (one root per line, - for stdin) with one process '
+                             'per project, and summarize suspects, version skew and unknown modules across them')
+    parser.add_argument('--batch-output', default=BATCH_OUTPUT, metavar='FILE',
+                        help='Results of every project and summary of --batch (default: %(default)s)')
+    parser.add_argument('--query', nargs='+', default=None, metavar=('COMMAND', 'ARGUMENT'),
+                        help=f"Ask the running --watch: {', '.join(WATCH_COMMANDS)}, then exit")
+    parser.add_argument('--socket', default=None,
+                        help='Socket of --watch and --query (default: <cache-dir>/watch.sock)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of processes used to parse the project (default: number of CPUs)')
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help='Folder of the persistent scan index (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Parse and analyze every file again without using the scan index')
+    parser.add_argument('--store-only', action='store_true',
+                        help='Keep the sources dumped by -d in the compressed store only, -a reads them from it')
+    parser.add_argument('--stats', nargs='?', const='stats.json', default=None, metavar='FILE',
+                        help='Print the time and work of each phase and write them as JSON (default: %(const)s)')
+    parser.add_argument('--profile', choices=['cprofile', 'tracemalloc'], default=None,
+                        help='Run under cProfile or tracemalloc and dump the profile')
+    parser.add_argument('--profile-output', default=None,
+                        help='File of the dumped profile (default: importanal.prof or importanal.tracemalloc)')
     parser.add_argument('-v', '--version', action='version', version='%(prog)s {version}'.format(version=__version__),
                         help='Print the version of the program')
     
@@ -53,575 +423,4753 @@ def parse_arguments():
     return parser.parse_args()
 
 
-def request_pypi(modules: list) -> None:
-    """Search the import on pypi
+PYPI_URL = os.environ.get("IMPORTANAL_PYPI_URL", "https://pypi.org")
+PYPI_CACHE_FILE = "pypi.json"
+PYPI_CACHE_TTL = 24 * 60 * 60
 
-    Args:
-        modules (list): list of modules
 
-    Returns:
-        _type_: None
+class PypiClient:
+    """Check the existence of projects on a PyPI compatible index
+
+    Lookups run on a bounded thread pool sharing one pooled session, are
+    retried with exponential backoff, and definitive answers are kept in an
+    on-disk cache for ttl seconds.
     """
-    not_found_modules = []
-    nativ_modules_python = []
-    # Add every nativ module present by nature
-    for module in sys.builtin_module_names:
-        nativ_modules_python.append(module)
 
-    
-    print("Checking on both get_distribution and pypi...")
-    for module in modules:
-        try:
-            package = pkg_resources.get_distribution(module)
-        except pkg_resources.DistributionNotFound:
-            not_found_modules.append(module)        
+    def __init__(self, base_url: str = PYPI_URL, concurrency: int = 8, timeout: float = 10.0, retries: int = 3,
+                 backoff: float = 0.5, cache_path: str = None, ttl: float = PYPI_CACHE_TTL):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.requests_sent = 0
+        self._requests_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._session = None
+        self._cache = self._load_cache()
 
-    for module in not_found_modules:
+    def _load_cache(self) -> dict:
+        if not self.cache_path:
+            return {}
         try:
-            url = "https://pypi.org/project/{module}/".format(module=module)
-            r = requests.get(url)
-            if r.status_code == 200:
-                pass
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self) -> None:
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        with open(self.cache_path, 'w') as f:
+            json.dump(self._cache, f)
+
+    @property
+    def session(self):
+        """Session shared by the worker threads, its connection pool fits the concurrency"""
+        if self._session is None:
+            import requests
+            import requests.adapters
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+        return self._session
+
+    def exists(self, name: str) -> bool:
+        """Ask the index whether a project exists
+
+        Args:
+            name (str): project name
+
+        Returns:
+            bool: True or False, None when the index could not answer
+        """
+        import requests
+        url = f"{self.base_url}/pypi/{normalize_name(name)}/json"
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                # exists runs on the worker threads of exists_many
+                with self._requests_lock:
+                    self.requests_sent += 1
+                # Only the status is needed, the body is never downloaded
+                with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                    status = response.status_code
+            except requests.RequestException:
+                continue
+            if status == 200:
+                return True
+            if status == 404:
+                return False
+            if status != 429 and status < 500:
+                return None
+        return None
+
+    def exists_many(self, names: List[str]) -> Dict[str, bool]:
+        """Check every unique name, concurrently and through the cache
+
+        Args:
+            names (List[str]): project names, duplicates allowed
+
+        Returns:
+            Dict[str, bool]: answer of each name, None when the index could not answer
+        """
+        now = time.time()
+        results = {}
+        missing = []
+        for name in dict.fromkeys(names):
+            cached = self._cache.get(normalize_name(name))
+            if cached is not None and now - cached[1] < self.ttl:
+                results[name] = cached[0]
+                self.cache_hits += 1
             else:
-                if module in nativ_modules_python:
-                    print(f"\033[32m{module.ljust(30)} is a nativ module")
-                    # Remove this import from the list
-                    modules.remove(module)
-                else:
-                    print(f"\033[31m{module.ljust(30)} is not found on both get_distribution and pypi.org")
-        except:
-            print(f"\033[31mERROR: {module.ljust(30)}")
+                missing.append(name)
+        self.cache_misses += len(missing)
 
+        if missing:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for name, exists in zip(missing, executor.map(self.exists, missing)):
+                    results[name] = exists
+                    if exists is not None:
+                        self._cache[normalize_name(name)] = [exists, now]
+            self._save_cache()
+        return results
 
-def get_imports(path: str) -> list:
-    """Returns a list of import paths   
 
-    Args:
-        path: path of the project
+PYPI_INDEX_FILE = "pypi-names.idx"
 
-    Returns:
-        _type_: list
+
+class PypiNameIndex:
+    """Offline snapshot of the project names of PyPI, memory-mapped
+
+    The file holds the sorted normalized names behind a table of offsets,
+    a membership check is a binary search over the mapping and never reads
+    more than a few pages.
+
+    Layout: MAGIC, count (uint32), count + 1 offsets (uint64), names (utf-8).
     """
 
-    imports = []
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            if file.endswith(".py"):
-                file_path = os.path.join(root, file)
-                with open(file_path, 'r') as f:
-                    file_imports = []
-                    for line in f:
-                        match = re.match(r'import\s(\w+)', line)
-                        if match:
-                            file_imports.append(match.group(1))
-                        match = re.match(r'from\s(\w+)\simport\s\*', line)
-                        if match:
-                            file_imports.append(match.group(1))
-                    imports.append((file_imports, root, file))
-    return imports
+    MAGIC = b"IAPYPI1\n"
 
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mapping[:len(self.MAGIC)] != self.MAGIC:
+            self._mapping.close()
+            raise ValueError(f"{path} is not a PyPI name index")
+        self._count, = struct.unpack_from('<I', self._mapping, len(self.MAGIC))
+        self._offsets = len(self.MAGIC) + 4
+        self._names = self._offsets + 8 * (self._count + 1)
 
-def get_versions(modules: list) -> dict:
-    """Get the version of all the modules
+    def __len__(self) -> int:
+        return self._count
+
+    def _name(self, position: int) -> bytes:
+        start, end = struct.unpack_from('<QQ', self._mapping, self._offsets + 8 * position)
+        return self._mapping[self._names + start:self._names + end]
+
+    def __contains__(self, name: str) -> bool:
+        key = normalize_name(name).encode()
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low < self._count and self._name(low) == key
+
+    def exists_many(self, names: List[str]) -> Dict[str, bool]:
+        """Check every unique name against the snapshot, same interface as PypiClient
+
+        Args:
+            names (List[str]): project names, duplicates allowed
+
+        Returns:
+            Dict[str, bool]: answer of each name
+        """
+        return {name: name in self for name in dict.fromkeys(names)}
+
+    def close(self) -> None:
+        """Unmap the snapshot"""
+        self._mapping.close()
+
+    @classmethod
+    def build(cls, names: List[str], path: str) -> int:
+        """Write a compact snapshot of the names, atomically replacing the previous one
+
+        Args:
+            names (List[str]): project names, in any order and normalization
+            path (str): path of the snapshot
+
+        Returns:
+            int: number of unique names written
+        """
+        encoded = sorted({normalize_name(name).encode() for name in names if name.strip()})
+        offsets = [0]
+        for name in encoded:
+            offsets.append(offsets[-1] + len(name))
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(cls.MAGIC)
+            f.write(struct.pack('<I', len(encoded)))
+            f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+            f.write(b''.join(encoded))
+        os.replace(temporary_path, path)
+        return len(encoded)
+
+
+def read_project_names(source_path: str) -> List[str]:
+    """Read the project names of a dumped index
+
+    Accepts the HTML simple index (/simple/), its JSON form (PEP 691) or a
+    plain text list with one name per line.
 
     Args:
-        modules (list): list of modules
+        source_path (str): path of the dump
 
     Returns:
-        _type_: dict
+        List[str]: project names
     """
-    versions = {}
-    for module in modules:
-        try:
-            package = pkg_resources.get_distribution(module)
-            versions[module] = package.version
-        except pkg_resources.DistributionNotFound:
-            versions[module] = None
-    return versions
+    with open(source_path, 'r', encoding='utf-8', errors='replace') as f:
+        content = f.read()
+    stripped = content.lstrip()
+    if stripped.startswith(('{', '[')):
+        data = json.loads(content)
+        projects = data.get('projects', []) if isinstance(data, dict) else data
+        return [project['name'] if isinstance(project, dict) else project for project in projects]
+    if '<a' in content:
+        return [html.unescape(name).strip() for name in re.findall(r"<a\b[^>]*>([^<]+)</a>", content)]
+    return [line.strip() for line in content.splitlines() if line.strip() and not line.startswith('#')]
+
 
-def build_requirement_file(modules: list) -> None:
-    """Build a requirement.txt file with all the modules and their versions
+def request_pypi(modules: list, distributions: 'DistributionIndex' = None, client: PypiClient = None,
+                 resolver: 'ModuleResolver' = None) -> list:
+    """Search on pypi the imports which are not installed
+
+    Built-in, standard library and project modules are never queried.
 
     Args:
         modules (list): list of modules
+        distributions (DistributionIndex, optional): installed distributions
+        client (PypiClient, optional): client of the index, or a PypiNameIndex to check offline
+        resolver (ModuleResolver, optional): shared resolver
 
     Returns:
-        _type_: None
+        _type_: list of the modules found neither installed nor on pypi
     """
-    versions = get_versions(modules)
-    modules_with_versions = [(module, version) for module, version in versions.items() if version]
-    modules_without_versions = [(module, version) for module, version in versions.items() if not version]
-    
-    sorted_modules_with_versions = sorted(modules_with_versions, key=lambda x: x[0])
-    sorted_modules_without_versions = sorted(modules_without_versions, key=lambda x: x[0])
-    
-    with open('requirements.txt', 'w') as f:
-        for module, version in sorted_modules_with_versions:
-            f.write(f"{module}=={version}\n")
-        for module, version in sorted_modules_without_versions:
-            f.write(f"{module}\n")
+    distributions = distributions or distribution_index()
+    client = client or PypiClient()
+    resolver = resolver or default_resolver()
+
+    print("Checking on both installed distributions and pypi...")
+    not_found_modules = [module for module in dict.fromkeys(modules)
+                         if resolver.resolve(module).kind not in PROVIDED_KINDS
+                         and distributions.for_module(module) is None]
+
+    unknown_modules = []
+    for module, exists in client.exists_many(not_found_modules).items():
+        if exists:
+            continue
+        if exists is None:
+            print(f"\033[31mERROR: {module.ljust(30)}")
+        else:
+            print(f"\033[31m{module.ljust(30)} is not found on both installed distributions and pypi.org")
+            unknown_modules.append(module)
+    return unknown_modules
+
 
+CACHE_DIR = ".importanal_cache"
+INDEX_FILE = "index.sqlite"
+# Bumped whenever the payload of a kind of result changes, the index built before is then cleared
+INDEX_SCHEMA = 2
+# Seconds a process waits for another one writing the index, the workers of --batch share it
+INDEX_TIMEOUT = 120.0
 
 
+class IndexEntry(NamedTuple):
+    """A row of the scan index"""
+    fresh: bool
+    digest: str
+    payload: str
 
-def delete_module_not_found(modules: List[str]) -> List[str]:
-    """Delete all module which are 'ModuleNotFoundError'
+
+def file_digest(content: bytes) -> str:
+    """Hash the content of a file for the scan index
 
     Args:
-        modules (List[str]): list of modules
+        content (bytes): content of the file
 
     Returns:
-        List[str]: list of modules
+        str: hex digest
     """
-    for module in modules:
-        try:
-            importlib.import_module(module)
-        except ModuleNotFoundError:
-            modules.remove(module)
-    return modules
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
 
 
-def get_source_code(module: str) -> None:
-    """Get the source code of a module
+def index_signature(suspects: List[str], mmap_threshold: int = None) -> str:
+    """Signature of everything a cached result depends on besides the file itself
 
     Args:
-        module (str): module name
+        suspects (List[str]): suspect list used for the findings
+        mmap_threshold (int, optional): size from which files are scanned through mmap, their
+            findings have byte offsets and lines cut at MAX_LINE_DISPLAY. Defaults to MMAP_THRESHOLD.
 
     Returns:
-        _type_: None
+        str: hex digest
     """
-    if module in sys.builtin_module_names:
-        print(f"{module} is a built-in module")
-        return
+    mmap_threshold = MMAP_THRESHOLD if mmap_threshold is None else mmap_threshold
+    key = "\n".join([__version__, str(INDEX_SCHEMA), str(mmap_threshold), str(MAX_LINE_DISPLAY)] + list(suspects))
+    return hashlib.sha256(key.encode()).hexdigest()
 
-    os.makedirs("SourceCode", exist_ok=True)
-    source_file = f"SourceCode/source_import_{module}.txt"
-    try:
-        with open(source_file, 'w') as f:
-            f.write(inspect.getsource(importlib.import_module(module)))
 
-    except OSError:
-        print(f"Cannot write source code of {module} to {source_file}")
+class ScanIndex:
+    """On-disk SQLite index of per-file results keyed by path, mtime, size and content hash
 
-    except TypeError:
-        print("\n")
-        print("=====================================================")
-        print(f"/!\ Cannot get source code of {module}")
-        print("=====================================================")
-        with open(source_file, 'w') as f:
-            f.write("Careful, the source code of this module is not available.")
+    Rows are grouped by kind ('imports', 'findings'). The whole index is
+    cleared when its signature (analyzer version, schema, suspect list)
+    differs from the one it was built with. The database is journaled in
+    WAL mode, so processes sharing it read while another one writes.
+    """
 
+    def __init__(self, db_path: str, signature: str, timeout: float = INDEX_TIMEOUT):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(db_path, timeout=timeout)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT, path TEXT, mtime_ns INTEGER, size INTEGER, digest TEXT, payload TEXT,
+                PRIMARY KEY (kind, path)
+            );
+        """)
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        if row is None or row[0] != signature:
+            with self.connection:
+                self.connection.execute("DELETE FROM entries")
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (signature,))
+        self._pending = []
+        self.hits = 0
+        self.misses = 0
 
-def analyze_source_code(path: str) -> None:
-    """Analyze the source code of the project
+    def lookup(self, kind: str, path: str, stat: os.stat_result):
+        """Return the entry of a file, fresh when its mtime and size did not change
+
+        Args:
+            kind (str): kind of result
+            path (str): path of the file
+            stat (os.stat_result): current stat of the file
+
+        Returns:
+            IndexEntry: the entry, None when the file is not indexed
+        """
+        row = self.connection.execute("SELECT mtime_ns, size, digest, payload FROM entries WHERE kind = ? AND path = ?",
+                                      (kind, os.path.abspath(path))).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        fresh = row[0] == stat.st_mtime_ns and row[1] == stat.st_size
+        if fresh:
+            self.hits += 1
+        return IndexEntry(fresh, row[2], row[3])
+
+    def lookup_digest(self, kind: str, path: str, digest: str) -> str:
+        """Return the result of a file whose content hash is already known
+
+        Args:
+            kind (str): kind of result
+            path (str): path of the file
+            digest (str): content hash of the file
+
+        Returns:
+            str: the payload, None when the file is not indexed with this content
+        """
+        row = self.connection.execute("SELECT payload FROM entries WHERE kind = ? AND path = ? AND digest = ?",
+                                      (kind, os.path.abspath(path), digest)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def store(self, kind: str, path: str, mtime_ns: int, size: int, digest: str, payload: str) -> None:
+        """Queue a result, written on the next flush
+
+        Args:
+            kind (str): kind of result
+            path (str): path of the file
+            mtime_ns (int): mtime of the file when it was read
+            size (int): size of the file when it was read
+            digest (str): content hash of the file
+            payload (str): serialized result
+        """
+        self._pending.append((kind, os.path.abspath(path), mtime_ns, size, digest, payload))
+
+    def prune(self, kind: str, root: str, seen: List[str]) -> None:
+        """Forget the files below root which have not been seen by the last walk
+
+        Args:
+            kind (str): kind of result
+            root (str): walked folder
+            seen (List[str]): files found by the walk
+        """
+        root = os.path.join(os.path.abspath(root), '')
+        seen = {os.path.abspath(path) for path in seen}
+        rows = self.connection.execute("SELECT path FROM entries WHERE kind = ? AND substr(path, 1, ?) = ?",
+                                       (kind, len(root), root)).fetchall()
+        with self.connection:
+            self.connection.executemany("DELETE FROM entries WHERE kind = ? AND path = ?",
+                                        [(kind, path) for path, in rows if path not in seen])
+
+    def flush(self) -> None:
+        """Write the queued results"""
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", self._pending)
+        self._pending = []
+
+    def close(self) -> None:
+        """Flush and close the index"""
+        self.flush()
+        self.connection.close()
+
+
+def open_scan_index(cache_dir: str, mmap_threshold: int = None):
+    """Open the scan index of a cache folder
 
     Args:
-        path (str): path of the project
+        cache_dir (str): cache folder, None to disable the index
+        mmap_threshold (int, optional): size from which files are scanned through mmap. Defaults to MMAP_THRESHOLD.
 
     Returns:
-        _type_: None
+        ScanIndex: the index, None when disabled
     """
-    suspect_imports = ['eval', 'exec', 'pickle', 'marshal', 'shelve', 'os.system', 'subprocess', 'socket', 'requests',
-                       'urllib.request', 'urllib.parse', 'urllib.error', 'urllib.robotparser', 'http.client',
-                       'ftplib', 'poplib', 'imaplib', 'nntplib', 'smtplib', 'smtpd', 'telnetlib', 'uuid', 'hashlib',
-                       'hmac', 'secrets', 'ssl', 'py_compile', 'compileall', 'dis', 'pickletools', 'codecs', 'encodings',
-                       'zipimport', 'pkgutil', 'modulefinder', 'runpy', 'imp', 'importlib', 'bash', 'sh', 'zsh', 'csh',
-                          'tcsh', 'pwsh', 'powershell', 'cmd', 'mshta', 'rundll32', 'regsvr32', 'regasm', 'wscript',
-                            'cscript', 'msbuild', 'msxsl', 'msdeploy', 'msdt', 'msiexec', 'mshta', 'msxsl', 'msdeploy',
-                            'msdt', 'msiexec', 'regsvr32', 'regasm', 'wscript', 'cscript', 'msbuild', 'msxsl', 'msdeploy'
-    ]
-    lines_less_100 = []
-
-    with open("report.html", "w") as outfile:
-        outfile.write("<html>")
-        outfile.write("<head>")
-        outfile.write("<title>Report ANAL</title>")
-        outfile.write("<style>")
-        outfile.write("table, th, td {")
-        outfile.write("border: 1px solid black;")
-        outfile.write("border-collapse: collapse;")
-        outfile.write("}")
-        outfile.write("</style>")
-        outfile.write("</head>")
-        outfile.write("<body>")
-        outfile.write("<h1>Detection Report</h1>")
-        outfile.write("<div>")
-        outfile.write("<h2>Summary</h2>")
-        outfile.write("<ul>")
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                # Print every file present in the report, print only the name of the file (not source_import_xxx.txt)
-                # Regex to keep only the name of the file
-                if re.search(r"source_import_(.*).txt", file):
-                    file = file.replace("source_import_", "")
-                    file = file.replace(".txt", "")
-                outfile.write(f"<li>{file}</li>")
-                # Create anchor to full end of the report
+    if not cache_dir:
+        return None
+    return ScanIndex(os.path.join(cache_dir, INDEX_FILE), index_signature(SUSPECT_IMPORTS, mmap_threshold))
 
-        outfile.write("</ul>")
-        outfile.write(f"<a href='#end' style='color: inherit;'>↳ End of the report</a>")
-        outfile.write("</div>")
-        outfile.write("<table>")
-        outfile.write("<thead>")
-        outfile.write("<tr>")
-        outfile.write("<th>File Name</th>")
-        outfile.write("<th>Suspect Import</th>")
-        outfile.write("<th>Type</th>")
-        outfile.write("<th>Line Number</th>")
-        outfile.write("<th>Line Content</th>")
-        outfile.write("</tr>")
-        outfile.write("</thead>")
-        outfile.write("<tbody>")
-
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                with open(os.path.join(root, file), 'r') as f:
-                    source_code = f.read()
-                    lines = source_code.splitlines()
-                    if len(lines) < 100:
-                        lines_less_100.append(file)
-                    for suspect in suspect_imports:
-                        if suspect in source_code:
-                            outfile.write("<tr>")
-                            outfile.write("<td><a href='{}'>{}</a></td>".format(os.path.join(root, file), file))
-                            outfile.write("<td>{}</td>".format(suspect))
-                            outfile.write("<td colspan='3' style='background-color: yellow;'>Found suspect import</td>")
-                            outfile.write("</tr>")
-
-                            for line in source_code.splitlines():
-                                line_str = line.strip()
-                                start_index = line_str.find(suspect)
-                                while start_index != -1:
-                                    end_index = start_index + len(suspect)
-                                    if (start_index == 0 or not line_str[start_index - 1].isalpha()) and \
-                                    (end_index == len(line_str) or not line_str[end_index].isalpha()):
-                                        outfile.write("<tr>")
-                                        outfile.write("<td></td>")
-                                        outfile.write("<td></td>")
-                                        outfile.write("<td style='color: green;'>True Positive</td>")
-                                        outfile.write("<td>{}</td>".format(source_code.count('\n', 0, source_code.find(line_str))))
-                                        outfile.write("<td>{}</td>".format(line_str.replace(suspect, "<span style='color: red;'>{}</span>".format(suspect))))
-                                        outfile.write("</tr>")
-                                    else:
-                                        outfile.write("<tr>")
-                                        outfile.write("<td></td>")
-                                        outfile.write("<td></td>")
-                                        outfile.write("<td style='color: red;'>False Positive</td>")
-                                        outfile.write("<td>{}</td>".format(source_code.count('\n', 0, source_code.find(line_str))))
-                                        outfile.write("<td>{}</td>".format(line_str.replace(suspect, "<span style='color: red;'>{}</span>".format(suspect))))
-                                        outfile.write("</tr>")
-                                    start_index = line_str.find(suspect, end_index)
-                                    
-            outfile.write("</tbody>\n")
-            outfile.write("</table>\n")
-
-            if lines_less_100:
-                outfile.write("<div>\n")
-                outfile.write("<h3 style='color: red;'>NOTA</h3>\n")
-                outfile.write("<p>Some of the source files have less than 100 lines, it's possible it's a hand-made script.</p>\n")
-                outfile.write("<ul>\n")
-                for file in lines_less_100:
-                    outfile.write("<li>{}</li>\n".format(file))
-                outfile.write("</ul>\n")
-                outfile.write("</div>\n")
-
-            number_of_unique_suspect_imports = len(suspect_imports)
-
-            number_files = 0
-            for root, dirs, files in os.walk(path):
-                for file in files:
-                    number_files += 1
-
-            number_true_positives = 0
-            for root, dirs, files in os.walk(path):
-                for file in files:
-                    with open(os.path.join(root, file), 'r') as f:
-                        source_code = f.read()
-                        for suspect in suspect_imports:
-                            if suspect in source_code:
-                                for line in source_code.splitlines():
-                                    line_str = line.strip()
-                                    start_index = line_str.find(suspect)
-                                    while start_index != -1:
-                                        end_index = start_index + len(suspect)
-                                        if (start_index == 0 or not line_str[start_index - 1].isalpha()) and \
-                                        (end_index == len(line_str) or not line_str[end_index].isalpha()):
-                                            number_true_positives += 1
-                                        start_index = line_str.find(suspect, end_index)
-
-            outfile.write("<div>\n")
-            outfile.write("<h3>Recap of the analysis</h3>\n")
-            outfile.write("<p> The scanned folder has {} files and {} true positives.</p>\n".format(number_files, number_true_positives))
-            outfile.write("</body>\n")
-            outfile.write("<div id='end'>\n")
-            outfile.write("</html>\n")
-
-            print("Report generated in report.html")
 
-def main():
-    """ Main
+class ImportRecord(NamedTuple):
+    """An import statement found in a file"""
+    module: str
+    names: Tuple[str, ...]
+    level: int
+    line: int
+    conditional: bool
+
+    @property
+    def top_level(self) -> str:
+        """Top level package of an absolute import, empty for a relative one"""
+        return self.module.split('.')[0] if not self.level else ''
+
+
+# Imports nested in these statements are not run unconditionally when the file is imported
+CONDITIONAL_NODES = tuple(getattr(ast, name) for name in ('If', 'Try', 'TryStar', 'For', 'AsyncFor', 'While', 'With',
+                                                          'AsyncWith', 'Match', 'FunctionDef', 'AsyncFunctionDef')
+                          if hasattr(ast, name))
+
+# Files below this count are parsed in the main process, a pool costs more than it saves
+PARALLEL_THRESHOLD = 64
+
+
+# Number of parsed sources kept by parse_source
+PARSE_CACHE_SIZE = 32
+_parse_cache = {}
+
+
+def parse_source(source: bytes, digest: str = None) -> ast.Module:
+    """Parse a Python source, the trees of the last parsed sources are kept by digest
+
+    Only callers which already hashed the content (index lookups, store
+    reads) give a digest, hashing only for the cache would cost more than
+    most parses. The trees must not be modified.
+
+    Args:
+        source (bytes): content of the file
+        digest (str, optional): digest of the content, the tree is not cached without it
+
+    Raises:
+        SyntaxError: the source is not valid Python 3
+        ValueError: the source contains null bytes
+
+    Returns:
+        ast.Module: the tree
     """
-    os.system('cls' if os.name == 'nt' else 'clear')
-    print(pyfiglet.figlet_format("Import_Anal_M58", font="slant", width=100))
-    warnings.filterwarnings("ignore", category=pkg_resources.PkgResourcesDeprecationWarning)    
-    args = parse_arguments()
-    path = os.path.dirname(os.path.abspath(__file__)) 
-    result = get_imports(path)
-    modules = []
-    for file_imports, folder, file in result:
-        for module in file_imports:
-            modules.append(module)
-    modules = delete_module_not_found(modules)
-    if args.requirement:
-        build_requirement_file(modules)
-    
-    if args.restriction_level == 1:
-        print("Deleting SourceCode folder ...")
-        if os.path.exists("SourceCode"):
-            shutil.rmtree("SourceCode")
-        os.mkdir("SourceCode")
-        print("\n")
-        print("=====================================================")
-        print(f"\033[33m\033[1mThe module {module} has beed dodged because it doesn't exist\033[0m")
-        print("=====================================================")
-        for module in modules:
-            try:
-                importlib.import_module(module)
-            except ModuleNotFoundError:
-                get_source_code(module)
-                
-    if args.restriction_level == 2:
-        print("Deleting SourceCode folder ...")
-        if os.path.exists("SourceCode"):
-            shutil.rmtree("SourceCode")
-        os.mkdir("SourceCode")
-        versions = get_versions(modules)
-        modules_with_versions = [(module, version) for module, version in versions.items() if version]
-        modules_without_versions = [(module, version) for module, version in versions.items() if not version]
-        for module, version in modules_without_versions:
-            if module in sys.builtin_module_names:
-                continue
-            print("Found red flag import (" + module + ") in " + file)
-            try:
-                importlib.import_module(module)
-                print("Check passed for module: " + module)
-            except ModuleNotFoundError:
-                print("Module not installed: " + module)
-            if module in modules_with_versions:
-                continue
-            else:
-                if module in sys.builtin_module_names:
-                    continue
-                else:
-                    get_source_code(module)
-                    print("Check passed for module: " + module)
+    if digest is None:
+        return ast.parse(source)
+    tree = _parse_cache.pop(digest, None)
+    if tree is None:
+        tree = ast.parse(source)
+    _parse_cache[digest] = tree
+    if len(_parse_cache) > PARSE_CACHE_SIZE:
+        del _parse_cache[next(iter(_parse_cache))]
+    return tree
 
-    if args.restriction_level == 3:
-        print("Deleting SourceCode folder ...")
-        if os.path.exists("SourceCode"):
-            shutil.rmtree("SourceCode")
-        os.mkdir("SourceCode")
-        for module in modules:
-            if module in sys.builtin_module_names:
-                continue
-            else:
-                get_source_code(module)
-
-    if args.delete_red_flag:
-        print("Deleting SourceCode folder ...")
-        if os.path.exists("SourceCode"):
-            shutil.rmtree("SourceCode")
-        os.mkdir("SourceCode")
-        for file_imports, folder, file in result:
-            for module in file_imports:
-                try:
-                    importlib.import_module(module)
-                except ModuleNotFoundError:
-                    with open(os.path.join(folder, file), 'r') as f:
-                        lines = f.readlines()
-                    with open(os.path.join(folder, file), 'w') as f:
-                        for line in lines:
-                            if f"import {module}" not in line:
-                                f.write(line)
-                except:
-                    with open(os.path.join(folder, file), 'r') as f:
-                        lines = f.readlines()
-                    with open(os.path.join(folder, file), 'w') as f:
-                        for line in lines:
-                            if f"import {module}" not in line:
-                                f.write(line)
-    if args.ascii_art:
-        ascii_banner = pyfiglet.figlet_format("Import Anal by M58")
-        print(ascii_banner)
-        exit(0)
 
-    if args.analyze_sources:
-        analyze_source_code("SourceCode")
-        exit(0)
-        
+def extract_imports(source: bytes, digest: str = None) -> List[ImportRecord]:
+    """Extract the import statements of a Python source
+
+    Falls back to a line based scan when the source is not valid Python 3.
+
+    Args:
+        source (bytes): content of the file
+        digest (str, optional): digest of the content, see parse_source
+
+    Returns:
+        List[ImportRecord]: imports ordered by line
+    """
+    try:
+        tree = parse_source(source, digest)
+    except (SyntaxError, ValueError):
+        return _scan_import_lines(source.decode('utf-8', errors='replace'))
 
-    if args.graph:
-        G = nx.Graph()
+    records = []
+    stack = [(tree, False)]
+    while stack:
+        node, conditional = stack.pop()
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.Import):
+                for alias in child.names:
+                    records.append(ImportRecord(alias.name, (), 0, child.lineno, conditional))
+            elif isinstance(child, ast.ImportFrom):
+                records.append(ImportRecord(child.module or '', tuple(alias.name for alias in child.names),
+                                            child.level, child.lineno, conditional))
+            elif isinstance(child, (ast.stmt, ast.excepthandler, getattr(ast, 'match_case', ast.stmt))):
+                stack.append((child, conditional or isinstance(child, CONDITIONAL_NODES)))
+    records.sort(key=lambda record: record.line)
+    return records
 
-        def generate_arborescence(current_folder):
-            """function to generate the arborescence of the folder
 
-            Args:
-                current_folder (str): the current folder
-            """
-            list_files_folders = os.listdir(current_folder)
+def _scan_import_lines(source_code: str) -> List[ImportRecord]:
+    """Line based import scan for sources ast cannot parse (Python 2, templates...)
 
-            for file_folder in list_files_folders:
-                full_path = os.path.join(current_folder, file_folder)
+    Args:
+        source_code (str): content of the file
+
+    Returns:
+        List[ImportRecord]: imports ordered by line
+    """
+    records = []
+    lines = source_code.splitlines()
+    for line_number, line in enumerate(lines, 1):
+        conditional = line[:1].isspace()
+        match = re.match(r'\s*import\s+([\w.]+(?:\s*,\s*[\w.]+)*)', line)
+        if match:
+            for module in match.group(1).split(','):
+                records.append(ImportRecord(module.strip(), (), 0, line_number, conditional))
+            continue
+        if re.match(r'\s*from\s+[\w.]+\s+import\s*\(', line) and ')' not in line:
+            # Names in parentheses go on until the closing one
+            line = line.split('#')[0]
+            for following in lines[line_number:]:
+                line += ' ' + following.split('#')[0]
+                if ')' in following:
+                    break
+        match = re.match(r'\s*from\s+(\.*)([\w.]*)\s+import\s+\(?\s*([\w*][\w\s,*]*)', line)
+        if match:
+            names = tuple(name.split()[0] for name in match.group(3).split(',') if name.strip())
+            records.append(ImportRecord(match.group(2), names, len(match.group(1)), line_number, conditional))
+    return records
 
-                if os.path.isfile(full_path):
-                    G.add_node(full_path)
-                    G.add_edge(current_folder, full_path)
-                else:
-                    G.add_node(full_path, is_folder=True)
-                    G.add_edge(current_folder, full_path)
 
-                    generate_arborescence(full_path)
+def _extract_file_imports(task: Tuple[str, str]) -> Tuple[int, int, str, List[ImportRecord]]:
+    """Read a file and extract its imports, run in the worker processes
+
+    Args:
+        task (Tuple[str, str]): path of the file and digest of its indexed version (or None)
 
-            
-            for node in G.nodes():
-                node_name = os.path.basename(node)
-                for other_node in G.nodes():
-                    other_node_name = os.path.basename(other_node)
-                    if node_name == other_node_name and node != other_node:
-                        G.add_edge(node, other_node)
+    Returns:
+        Tuple[int, int, str, List[ImportRecord]]: mtime, size and digest of the read content, and its
+            imports. The imports are None when the digest matches the indexed one.
+    """
+    file_path, known_digest = task
+    try:
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            content = f.read()
+    except OSError:
+        return 0, 0, '', []
+    digest = file_digest(content)
+    if digest == known_digest:
+        return stat.st_mtime_ns, stat.st_size, digest, None
+    return stat.st_mtime_ns, stat.st_size, digest, extract_imports(content, digest)
 
 
-        current_folder = "."
-        generate_arborescence(current_folder)
+def remove_imports(source: bytes, modules: List[str]) -> Tuple[bytes, int]:
+    """Remove the import statements of some top level modules from a Python source
 
+    Statements are located with ast and cut out by offset, so 'import Xtra'
+    survives the removal of X, 'import X, Y' keeps Y, and a block left
+    without statements gets a 'pass'. Falls back to a line based removal
+    when the source is not valid Python 3.
 
-        pos = nx.spring_layout(G)
+    Args:
+        source (bytes): content of the file
+        modules (List[str]): top level modules to remove
 
+    Returns:
+        Tuple[bytes, int]: the cleaned source and the number of removed imports
+    """
+    modules = set(modules)
+    try:
+        tree = parse_source(source)
+    except (SyntaxError, ValueError):
+        return _remove_import_lines(source, modules)
 
-        fig, ax = plt.subplots()
+    line_starts = source_line_starts(source)
+    # Column offsets of the first line do not count the BOM
+    bom = 3 if source.startswith(b'\xef\xbb\xbf') else 0
 
+    def offset(line_number: int, column: int) -> int:
+        return line_starts[line_number - 1] + column + (bom if line_number == 1 else 0)
 
-        node_colors = []
-        for node in G.nodes:
-            if node == current_folder:
-                node_colors.append("lightyellow")
-            elif G.nodes[node].get("is_folder"):
-                node_colors.append("lightgreen")
+    edits = []
+    removed = 0
+    for body in _statement_lists(tree):
+        kept = len(body)
+        body_edits = []
+        for node in body:
+            if isinstance(node, ast.Import):
+                keep = [alias for alias in node.names if alias.name.split('.')[0] not in modules]
+                if len(keep) == len(node.names):
+                    continue
+                removed += len(node.names) - len(keep)
+                if keep:
+                    text = "import " + ", ".join(alias.name + (f" as {alias.asname}" if alias.asname else "")
+                                                 for alias in keep)
+                    body_edits.append((node, text.encode()))
+                    continue
+            elif isinstance(node, ast.ImportFrom) and not node.level and (node.module or '').split('.')[0] in modules:
+                removed += 1
             else:
-                node_colors.append("lightblue")
+                continue
+            kept -= 1
+            body_edits.append((node, None))
+        if body_edits and not kept and body is not tree.body:
+            body_edits[0] = (body_edits[0][0], b"pass")
+        edits.extend(body_edits)
+
+    cleaned = bytearray(source)
+    # Last statements first, the offsets of the previous ones stay valid
+    for node, replacement in sorted(edits, key=lambda edit: (edit[0].lineno, edit[0].col_offset), reverse=True):
+        start = offset(node.lineno, node.col_offset)
+        end = offset(node.end_lineno, node.end_col_offset)
+        if replacement is not None:
+            cleaned[start:end] = replacement
+            continue
+        line_begin = offset(node.lineno, 0)
+        line_end = cleaned.find(b'\n', end) + 1 or len(cleaned)
+        following = re.match(rb'[ \t]*;[ \t]*', cleaned[end:line_end])
+        preceding = re.search(rb'[ \t]*;[ \t]*$', cleaned[line_begin:start])
+        if following:
+            end += following.end()
+        elif preceding:
+            start = line_begin + preceding.start()
+        rest = cleaned[end:line_end].strip()
+        if not cleaned[line_begin:start].strip() and (not rest or rest.startswith(b'#')):
+            start, end = line_begin, line_end
+        del cleaned[start:end]
+    return bytes(cleaned), removed
 
 
-        node_labels = {node: os.path.basename(node) for node in G.nodes}
+def _statement_lists(tree: ast.AST) -> Iterator[list]:
+    """Yield every list of statements of a tree: module, function and class bodies, branches...
 
-        nx.draw(G, pos, with_labels=True, labels=node_labels, node_color=node_colors, node_size=500)
+    Args:
+        tree (ast.AST): parsed source
 
+    Returns:
+        Iterator[list]: the statement lists
+    """
+    for node in ast.walk(tree):
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list) and value and isinstance(value[0], ast.stmt):
+                yield value
 
-        dragging = False
-        node_to_drag = None
-        offset_x = 0.0
-        offset_y = 0.0
 
+def _remove_import_lines(source: bytes, modules: set) -> Tuple[bytes, int]:
+    """Line based removal for sources ast cannot parse, the counterpart of _scan_import_lines
 
-        def on_press(event):
-            """Function called when a mouse button is pressed.
+    Only single line statements are touched.
 
-            Args:
-                event (matplotlib.backend_bases.MouseEvent): The event.
-            """
-            global dragging, node_to_drag, offset_x, offset_y
+    Args:
+        source (bytes): content of the file
+        modules (set): top level modules to remove
 
-            if event.inaxes is not None:
-                x, y = event.xdata, event.ydata
-                for node, (pos_x, pos_y) in pos.items():
-                    if (x - pos_x) ** 2 + (y - pos_y) ** 2 < 0.03:
-                        dragging = True
-                        node_to_drag = node
-                        offset_x = pos_x - x
-                        offset_y = pos_y - y
-                        break
+    Returns:
+        Tuple[bytes, int]: the cleaned source and the number of removed imports
+    """
+    lines = []
+    removed = 0
+    for line in source.splitlines(keepends=True):
+        match = re.match(rb'(\s*)import\s+([\w.]+(?:\s+as\s+\w+)?(?:\s*,\s*[\w.]+(?:\s+as\s+\w+)?)*)\s*(#.*)?$', line)
+        if match:
+            names = [name.strip() for name in match.group(2).split(b',')]
+            keep = [name for name in names if name.split(b'.')[0].split()[0].decode() not in modules]
+            removed += len(names) - len(keep)
+            if keep and len(keep) < len(names):
+                line = match.group(1) + b"import " + b", ".join(keep) + line[len(line.rstrip(b'\r\n')):]
+            elif not keep:
+                continue
+        else:
+            match = re.match(rb'\s*from\s+([\w.]+)\s+import\s+[^(]*$', line)
+            if match and match.group(1).split(b'.')[0].decode() in modules:
+                removed += 1
+                continue
+        lines.append(line)
+    return b"".join(lines), removed
 
 
-        def on_motion(event):
-            """Function called when a mouse button is pressed and the mouse is moved.
+def _remove_file_imports(task: Tuple[str, str, Tuple[str, ...], bool]) -> Tuple[str, int, str]:
+    """Remove the red flag imports of a file with one read and one atomic write, run in the worker processes
 
-            Args:
-                event (matplotlib.backend_bases.MouseEvent): The event.
-            """
-            global dragging, node_to_drag
+    Args:
+        task (Tuple[str, str, Tuple[str, ...], bool]): path of the file, name shown in the diff, top level
+            modules to remove, and whether to only compute the diff
 
-            if dragging and event.inaxes is not None:
-                pos[node_to_drag] = (event.xdata + offset_x, event.ydata + offset_y)
-                plt.cla()
-                nx.draw(G, pos, with_labels=True, labels=node_labels, node_color=node_colors, node_size=500)
-                plt.draw()
+    Returns:
+        Tuple[str, int, str]: path of the file, number of removed imports, and unified diff in dry run mode
+    """
+    file_path, display, modules, dry_run = task
+    try:
+        with open(file_path, 'rb') as f:
+            mode = os.fstat(f.fileno()).st_mode
+            source = f.read()
+    except OSError:
+        return file_path, 0, ''
+    cleaned, removed = remove_imports(source, modules)
+    if not removed:
+        return file_path, 0, ''
+    if dry_run:
+        import difflib
+        diff = difflib.unified_diff(source.decode('utf-8', errors='replace').splitlines(keepends=True),
+                                    cleaned.decode('utf-8', errors='replace').splitlines(keepends=True),
+                                    'a/' + display, 'b/' + display)
+        return file_path, removed, "".join(line if line.endswith('\n') else line + '\n' for line in diff)
+    atomic_write(file_path, cleaned, mode)
+    return file_path, removed, ''
 
 
-        def on_release(event):
-            global dragging, node_to_drag
+def remove_red_flag_imports(result: list, root, resolver: 'ModuleResolver' = None, jobs: int = None,
+                            dry_run: bool = False) -> Dict[str, int]:
+    """Remove the imports of modules which cannot be found from every file of the project
 
-            if dragging:
-                dragging = False
-                node_to_drag = None
+    Every module is resolved once, then each affected file is rewritten
+    once, files being processed in parallel.
 
+    Args:
+        result (list): imports of the project as returned by get_imports
+        root: path of the project, or list of project roots, diff paths are relative to them
+        resolver (ModuleResolver, optional): shared resolver
+        jobs (int, optional): number of worker processes. Defaults to the number of CPUs.
+        dry_run (bool, optional): print a unified diff instead of writing the files. Defaults to False.
 
-        fig.canvas.mpl_connect('button_press_event', on_press)
-        fig.canvas.mpl_connect('motion_notify_event', on_motion)
-        fig.canvas.mpl_connect('button_release_event', on_release)
+    Returns:
+        Dict[str, int]: number of removed imports of each affected file
+    """
+    resolver = resolver or default_resolver()
+    resolution = resolver.resolve_many([record.top_level for records, folder, file in result
+                                        for record in records if record.top_level])
+    red_flags = {module for module, info in resolution.items() if not info.found}
+    tasks = []
+    for records, folder, file in result:
+        modules = tuple(sorted({record.top_level for record in records if record.top_level in red_flags}))
+        if modules:
+            file_path = os.path.join(folder, file)
+            tasks.append((file_path, os.path.relpath(file_path, project_root(root, folder)), modules, dry_run))
 
+    removed = {}
+    for file_path, count, diff in parallel_map(_remove_file_imports, tasks, jobs):
+        if diff:
+            sys.stdout.write(diff)
+        if count:
+            removed[file_path] = count
+    return removed
 
-        plt.show()
 
+def parallel_map(function, items: list, jobs: int = None) -> list:
+    """Map a picklable function over items with a process pool
 
-    if args.request_pypi:
-        request_pypi(modules)
-        exit(0)
+    Args:
+        function: top level function
+        items (list): arguments
+        jobs (int, optional): number of worker processes. Defaults to the number of CPUs.
 
-    prev_root = ''
-    for file_imports, folder, file in result:
-        if prev_root != folder:
-            print(f"\n{folder}:")
-            print("|--" + file)
-        else:
-            print("|--" + file)
-        if not file_imports:
-            print("|   |-- \033[32mNo imports found in this file\033[0m")
-        for module in file_imports:
-            try:
-                module_version = importlib.import_module(module).__version__
-                print(f"|   |-- Import {module} \033[32m({module_version})\033[0m")
-            except ModuleNotFoundError:
-                print(f"|   |-- Import {module} \033[31m(Module not found - Can be deleted by using -s / --delete_red_flag)\033[0m")
-            except:
-                print(f"|   |-- Import {module} \033[33m(No version information available)\033[0m")
-        prev_root = folder
-        
-    print("--------------------------------")
-    print("\n")
-
-    print("\033[1m As asked by your arguments, the program will now:\033[0m")
-    if args.restriction_level == 1:
-        print("     - Dump source code of red print imports")
-    elif args.restriction_level == 2:
-        print("     - Dump source code of orange and red print imports")
-    elif args.restriction_level == 3:
-        print("     - Dump source code of all imports")
-    if args.requirement:
-        print("     - Create a requirement.txt file with all the import found in the project")
-    if args.delete_red_flag:
-        print("     - Delete all red flag import in files")
-    if args.ascii_art:
-        print("     - Add a complete ascii-art view of the program")
-    if args.request_pypi:
-        print("     - Request the pypi.org to get all the information about the modules")
-    print("")
-
-    if args.delete_red_flag:
-        print("\033[32m[+] All red flag imports have been deleted\033[0m")
-    if args.requirement:
-        print("\033[32m[+] A requirement.txt file has been created\033[0m")
-    if args.restriction_level == 1 or args.restriction_level == 2 or args.restriction_level == 3:
-        print("\033[32m[+] All source code has been dumped in folder named SourceCode\033[0m")
+    Returns:
+        list: results, in the order of the items
+    """
+    return list(parallel_imap(function, items, jobs))
+
+
+def parallel_imap(function, items: list, jobs: int = None) -> Iterator:
+    """Map a picklable function over items with a process pool, yielding each result once it is ready
+
+    Results are yielded in the order of the items and dropped by the pool
+    once yielded, so the caller never holds all of them.
+
+    Args:
+        function: top level function
+        items (list): arguments
+        jobs (int, optional): number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        Iterator: results, in the order of the items
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(items) < PARALLEL_THRESHOLD:
+        yield from map(function, items)
+        return
+    chunksize = max(1, len(items) // (jobs * 4))
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(function, items, chunksize=chunksize)
+
+
+# Folders never scanned: version control, caches and tool folders
+PRUNED_DIRS = frozenset({'.git', '.hg', '.svn', '.bzr', '__pycache__', 'node_modules', '.tox', '.nox', '.venv',
+                         '.eggs', '.mypy_cache', '.pytest_cache', '.ruff_cache'})
+# Entries found at the top of a virtual or conda environment, whatever the name of its folder
+ENVIRONMENT_MARKERS = frozenset({'pyvenv.cfg', 'conda-meta'})
+# Folders listed at once, os.scandir releases the GIL while it waits on the filesystem
+WALK_THREADS = 8
+
+
+def _ignore_regex(pattern: str) -> str:
+    """Translate the glob of a .gitignore line, without its '!' and slashes, into a regex"""
+    regex = []
+    position = 0
+    while position < len(pattern):
+        if pattern.startswith('**/', position):
+            regex.append('(?:.*/)?')
+            position += 3
+            continue
+        if pattern.startswith('**', position):
+            regex.append('.*')
+            position += 2
+            continue
+        character = pattern[position]
+        closing = pattern.find(']', position + 2) if character == '[' else -1
+        if character == '*':
+            regex.append('[^/]*')
+        elif character == '?':
+            regex.append('[^/]')
+        elif closing != -1:
+            members = pattern[position + 1:closing]
+            regex.append('[' + ('^' + members[1:] if members.startswith('!') else members).replace('\\', '\\\\') + ']')
+            position = closing
+        else:
+            regex.append(re.escape(character))
+        position += 1
+    return ''.join(regex)
+
+
+class IgnoreRules:
+    """Exclusion rules written like the lines of a .gitignore
+
+    A pattern without an inner slash matches a name at any depth, others
+    are anchored to the walked root. '**' matches any number of folders, a
+    trailing slash only matches folders and a leading '!' includes again
+    what a previous pattern excluded, the last matching pattern wins.
+    """
+
+    def __init__(self, patterns: List[str] = ()):
+        self.rules = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            negate = pattern.startswith('!')
+            pattern = pattern[1:] if negate else pattern
+            directory_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            prefix = '' if '/' in pattern else '(?:.*/)?'
+            self.rules.append((re.compile(prefix + _ignore_regex(pattern.lstrip('/')) + '$'), negate, directory_only))
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def ignored(self, relative: str, is_dir: bool) -> bool:
+        """Tell whether a path is excluded
+
+        Args:
+            relative (str): path relative to the walked root, with '/' separators
+            is_dir (bool): the path is a folder
+
+        Returns:
+            bool: True when the last matching rule excludes it
+        """
+        ignored = False
+        for regex, negate, directory_only in self.rules:
+            if (is_dir or not directory_only) and regex.match(relative):
+                ignored = not negate
+        return ignored
+
+
+def read_ignore_file(path: str) -> List[str]:
+    """Read the patterns of a .gitignore style file
+
+    Args:
+        path (str): path of the file
+
+    Returns:
+        List[str]: its lines
+    """
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read().splitlines()
+
+
+class SourceWalker:
+    """Walk project folders with os.scandir, pruning what is never worth scanning
+
+    Version control and tool folders, environments (any folder holding a
+    pyvenv.cfg or a conda-meta), the excluded paths and the folders matching
+    the ignore rules are pruned before being listed. Folders are listed by
+    a thread pool, so slow filesystems are waited on concurrently. Symlinked
+    folders are only followed on demand, each real folder being listed once
+    so that a link loop ends its branch. Files above max_file_size are skipped.
+    """
+
+    def __init__(self, excluded: List[str] = (), ignore: List[str] = (), max_file_size: int = None,
+                 follow_symlinks: bool = False, threads: int = WALK_THREADS):
+        self.excluded = {os.path.abspath(folder) for folder in excluded}
+        self.rules = IgnoreRules(ignore)
+        self.max_file_size = max_file_size
+        self.follow_symlinks = follow_symlinks
+        self.threads = max(1, threads or 1)
+        self.folders_pruned = 0
+        self.files_too_large = 0
+        self.links_skipped = 0
+
+    def walk(self, root: str, suffixes: Tuple[str, ...] = None) -> List[Tuple[str, str]]:
+        """List the files below a folder
+
+        Args:
+            root (str): walked folder, it is never pruned itself
+            suffixes (Tuple[str, ...], optional): only keep the files with these endings
+
+        Returns:
+            List[Tuple[str, str]]: (folder, file) of every file, folders being joined to root as os.walk
+                does, sorted by folder then file
+        """
+        visited = set()
+        visited_lock = threading.Lock()
+        if self.follow_symlinks:
+            with contextlib.suppress(OSError):
+                stat = os.stat(root)
+                visited.add((stat.st_dev, stat.st_ino))
+
+        def list_folder(folder: str, relative: str) -> Tuple[str, List[str], list, int, int, int]:
+            files = []
+            folders = []
+            pruned = too_large = links = 0
+            try:
+                with os.scandir(folder) as iterator:
+                    entries = list(iterator)
+            except OSError:
+                return folder, files, folders, pruned, too_large, links
+            if relative and any(entry.name in ENVIRONMENT_MARKERS for entry in entries):
+                return folder, files, folders, 1, too_large, links
+            for entry in entries:
+                child = f"{relative}/{entry.name}" if relative else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=self.follow_symlinks):
+                        if entry.name in PRUNED_DIRS or self.rules.ignored(child, True) or \
+                                (self.excluded and os.path.abspath(entry.path) in self.excluded):
+                            pruned += 1
+                            continue
+                        if self.follow_symlinks:
+                            stat = entry.stat()
+                            with visited_lock:
+                                if (stat.st_dev, stat.st_ino) in visited:
+                                    links += 1
+                                    continue
+                                visited.add((stat.st_dev, stat.st_ino))
+                        folders.append((entry.path, child))
+                    elif entry.is_file():
+                        if (suffixes and not entry.name.endswith(suffixes)) or self.rules.ignored(child, False):
+                            continue
+                        if self.max_file_size is not None and entry.stat().st_size > self.max_file_size:
+                            too_large += 1
+                            continue
+                        files.append(entry.name)
+                except OSError:
+                    continue
+            return folder, files, folders, pruned, too_large, links
+
+        listed = []
+        if self.threads == 1:
+            stack = [(root, '')]
+            while stack:
+                listed.append(list_folder(*stack.pop()))
+                stack.extend(listed[-1][2])
+        else:
+            from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                pending = {executor.submit(list_folder, root, '')}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        listed.append(future.result())
+                        pending.update(executor.submit(list_folder, *folder) for folder in listed[-1][2])
+
+        walked = []
+        for folder, files, folders, pruned, too_large, links in sorted(listed, key=lambda listing: listing[0]):
+            walked.extend((folder, file) for file in sorted(files))
+            self.folders_pruned += pruned
+            self.files_too_large += too_large
+            self.links_skipped += links
+        return walked
+
+
+def project_root(roots, path: str) -> str:
+    """Root of the project holding a path
+
+    Args:
+        roots: project root, or list of project roots
+        path (str): path below one of the roots
+
+    Returns:
+        str: the deepest root holding the path, the first root when none does
+    """
+    if isinstance(roots, str):
+        return roots
+    path = os.path.join(os.path.abspath(path), '')
+    holding = [root for root in roots if path.startswith(os.path.join(os.path.abspath(root), ''))]
+    return max(holding, key=len) if holding else roots[0]
+
+
+def get_imports(path, jobs: int = None, index: ScanIndex = None, walker: SourceWalker = None) -> list:
+    """Returns a list of import records for every Python file of the project
+
+    Args:
+        path: path of the project, or a list of project roots
+        jobs (int, optional): number of worker processes. Defaults to the number of CPUs.
+        index (ScanIndex, optional): index of the previous runs, only changed files are parsed
+        walker (SourceWalker, optional): walker of the roots, it should exclude the dump and cache folders
+            as dumped libraries are not project code
+
+    Returns:
+        _type_: list of (List[ImportRecord], folder, file)
+    """
+    return list(iter_imports(path, jobs, index, walker))
+
+
+def iter_imports(path, jobs: int = None, index: ScanIndex = None,
+                 walker: SourceWalker = None) -> Iterator[Tuple[List[ImportRecord], str, str]]:
+    """Yield the import records of every Python file of the project, each file once it is parsed
+
+    Only the records of the file being yielded are held, indexed files
+    keep their compact payload until their turn. The index is pruned and
+    flushed once the files are exhausted.
+
+    Args:
+        path: path of the project, or a list of project roots
+        jobs (int, optional): number of worker processes. Defaults to the number of CPUs.
+        index (ScanIndex, optional): index of the previous runs, only changed files are parsed
+        walker (SourceWalker, optional): walker of the roots, it should exclude the dump and cache folders
+            as dumped libraries are not project code
+
+    Returns:
+        Iterator[Tuple[List[ImportRecord], str, str]]: (records, folder, file) of every file, in walking order
+    """
+    roots = [path] if isinstance(path, str) else list(path)
+    walker = walker or SourceWalker()
+    with STATS.phase('walk'):
+        # Nested roots reach the same files
+        python_files = list(dict.fromkeys(pair for root in roots for pair in walker.walk(root, ('.py',))))
+    file_paths = [os.path.join(root, file) for root, file in python_files]
+    STATS.count('python_files', len(file_paths))
+
+    entries = {}
+    tasks = []
+    for position, file_path in enumerate(file_paths):
+        if index is not None:
+            try:
+                entry = index.lookup('imports', file_path, os.stat(file_path))
+            except OSError:
+                entry = None
+            if entry is not None:
+                entries[position] = entry
+                if entry.fresh:
+                    continue
+        tasks.append(position)
+
+    known_digests = [(file_paths[position], entries[position].digest if position in entries else None)
+                     for position in tasks]
+    STATS.count('files_read', len(tasks))
+    # Timed with the consumer of the records, which runs between two parsed files
+    with STATS.phase('parse'):
+        parsed = parallel_imap(_extract_file_imports, known_digests, jobs)
+        for position, (root, file) in enumerate(python_files):
+            entry = entries.pop(position, None)
+            if entry is not None and entry.fresh:
+                yield decode_import_records(entry.payload), root, file
+                continue
+            mtime_ns, size, digest, records = next(parsed)
+            STATS.count('bytes_read', size)
+            if records is None:
+                records = decode_import_records(entry.payload)
+            if index is not None and digest:
+                index.store('imports', file_paths[position], mtime_ns, size, digest, encode_import_records(records))
+            yield records, root, file
+        # Leaves the process pool once every result was taken
+        parsed.close()
+
+    if index is not None:
+        for root in roots:
+            index.prune('imports', root, file_paths)
+        index.flush()
+
+
+def encode_import_records(records: List[ImportRecord]) -> str:
+    """Serialize import records for the scan index
+
+    Args:
+        records (List[ImportRecord]): records
+
+    Returns:
+        str: JSON payload
+    """
+    return json.dumps(records, separators=(',', ':'))
+
+
+def decode_import_records(payload: str) -> List[ImportRecord]:
+    """Deserialize import records from the scan index
+
+    Args:
+        payload (str): JSON payload
+
+    Returns:
+        List[ImportRecord]: records
+    """
+    return [ImportRecord(module, tuple(names), level, line, conditional)
+            for module, names, level, line, conditional in json.loads(payload)]
+
+
+class ImportIndex:
+    """Compact and queryable index of the imports of a project, the library API of the scanner
+
+    Folders, file names, modules and imported names are interned into
+    integer IDs, and every import statement is one row of array columns,
+    a few bytes instead of an ImportRecord and its strings. The files
+    importing each top level module and the counts are kept up to date as
+    files are added, so importers, count and top are lookups. Adding a file
+    again replaces its imports and remove drops it, both in a time
+    proportional to the file: its rows are left behind and compacted away
+    once they outnumber the live ones.
+
+    Example:
+        imports = build_import_index(['project'])
+        imports.importers('requests')
+        imports.top(10)
+    """
+
+    def __init__(self):
+        self._strings = []
+        self._string_ids = {}
+        self._name_tuples = [()]
+        self._name_tuple_ids = {(): 0}
+        self._tops = {}
+        # Files: folder, name and first row of their imports, the imports of a file are contiguous
+        self._file_folders = array('I')
+        self._file_names = array('I')
+        self._file_starts = array('I', [0])
+        # (folder ID, name ID) -> ID of the live file, and IDs of the replaced or removed files
+        self._file_ids = {}
+        self._removed = set()
+        self._dead_rows = 0
+        # Imports, one row per imported module
+        self._modules = array('I')
+        self._names = array('I')
+        self._lines = array('I')
+        self._levels = array('B')
+        self._conditionals = array('B')
+        # Top level module ID -> IDs of the files importing it, and number of imports
+        self._importers = {}
+        self._counts = {}
+        self._import_count = 0
+        self._ranking = None
+
+    def _intern(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return string_id
+
+    def _top(self, module_id: int) -> int:
+        top_id = self._tops.get(module_id)
+        if top_id is None:
+            top_id = self._tops[module_id] = self._intern(self._strings[module_id].split('.')[0])
+        return top_id
+
+    def add(self, folder: str, file: str, records: List[ImportRecord]) -> int:
+        """Add a file and its imports, replacing those of the file when it is already indexed
+
+        Args:
+            folder (str): folder of the file
+            file (str): file name
+            records (List[ImportRecord]): imports of the file
+
+        Returns:
+            int: ID of the file
+        """
+        self.remove(folder, file)
+        key = (self._intern(folder), self._intern(file))
+        file_id = len(self._file_folders)
+        self._file_ids[key] = file_id
+        self._file_folders.append(key[0])
+        self._file_names.append(key[1])
+        for record in records:
+            module_id = self._intern(record.module)
+            names = tuple(record.names)
+            names_id = self._name_tuple_ids.get(names)
+            if names_id is None:
+                names_id = self._name_tuple_ids[names] = len(self._name_tuples)
+                self._name_tuples.append(names)
+            self._modules.append(module_id)
+            self._names.append(names_id)
+            self._lines.append(record.line)
+            self._levels.append(record.level)
+            self._conditionals.append(record.conditional)
+            if record.level or not record.module:
+                continue
+            top_id = self._top(module_id)
+            self._counts[top_id] = self._counts.get(top_id, 0) + 1
+            self._import_count += 1
+            importers = self._importers.setdefault(top_id, array('I'))
+            if not importers or importers[-1] != file_id:
+                importers.append(file_id)
+        self._file_starts.append(len(self._modules))
+        self._ranking = None
+        return file_id
+
+    def remove(self, folder: str, file: str) -> bool:
+        """Drop a file and its imports
+
+        Args:
+            folder (str): folder of the file
+            file (str): file name
+
+        Returns:
+            bool: False when the file was not indexed
+        """
+        file_id = self._file_ids.pop((self._string_ids.get(folder), self._string_ids.get(file)), None)
+        if file_id is None:
+            return False
+        self._removed.add(file_id)
+        start, end = self._file_starts[file_id], self._file_starts[file_id + 1]
+        self._dead_rows += end - start
+        for row in range(start, end):
+            if self._levels[row] or not self._strings[self._modules[row]]:
+                continue
+            top_id = self._top(self._modules[row])
+            self._import_count -= 1
+            self._counts[top_id] -= 1
+            if not self._counts[top_id]:
+                del self._counts[top_id]
+            importers = self._importers.get(top_id)
+            if importers is not None and file_id in importers:
+                importers.remove(file_id)
+                if not importers:
+                    del self._importers[top_id]
+        self._ranking = None
+        self._compact()
+        return True
+
+    def _compact(self) -> None:
+        """Rebuild the index from its live files once the dropped rows or files outnumber them"""
+        if self._dead_rows <= len(self._modules) // 2 and len(self._removed) <= len(self._file_folders) // 2:
+            return
+        files = list(self.iter_files())
+        self.__init__()
+        for records, folder, file in files:
+            self.add(folder, file, records)
+
+    def _file_id_list(self) -> Iterable[int]:
+        """IDs of the live files, in the order they were added"""
+        if not self._removed:
+            return range(len(self._file_folders))
+        return [file_id for file_id in range(len(self._file_folders)) if file_id not in self._removed]
+
+    @classmethod
+    def from_result(cls, result: list) -> 'ImportIndex':
+        """Build the index of a get_imports result
+
+        Args:
+            result (Iterable): list of (List[ImportRecord], folder, file), or iter_imports
+
+        Returns:
+            ImportIndex: the index
+        """
+        index = cls()
+        for records, folder, file in result:
+            index.add(folder, file, records)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._file_folders) - len(self._removed)
+
+    @property
+    def import_count(self) -> int:
+        """Number of absolute imports of the project"""
+        return self._import_count
+
+    def path(self, file_id: int) -> str:
+        """Path of a file from its ID"""
+        return os.path.join(self._strings[self._file_folders[file_id]], self._strings[self._file_names[file_id]])
+
+    def files(self) -> List[str]:
+        """Paths of the indexed files, in the order they were added"""
+        return [self.path(file_id) for file_id in self._file_id_list()]
+
+    def modules(self) -> List[str]:
+        """Top level modules imported by the project, in the order of their first import"""
+        return [self._strings[top_id] for top_id in self._counts]
+
+    def importers(self, module: str) -> List[str]:
+        """Files importing a top level module
+
+        Args:
+            module (str): top level module
+
+        Returns:
+            List[str]: paths of the files, in the order they were added
+        """
+        top_id = self._string_ids.get(module)
+        return [self.path(file_id) for file_id in self._importers.get(top_id, ())]
+
+    def count(self, module: str) -> int:
+        """Number of imports of a top level module in the project"""
+        return self._counts.get(self._string_ids.get(module), 0)
+
+    def top(self, number: int = 10) -> List[Tuple[str, int]]:
+        """Most imported top level modules
+
+        Args:
+            number (int, optional): number of modules. Defaults to 10.
+
+        Returns:
+            List[Tuple[str, int]]: modules and their number of imports, ties ordered by name
+        """
+        if self._ranking is None:
+            self._ranking = sorted(((self._strings[top_id], count) for top_id, count in self._counts.items()),
+                                   key=lambda item: (-item[1], item[0]))
+        return self._ranking[:number]
+
+    def records(self, file_id: int) -> List[ImportRecord]:
+        """Import records of a file from its ID"""
+        return [ImportRecord(self._strings[self._modules[row]], self._name_tuples[self._names[row]],
+                             self._levels[row], self._lines[row], bool(self._conditionals[row]))
+                for row in range(self._file_starts[file_id], self._file_starts[file_id + 1])]
+
+    def iter_files(self) -> Iterator[Tuple[List[ImportRecord], str, str]]:
+        """Yield the files in the shape of a get_imports result, the records being rebuilt one file at a time
+
+        Returns:
+            Iterator[Tuple[List[ImportRecord], str, str]]: (records, folder, file) of every file
+        """
+        for file_id in self._file_id_list():
+            yield (self.records(file_id), self._strings[self._file_folders[file_id]],
+                   self._strings[self._file_names[file_id]])
+
+    def to_dict(self) -> dict:
+        """Summary of the index for other tools: every top level module with its count and importers
+
+        Returns:
+            dict: JSON serializable summary
+        """
+        return {'files': len(self), 'imports': self.import_count,
+                'modules': {module: {'count': count, 'files': self.importers(module)}
+                            for module, count in self.top(len(self._counts))}}
+
+
+def build_import_index(path, jobs: int = None, index: ScanIndex = None, walker: SourceWalker = None) -> ImportIndex:
+    """Scan the imports of a project into an ImportIndex
+
+    Args:
+        path: path of the project, or a list of project roots
+        jobs (int, optional): number of worker processes. Defaults to the number of CPUs.
+        index (ScanIndex, optional): index of the previous runs, only changed files are parsed
+        walker (SourceWalker, optional): walker of the roots
+
+    Returns:
+        ImportIndex: the imports of every Python file of the project
+    """
+    return ImportIndex.from_result(iter_imports(path, jobs, index, walker))
+
+
+WATCH_SOCKET = "watch.sock"
+WATCH_COMMANDS = ('status', 'modules', 'importers', 'count', 'top', 'missing', 'resolve')
+
+
+class ImportWatcher:
+    """Keep the imports of a project up to date from stat snapshots of its files
+
+    Every refresh walks the roots and compares the mtime and size of each
+    Python file with the previous snapshot: only the new and modified files
+    are parsed, and only their entries and those of the deleted files are
+    updated in the ImportIndex. The resolver is only replaced when files
+    appear or disappear, as that changes which modules are local. Queries
+    only wait while the parsed changes are applied, never during parsing.
+    """
+
+    def __init__(self, roots: List[str], walker: SourceWalker = None, jobs: int = None,
+                 distributions: 'DistributionIndex' = None):
+        self.roots = list(roots)
+        self.walker = walker or SourceWalker()
+        self.jobs = jobs
+        self.distributions = distributions
+        self.imports = ImportIndex()
+        self.resolver = ModuleResolver(self.roots, distributions)
+        self.updated = None
+        self.refreshes = 0
+        self.refresh_seconds = None
+        self._snapshot = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[str, Tuple[str, str, int, int]]:
+        """Stat every Python file of the roots
+
+        Returns:
+            Dict[str, Tuple[str, str, int, int]]: folder, file name, mtime and size of each path, in walking order
+        """
+        snapshot = {}
+        for root in self.roots:
+            for folder, file in self.walker.walk(root, ('.py',)):
+                path = os.path.join(folder, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (folder, file, stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def refresh(self) -> Tuple[List[str], List[str]]:
+        """Parse the files changed since the last refresh
+
+        Returns:
+            Tuple[List[str], List[str]]: paths of the new or modified files, and of the deleted files
+        """
+        started = time.perf_counter()
+        snapshot = self.snapshot()
+        changed = [path for path, state in snapshot.items() if self._snapshot.get(path) != state]
+        removed = [path for path in self._snapshot if path not in snapshot]
+        if not changed and not removed:
+            return changed, removed
+        parsed = [records for mtime_ns, size, digest, records in
+                  parallel_map(_extract_file_imports, [(path, None) for path in changed], self.jobs)]
+        resolver = self.resolver
+        if removed or any(path not in self._snapshot for path in changed):
+            # importlib caches the listing of the folders
+            importlib.invalidate_caches()
+            resolver = ModuleResolver(self.roots, self.distributions)
+        resolver.resolve_many([record.top_level for records in parsed for record in records if record.top_level])
+        with self._lock:
+            for path in removed:
+                self.imports.remove(*self._snapshot[path][:2])
+            for path, records in zip(changed, parsed):
+                self.imports.add(snapshot[path][0], snapshot[path][1], records)
+            self._snapshot, self.resolver = snapshot, resolver
+            self.updated = time.time()
+            self.refreshes += 1
+            self.refresh_seconds = time.perf_counter() - started
+        return changed, removed
+
+    def query(self, request: dict) -> dict:
+        """Answer a query about the current state
+
+        Args:
+            request (dict): 'command', one of WATCH_COMMANDS, and its 'argument' (a module, or the number of top)
+
+        Returns:
+            dict: JSON serializable answer, with an 'error' key when the request is invalid
+        """
+        # The index is updated in place, it is read under the lock
+        with self._lock:
+            imports, resolver = self.imports, self.resolver
+            command = request.get('command')
+            argument = request.get('argument')
+            if command == 'status':
+                return {'files': len(imports), 'imports': imports.import_count, 'modules': len(imports.modules()),
+                        'updated': self.updated, 'refreshes': self.refreshes, 'refresh_seconds': self.refresh_seconds}
+            if command == 'modules':
+                return {'modules': imports.modules()}
+            if command == 'top':
+                try:
+                    return {'top': imports.top(int(argument or 10))}
+                except ValueError:
+                    return {'error': f"top expects a number, not {argument}"}
+            if command == 'missing':
+                return {'modules': [module for module in imports.modules() if not resolver.resolve(module).found]}
+            if command in ('importers', 'count', 'resolve') and not argument:
+                return {'error': f"{command} expects a module"}
+            if command == 'importers':
+                return {'module': argument, 'files': imports.importers(argument)}
+            if command == 'count':
+                return {'module': argument, 'count': imports.count(argument)}
+            if command == 'resolve':
+                return resolver.resolve(argument)._asdict()
+            return {'error': f"Unknown command {command}, expected one of {', '.join(WATCH_COMMANDS)}"}
+
+
+def serve_watch(watcher: ImportWatcher, socket_path: str, interval: float = 1.0, on_refresh=None) -> None:
+    """Refresh the watcher every interval seconds and answer queries on a Unix socket until interrupted
+
+    A query is one JSON object per line, answered by one JSON line on the
+    same connection (see ImportWatcher.query).
+
+    Args:
+        watcher (ImportWatcher): state of the project
+        socket_path (str): path of the socket, a stale one is replaced
+        interval (float, optional): seconds between two snapshots. Defaults to 1.0.
+        on_refresh (optional): called with the changed and removed paths after each refresh which found some
+    """
+    import socketserver
+    import stat as stat_module
+
+    class QueryHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    response = watcher.query(json.loads(line))
+                except (ValueError, AttributeError):
+                    response = {'error': "A request is a JSON object on one line"}
+                self.wfile.write((json.dumps(response) + "\n").encode())
+                self.wfile.flush()
+
+    with contextlib.suppress(FileNotFoundError):
+        if stat_module.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.unlink(socket_path)
+    os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+    server = socketserver.ThreadingUnixStreamServer(socket_path, QueryHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        while True:
+            changed, removed = watcher.refresh()
+            if (changed or removed) and on_refresh is not None:
+                on_refresh(changed, removed)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        with contextlib.suppress(OSError):
+            os.unlink(socket_path)
+
+
+def query_watch(socket_path: str, command: str, argument: str = None, timeout: float = 5.0) -> dict:
+    """Ask a running --watch process about the project
+
+    Args:
+        socket_path (str): socket of the watcher
+        command (str): one of WATCH_COMMANDS
+        argument (str, optional): module, or number of top modules
+        timeout (float, optional): seconds to wait for the answer. Defaults to 5.0.
+
+    Raises:
+        OSError: no watcher listens on the socket
+
+    Returns:
+        dict: the answer
+    """
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall((json.dumps({'command': command, 'argument': argument}) + "\n").encode())
+        with client.makefile('rb') as replies:
+            return json.loads(replies.readline())
+
+
+# Results of the projects and summary written by --batch
+BATCH_OUTPUT = "batch.json"
+# Number of unknown modules listed in the summary of a batch
+BATCH_TOP = 20
+# Exact pins of a requirements file: "name==1.2" or "name[extra] == 1.2 ; marker"
+PIN_REGEX = re.compile(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*===?\s*([^\s;#,]+)")
+
+
+class ProjectScan(NamedTuple):
+    """Imports of one project of a batch, as scanned by a worker"""
+    root: str
+    imports: ImportIndex
+    suspects: Dict[str, List[str]]
+    pins: Dict[str, str]
+    error: str
+
+
+def read_project_list(path: str) -> List[str]:
+    """Read the roots of a batch, one per line, '#' starting a comment
+
+    Args:
+        path (str): list file, '-' for the standard input
+
+    Returns:
+        List[str]: absolute roots, without duplicates
+    """
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+    roots = [line.split('#')[0].strip() for line in lines]
+    return list(dict.fromkeys(os.path.abspath(root) for root in roots if root))
+
+
+def read_pinned_requirements(root: str) -> Dict[str, str]:
+    """Versions pinned by the requirements*.txt files at the top of a project
+
+    Args:
+        root (str): project root
+
+    Returns:
+        Dict[str, str]: normalized distribution name -> pinned version
+    """
+    pins = {}
+    try:
+        names = sorted(name for name in os.listdir(root) if name.startswith('requirements') and name.endswith('.txt'))
+    except OSError:
+        return pins
+    for name in names:
+        try:
+            with open(os.path.join(root, name), 'r', errors='replace') as f:
+                for line in f:
+                    match = PIN_REGEX.match(line)
+                    if match:
+                        pins.setdefault(normalize_name(match.group(1)), match.group(2))
+        except OSError:
+            continue
+    return pins
+
+
+def suspect_imports(records: List[ImportRecord], suspects: frozenset) -> List[str]:
+    """Suspects imported by some import statements, 'from os import system' imports os.system
+
+    Args:
+        records (List[ImportRecord]): imports of a file
+        suspects (frozenset): dotted names of the suspects
+
+    Returns:
+        List[str]: suspects found, in the order of the statements
+    """
+    found = []
+    for record in records:
+        if record.level or not record.module:
+            continue
+        for imported in [record.module] + [f"{record.module}.{name}" for name in record.names]:
+            parts = imported.split('.')
+            for end in range(1, len(parts) + 1):
+                name = '.'.join(parts[:end])
+                if name in suspects and name not in found:
+                    found.append(name)
+    return found
+
+
+def _scan_project(task: Tuple[str, str, SourceWalker]) -> ProjectScan:
+    """Scan the imports of one project of a batch, in a worker process"""
+    root, cache_dir, walker = task
+    if not os.path.isdir(root):
+        return ProjectScan(root, None, {}, {}, "Not a folder")
+    index = open_scan_index(cache_dir)
+    try:
+        imports = build_import_index(root, 1, index, walker)
+    except OSError as error:
+        return ProjectScan(root, None, {}, {}, str(error))
+    finally:
+        if index is not None:
+            index.close()
+    suspects = {}
+    suspect_names = frozenset(SUSPECT_IMPORTS)
+    for records, folder, file in imports.iter_files():
+        for suspect in suspect_imports(records, suspect_names):
+            suspects.setdefault(suspect, []).append(os.path.relpath(os.path.join(folder, file), root))
+    return ProjectScan(root, imports, suspects, read_pinned_requirements(root), None)
+
+
+def scan_projects(roots: List[str], walker: SourceWalker = None, jobs: int = None,
+                  cache_dir: str = None) -> List[ProjectScan]:
+    """Scan the imports of many projects, one project per worker process
+
+    The workers share the scan index of cache_dir, so a project scanned by
+    an earlier batch or run is only parsed where it changed.
+
+    Args:
+        roots (List[str]): roots of the projects
+        walker (SourceWalker, optional): walker used for every project
+        jobs (int, optional): number of worker processes. Defaults to the number of CPUs.
+        cache_dir (str, optional): cache folder, None to parse every file
+
+    Returns:
+        List[ProjectScan]: the scans, in the order of the roots
+    """
+    walker = walker or SourceWalker()
+    tasks = [(root, cache_dir, walker) for root in roots]
+    jobs = min(jobs or os.cpu_count() or 1, len(tasks))
+    # Opened once before the workers, a stale index is cleared by a single process
+    index = open_scan_index(cache_dir)
+    if index is not None:
+        index.close()
+    if jobs <= 1:
+        return list(map(_scan_project, tasks))
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(_scan_project, tasks))
+
+
+def batch_report(scans: List[ProjectScan], resolver: 'ModuleResolver' = None,
+                 distributions: 'DistributionIndex' = None, top: int = BATCH_TOP) -> dict:
+    """Resolve the imports of every project and summarize them across projects
+
+    One resolver and one distribution index serve every project, only the
+    modules of the project itself are looked up in its root.
+
+    Args:
+        scans (List[ProjectScan]): scans of the projects
+        resolver (ModuleResolver, optional): shared resolver, without project roots
+        distributions (DistributionIndex, optional): installed distributions
+        top (int, optional): number of unknown modules in the summary. Defaults to BATCH_TOP.
+
+    Returns:
+        dict: 'projects' with the result of each project, 'summary' with the suspects and the
+            projects importing them, the distributions used with different versions and the most
+            imported unknown modules
+    """
+    distributions = distributions or distribution_index()
+    resolver = resolver or ModuleResolver([], distributions)
+    projects = []
+    suspects = {}
+    versions = {}
+    unknown = {}
+    for scan in scans:
+        if scan.error:
+            projects.append({'root': scan.root, 'error': scan.error})
+            continue
+        modules = {}
+        used = dict(scan.pins)
+        for module, info in resolver.resolve_for(scan.imports.modules(), [scan.root]).items():
+            distribution = distributions.for_module(module) if info.kind == 'third-party' else None
+            modules[module] = {'count': scan.imports.count(module), 'kind': info.kind,
+                               'distribution': distribution.name if distribution else None,
+                               'version': info.version}
+            if distribution:
+                used.setdefault(normalize_name(distribution.name), distribution.version)
+            if not info.found:
+                total, importers = unknown.get(module, (0, []))
+                unknown[module] = (total + scan.imports.count(module), importers + [scan.root])
+        for name, version in used.items():
+            versions.setdefault(name, {}).setdefault(version, []).append(scan.root)
+        for suspect, files in scan.suspects.items():
+            suspects.setdefault(suspect, {})[scan.root] = files
+        projects.append({'root': scan.root, 'files': len(scan.imports), 'imports': scan.imports.import_count,
+                         'modules': modules, 'suspects': scan.suspects, 'pins': scan.pins,
+                         'unknown': sorted(module for module, info in modules.items() if info['kind'] == 'missing')})
+    skew = {}
+    for name in sorted(versions):
+        if len(versions[name]) > 1:
+            installed = distributions.get(name)
+            skew[name] = {'installed': installed.version if installed else None,
+                          'versions': {version: versions[name][version] for version in sorted(versions[name])}}
+    ranking = sorted(unknown.items(), key=lambda item: (-item[1][0], item[0]))[:top]
+    return {'projects': projects, 'summary': {
+        'projects': len(scans), 'failed': sum(1 for scan in scans if scan.error),
+        'suspects': {suspect: suspects[suspect] for suspect in sorted(suspects)},
+        'version_skew': skew,
+        'unknown': [{'module': module, 'imports': total, 'projects': importers}
+                    for module, (total, importers) in ranking]}}
+
+
+class Distribution(NamedTuple):
+    """An installed distribution"""
+    name: str
+    version: str
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a distribution name as PEP 503 does
+
+    Args:
+        name (str): distribution name
+
+    Returns:
+        str: normalized name
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _top_level_names(distribution) -> List[str]:
+    """Return the import names provided by an installed distribution
+
+    Args:
+        distribution (importlib.metadata.Distribution): the distribution
+
+    Returns:
+        List[str]: top level packages and modules
+    """
+    top_level = distribution.read_text('top_level.txt')
+    if top_level:
+        return [name for name in top_level.split() if name]
+    names = []
+    for file in distribution.files or ():
+        parts = file.parts
+        if not parts or parts[0] in ('..', '__pycache__') or parts[0].endswith(('.dist-info', '.egg-info', '.data')):
+            continue
+        if len(parts) > 1:
+            names.append(parts[0])
+        elif parts[0].endswith('.py'):
+            names.append(parts[0][:-3])
+        elif parts[0].endswith(('.so', '.pyd')):
+            names.append(parts[0].split('.')[0])
+    return list(dict.fromkeys(names))
+
+
+class DistributionIndex:
+    """Installed distributions indexed by normalized name and by the import names they provide
+
+    Built once from importlib.metadata, every query is a dict lookup. The
+    Requires-Dist lines of each distribution are kept for RequirementGraph.
+    """
+
+    def __init__(self, distributions: Dict[str, Distribution], packages: Dict[str, List[str]],
+                 requires: Dict[str, List[str]] = None):
+        self.distributions = distributions
+        self.packages = packages
+        self.requires = requires or {}
+
+    @classmethod
+    def build(cls) -> 'DistributionIndex':
+        """Index the distributions installed for the running interpreter
+
+        Returns:
+            DistributionIndex: the index
+        """
+        import importlib.metadata
+
+        distributions = {}
+        packages = {}
+        requires = {}
+        for distribution in importlib.metadata.distributions():
+            name = distribution.metadata['Name']
+            if not name:
+                continue
+            normalized = normalize_name(name)
+            # The first distribution found on sys.path is the one which is imported
+            if normalized in distributions:
+                continue
+            distributions[normalized] = Distribution(name, distribution.version)
+            requires[normalized] = distribution.requires or []
+            for package in _top_level_names(distribution):
+                packages.setdefault(package, []).append(normalized)
+        return cls(distributions, packages, requires)
+
+    @classmethod
+    def load(cls, cache_path: str) -> 'DistributionIndex':
+        """Load the index from a cache file, rebuilding it when the environment changed
+
+        Args:
+            cache_path (str): path of the cache file
+
+        Returns:
+            DistributionIndex: the index
+        """
+        key = environment_key()
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached['key'] == key:
+                return cls({name: Distribution(*dist) for name, dist in cached['distributions'].items()},
+                           cached['packages'], cached['requires'])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        index = cls.build()
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump({'key': key, 'distributions': index.distributions, 'packages': index.packages,
+                       'requires': index.requires}, f)
+        return index
+
+    def get(self, name: str) -> Distribution:
+        """Find a distribution by its name
+
+        Args:
+            name (str): distribution name, in any normalization
+
+        Returns:
+            Distribution: the distribution, None when not installed
+        """
+        return self.distributions.get(normalize_name(name))
+
+    def for_module(self, module: str) -> Distribution:
+        """Find the distribution providing an import name (yaml -> PyYAML)
+
+        Args:
+            module (str): module name
+
+        Returns:
+            Distribution: the distribution, None when not installed
+        """
+        providers = self.packages.get(module.split('.')[0])
+        if providers:
+            return self.distributions[providers[0]]
+        return self.get(module)
+
+
+def environment_key() -> str:
+    """Key of the installed distributions, made of the mtimes of the sys.path folders
+
+    Returns:
+        str: hex digest
+    """
+    parts = [sys.executable, sys.version]
+    for entry in sys.path:
+        try:
+            parts.append(f"{entry}:{os.stat(entry or '.').st_mtime_ns}")
+        except OSError:
+            continue
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+DISTRIBUTIONS_FILE = "distributions.json"
+_distribution_index = None
+
+
+def distribution_index(cache_dir: str = None) -> DistributionIndex:
+    """Return the distribution index of the interpreter, built once per process
+
+    Args:
+        cache_dir (str, optional): folder where the index is cached between runs
+
+    Returns:
+        DistributionIndex: the index
+    """
+    global _distribution_index
+    if _distribution_index is None:
+        if cache_dir:
+            _distribution_index = DistributionIndex.load(os.path.join(cache_dir, DISTRIBUTIONS_FILE))
+        else:
+            _distribution_index = DistributionIndex.build()
+    return _distribution_index
+
+
+def get_versions(modules: list, distributions: DistributionIndex = None) -> dict:
+    """Get the version of all the modules
+
+    Args:
+        modules (list): list of modules
+        distributions (DistributionIndex, optional): installed distributions
+
+    Returns:
+        _type_: dict
+    """
+    distributions = distributions or distribution_index()
+    versions = {}
+    for module in modules:
+        distribution = distributions.for_module(module)
+        versions[module] = distribution.version if distribution else None
+    return versions
+
+
+def build_requirement_file(modules: list, distributions: DistributionIndex = None,
+                           resolver: 'ModuleResolver' = None) -> None:
+    """Build a requirement.txt file with the distributions providing the modules and their versions
+
+    Built-in, standard library and project modules are left out.
+
+    Args:
+        modules (list): list of modules
+        distributions (DistributionIndex, optional): installed distributions
+        resolver (ModuleResolver, optional): shared resolver
+
+    Returns:
+        _type_: None
+    """
+    distributions = distributions or distribution_index()
+    resolver = resolver or default_resolver()
+    requirements = {}
+    for module in dict.fromkeys(modules):
+        if resolver.resolve(module).kind in PROVIDED_KINDS:
+            continue
+        distribution = distributions.for_module(module)
+        if distribution:
+            requirements[distribution.name] = distribution.version
+        else:
+            requirements.setdefault(module, None)
+    modules_with_versions = [(module, version) for module, version in requirements.items() if version]
+    modules_without_versions = [(module, version) for module, version in requirements.items() if not version]
+    
+    sorted_modules_with_versions = sorted(modules_with_versions, key=lambda x: x[0])
+    sorted_modules_without_versions = sorted(modules_without_versions, key=lambda x: x[0])
+    
+    with open('requirements.txt', 'w') as f:
+        for module, version in sorted_modules_with_versions:
+            f.write(f"{module}=={version}\n")
+        for module, version in sorted_modules_without_versions:
+            f.write(f"{module}\n")
+
+
+# Name, extras and marker of a Requires-Dist line: "idna (<4,>=2.5) ; extra == 'x'"
+REQUIREMENT_REGEX = re.compile(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[([^\]]*)\])?")
+# Tokens of an environment marker, for the evaluator used when packaging is not installed
+MARKER_TOKEN_REGEX = re.compile(r"""\s*(?:(?P<string>'[^']*'|"[^"]*")|(?P<op>===|==|!=|<=|>=|~=|<|>|\(|\))"""
+                                r"""|(?P<word>[A-Za-z_][A-Za-z0-9_.]*))""")
+_marker_environment = None
+_marker_cache = {}
+
+
+def parse_requirement(requirement: str) -> Tuple[str, Tuple[str, ...], str]:
+    """Split a Requires-Dist line in its distribution name, extras and marker
+
+    Args:
+        requirement (str): requirement as written in the metadata
+
+    Returns:
+        Tuple[str, Tuple[str, ...], str]: name, extras and marker ('' when there is none)
+    """
+    specifier, _, marker = requirement.partition(';')
+    match = REQUIREMENT_REGEX.match(specifier)
+    if not match:
+        return None, (), ''
+    extras = tuple(extra.strip() for extra in (match.group(2) or '').split(',') if extra.strip())
+    return match.group(1), extras, marker.strip()
+
+
+def marker_environment() -> Dict[str, str]:
+    """Values of the PEP 508 marker variables for the running interpreter
+
+    Returns:
+        Dict[str, str]: variable name -> value
+    """
+    global _marker_environment
+    if _marker_environment is None:
+        import platform
+        implementation = sys.implementation.version
+        implementation_version = f"{implementation.major}.{implementation.minor}.{implementation.micro}"
+        if implementation.releaselevel != 'final':
+            implementation_version += implementation.releaselevel[0] + str(implementation.serial)
+        _marker_environment = {
+            'os_name': os.name,
+            'sys_platform': sys.platform,
+            'platform_machine': platform.machine(),
+            'platform_python_implementation': platform.python_implementation(),
+            'platform_release': platform.release(),
+            'platform_system': platform.system(),
+            'platform_version': platform.version(),
+            'python_version': '.'.join(platform.python_version_tuple()[:2]),
+            'python_full_version': platform.python_version(),
+            'implementation_name': sys.implementation.name,
+            'implementation_version': implementation_version,
+        }
+    return _marker_environment
+
+
+def _version_tuple(value: str) -> Tuple[int, ...]:
+    """Release numbers of a plain version, None when the value is not one"""
+    if not re.fullmatch(r"\d+(?:\.\d+)*", value):
+        return None
+    return tuple(int(part) for part in value.split('.'))
+
+
+def _compare_marker(left: str, op: str, right: str) -> bool:
+    """Compare two marker values, as versions when both are plain versions"""
+    if op == 'in':
+        return left in right
+    if op == 'not in':
+        return left not in right
+    left_version, right_version = _version_tuple(left), _version_tuple(right)
+    if left_version is None or right_version is None:
+        if op in ('==', '==='):
+            return left == right
+        if op == '!=':
+            return left != right
+        raise ValueError(f"can not compare {left!r} {op} {right!r}")
+    if op == '~=':
+        return left_version >= right_version and left_version[:len(right_version) - 1] == right_version[:-1]
+    size = max(len(left_version), len(right_version))
+    left_version += (0,) * (size - len(left_version))
+    right_version += (0,) * (size - len(right_version))
+    return {'==': left_version == right_version, '===': left == right, '!=': left_version != right_version,
+            '<': left_version < right_version, '<=': left_version <= right_version,
+            '>': left_version > right_version, '>=': left_version >= right_version}[op]
+
+
+def _evaluate_marker_fallback(marker: str, environment: Dict[str, str]) -> bool:
+    """Evaluate a marker with or, and, parentheses and comparisons, without packaging
+
+    Args:
+        marker (str): marker
+        environment (Dict[str, str]): values of the variables, 'extra' included
+
+    Returns:
+        bool: result of the marker
+    """
+    tokens = []
+    position = 0
+    marker = marker.strip()
+    while position < len(marker):
+        match = MARKER_TOKEN_REGEX.match(marker, position)
+        if not match or match.end() == position:
+            raise ValueError(f"invalid marker {marker!r}")
+        position = match.end()
+        if match.group('string') is not None:
+            tokens.append(('value', match.group('string')[1:-1]))
+        elif match.group('op') is not None:
+            tokens.append(('op', match.group('op')))
+        elif match.group('word') in ('and', 'or', 'in', 'not'):
+            tokens.append(('op', match.group('word')))
+        else:
+            tokens.append(('variable', match.group('word')))
+    position = 0
+
+    def take() -> Tuple[str, str]:
+        nonlocal position
+        if position >= len(tokens):
+            raise ValueError(f"invalid marker {marker!r}")
+        position += 1
+        return tokens[position - 1]
+
+    def peek(value: str) -> bool:
+        return position < len(tokens) and tokens[position] == ('op', value)
+
+    def value() -> Tuple[str, str]:
+        kind, token = take()
+        if kind == 'value':
+            return token, kind
+        if kind == 'variable' and token in environment:
+            return environment[token], token
+        raise ValueError(f"unknown marker variable {token!r}")
+
+    def comparison() -> bool:
+        if peek('('):
+            take()
+            result = disjunction()
+            if take() != ('op', ')'):
+                raise ValueError(f"invalid marker {marker!r}")
+            return result
+        left, left_name = value()
+        kind, op = take()
+        if kind != 'op':
+            raise ValueError(f"invalid marker {marker!r}")
+        if op == 'not':
+            if take() != ('op', 'in'):
+                raise ValueError(f"invalid marker {marker!r}")
+            op = 'not in'
+        right, right_name = value()
+        if 'extra' in (left_name, right_name):
+            left, right = normalize_name(left), normalize_name(right)
+        return _compare_marker(left, op, right)
+
+    def conjunction() -> bool:
+        result = comparison()
+        while peek('and'):
+            take()
+            result = comparison() and result
+        return result
+
+    def disjunction() -> bool:
+        result = conjunction()
+        while peek('or'):
+            take()
+            result = conjunction() or result
+        return result
+
+    result = disjunction()
+    if position != len(tokens):
+        raise ValueError(f"invalid marker {marker!r}")
+    return result
+
+
+def evaluate_marker(marker: str, extra: str = '') -> bool:
+    """Evaluate an environment marker for the running interpreter
+
+    packaging is used when installed, otherwise a small evaluator covering the
+    markers found in Requires-Dist. A marker which can not be evaluated is
+    considered true, so the dependency is kept. Results are memoized.
+
+    Args:
+        marker (str): marker, without the leading ';'
+        extra (str, optional): extra being installed, '' for none
+
+    Returns:
+        bool: True when the requirement applies
+    """
+    key = (marker, extra)
+    result = _marker_cache.get(key)
+    if result is None:
+        try:
+            from packaging.markers import Marker
+        except ImportError:
+            try:
+                result = _evaluate_marker_fallback(marker, dict(marker_environment(), extra=extra))
+            except (ValueError, KeyError):
+                result = True
+        else:
+            from packaging.markers import InvalidMarker, UndefinedComparison, UndefinedEnvironmentName
+            try:
+                result = Marker(marker).evaluate({'extra': extra})
+            except (InvalidMarker, UndefinedComparison, UndefinedEnvironmentName):
+                result = True
+        _marker_cache[key] = result
+    return result
+
+
+class RequirementGraph:
+    """Dependency graph of the installed distributions, read from their Requires-Dist
+
+    The dependencies of a distribution with a set of extras are evaluated once,
+    the closure of every root once, so many projects checked against the same
+    environment share all the work. Distributions which are required but not
+    installed are collected in missing.
+    """
+
+    def __init__(self, distributions: DistributionIndex):
+        self.distributions = distributions
+        self.missing = set()
+        self._dependencies = {}
+        self._closures = {}
+
+    def dependencies(self, name: str, extras: Iterable[str] = ()) -> List[Tuple[str, frozenset]]:
+        """Direct dependencies of a distribution installed with some extras
+
+        Args:
+            name (str): distribution name
+            extras (Iterable[str], optional): extras asked for the distribution
+
+        Returns:
+            List[Tuple[str, frozenset]]: normalized name and extras of each dependency
+        """
+        key = (normalize_name(name), frozenset(normalize_name(extra) for extra in extras))
+        dependencies = self._dependencies.get(key)
+        if dependencies is None:
+            active = ('',) + tuple(sorted(key[1]))
+            dependencies = []
+            for requirement in self.distributions.requires.get(key[0], ()):
+                dependency, dependency_extras, marker = parse_requirement(requirement)
+                if dependency is None:
+                    continue
+                if marker and not any(evaluate_marker(marker, extra) for extra in active):
+                    continue
+                dependencies.append((normalize_name(dependency), frozenset(dependency_extras)))
+            self._dependencies[key] = dependencies
+        return dependencies
+
+    def _closure(self, node: Tuple[str, frozenset]) -> Dict[str, frozenset]:
+        closure = self._closures.get(node)
+        if closure is None:
+            parents = {node[0]: set()}
+            seen = {node}
+            pending = [node]
+            while pending:
+                parent = pending.pop()
+                for dependency in self.dependencies(*parent):
+                    parents.setdefault(dependency[0], set()).add(parent[0])
+                    if dependency[0] not in self.distributions.distributions:
+                        self.missing.add(dependency[0])
+                    elif dependency not in seen:
+                        seen.add(dependency)
+                        pending.append(dependency)
+            closure = {name: frozenset(via - {name}) for name, via in parents.items()}
+            self._closures[node] = closure
+        return closure
+
+    def closure(self, names: Iterable[str]) -> Dict[str, List[str]]:
+        """Distributions needed by some distributions, themselves included
+
+        Args:
+            names (Iterable[str]): names of the required distributions
+
+        Returns:
+            Dict[str, List[str]]: normalized name -> sorted names of the distributions requiring it
+        """
+        merged = {}
+        for name in names:
+            for dependency, via in self._closure((normalize_name(name), frozenset())).items():
+                merged.setdefault(dependency, set()).update(via)
+        return {name: sorted(merged[name]) for name in sorted(merged)}
+
+
+_requirement_graph = None
+
+
+def requirement_graph(distributions: DistributionIndex = None) -> RequirementGraph:
+    """Return the requirement graph of an index, shared by every project of the process
+
+    Args:
+        distributions (DistributionIndex, optional): installed distributions
+
+    Returns:
+        RequirementGraph: the graph
+    """
+    global _requirement_graph
+    distributions = distributions or distribution_index()
+    if _requirement_graph is None or _requirement_graph.distributions is not distributions:
+        _requirement_graph = RequirementGraph(distributions)
+    return _requirement_graph
+
+
+LOCK_FILE = "requirements-lock.txt"
+
+
+def build_lock_file(modules: list, distributions: DistributionIndex = None, resolver: 'ModuleResolver' = None,
+                    graph: RequirementGraph = None, path: str = LOCK_FILE) -> str:
+    """Build a fully pinned requirements file with the distributions of the modules and all their dependencies
+
+    Built-in, standard library and project modules are left out. The file only
+    depends on the imports and on the environment, never on the date or on the
+    order of the modules, so it can be committed and compared.
+
+    Args:
+        modules (list): list of modules
+        distributions (DistributionIndex, optional): installed distributions
+        resolver (ModuleResolver, optional): shared resolver
+        graph (RequirementGraph, optional): shared requirement graph
+        path (str, optional): file written
+
+    Returns:
+        str: content of the file
+    """
+    distributions = distributions or distribution_index()
+    resolver = resolver or default_resolver()
+    graph = graph or requirement_graph(distributions)
+    roots = set()
+    unknown = set()
+    for module in dict.fromkeys(modules):
+        if resolver.resolve(module).kind in PROVIDED_KINDS:
+            continue
+        distribution = distributions.for_module(module)
+        if distribution:
+            roots.add(normalize_name(distribution.name))
+        else:
+            unknown.add(module)
+    closure = graph.closure(roots)
+    import platform
+    lines = [f"# Generated by ImportAnal {__version__} for {platform.python_implementation()} "
+             f"{'.'.join(platform.python_version_tuple()[:2])} on {sys.platform}",
+             "# Every distribution imported by the project, with its dependencies"]
+    for name, via in closure.items():
+        distribution = distributions.distributions.get(name)
+        requirement = f"{distribution.name}=={distribution.version}" if distribution else f"# {name}: not installed"
+        lines.append(requirement)
+        if via:
+            lines.append(f"    # via {', '.join(via)}")
+    for module in sorted(unknown):
+        lines.append(f"# {module}: imported, no installed distribution provides it")
+    content = "\n".join(lines) + "\n"
+    with open(path, 'w') as f:
+        f.write(content)
+    return content
+
+
+class ModuleInfo(NamedTuple):
+    """Resolution of an imported module, obtained without executing it"""
+    name: str
+    found: bool
+    origin: str
+    kind: str
+    version: str
+
+
+# Modules of these kinds come with Python or with the project, they are never requirements
+PROVIDED_KINDS = ('builtin', 'stdlib', 'local')
+
+
+class ModuleResolver:
+    """Resolve module names to their spec without importing them
+
+    Each unique name is resolved once with importlib.util.find_spec and the
+    result is shared by every caller. The kind of a module is one of
+    'builtin', 'stdlib', 'local', 'third-party' or 'missing'.
+    """
+
+    def __init__(self, project_roots: List[str] = (), distributions: DistributionIndex = None):
+        self.project_roots = [os.path.abspath(root) for root in project_roots]
+        self.distributions = distributions
+        self._cache = {}
+        self.lookups = 0
+
+    def resolve(self, name: str) -> ModuleInfo:
+        """Resolve a module name
+
+        Args:
+            name (str): dotted module name
+
+        Returns:
+            ModuleInfo: the cached resolution
+        """
+        self.lookups += 1
+        info = self._cache.get(name)
+        if info is None:
+            info = self._cache[name] = self._resolve(name)
+        return info
+
+    def resolve_many(self, names: List[str]) -> Dict[str, ModuleInfo]:
+        """Resolve every unique name of a list
+
+        Args:
+            names (List[str]): module names, duplicates allowed
+
+        Returns:
+            Dict[str, ModuleInfo]: resolution of each unique name
+        """
+        return {name: self.resolve(name) for name in dict.fromkeys(names)}
+
+    def resolve_for(self, names: List[str], roots: List[str]) -> Dict[str, ModuleInfo]:
+        """Resolve the names imported by another project, the modules found outside of its roots
+        sharing the cache of this resolver
+
+        Args:
+            names (List[str]): top level module names, duplicates allowed
+            roots (List[str]): roots of the project
+
+        Returns:
+            Dict[str, ModuleInfo]: resolution of each unique name
+        """
+        roots = [os.path.abspath(root) for root in roots]
+        resolved = {}
+        for name in dict.fromkeys(names):
+            spec = None
+            if name and name not in sys.builtin_module_names:
+                try:
+                    spec = importlib.machinery.PathFinder.find_spec(name, roots)
+                except (ImportError, ValueError, AttributeError):
+                    spec = None
+            if spec is None:
+                resolved[name] = self.resolve(name)
+                continue
+            origin = spec.origin if spec.has_location else None
+            if origin is None and spec.submodule_search_locations:
+                origin = list(spec.submodule_search_locations)[0]
+            resolved[name] = ModuleInfo(name, True, origin, 'local', None)
+        return resolved
+
+    def find_spec(self, name: str):
+        """Find the spec of a module, parents are located but never executed
+
+        Args:
+            name (str): dotted module name
+
+        Returns:
+            importlib.machinery.ModuleSpec: the spec, None when the module does not exist
+        """
+        top, *parts = name.split('.')
+        try:
+            spec = importlib.machinery.PathFinder.find_spec(top, self.project_roots) if self.project_roots else None
+            spec = spec or importlib.util.find_spec(top)
+            for position, part in enumerate(parts, 1):
+                if spec is None or spec.submodule_search_locations is None:
+                    return None
+                spec = importlib.machinery.PathFinder.find_spec('.'.join([top] + parts[:position]),
+                                                                 list(spec.submodule_search_locations))
+        except (ImportError, ValueError, AttributeError):
+            return None
+        return spec
+
+    def _resolve(self, name: str) -> ModuleInfo:
+        if not name:
+            return ModuleInfo(name, False, None, 'missing', None)
+        top = name.split('.')[0]
+        if top in sys.builtin_module_names:
+            return ModuleInfo(name, True, 'built-in', 'builtin', None)
+        spec = self.find_spec(name)
+        if spec is None:
+            return ModuleInfo(name, False, None, 'missing', None)
+        origin = spec.origin if spec.has_location else None
+        if origin is None and spec.submodule_search_locations:
+            origin = list(spec.submodule_search_locations)[0]
+        return ModuleInfo(name, True, origin, self._kind(top, spec, origin), self._version(top))
+
+    def _kind(self, top: str, spec, origin: str) -> str:
+        if spec.origin in ('built-in', 'frozen'):
+            return 'builtin'
+        if origin and any(os.path.abspath(origin).startswith(os.path.join(root, '')) for root in self.project_roots):
+            return 'local'
+        stdlib_names = getattr(sys, 'stdlib_module_names', None)
+        if stdlib_names is not None:
+            return 'stdlib' if top in stdlib_names else 'third-party'
+        stdlib = os.path.join(sysconfig.get_paths()['stdlib'], '')
+        if origin and origin.startswith(stdlib) and 'site-packages' not in origin:
+            return 'stdlib'
+        return 'third-party'
+
+    def _version(self, top: str) -> str:
+        self.distributions = self.distributions or distribution_index()
+        distribution = self.distributions.for_module(top)
+        return distribution.version if distribution else None
+
+
+_default_resolver = None
+
+
+def default_resolver() -> ModuleResolver:
+    """Return the resolver shared by the calls which are not given one
+
+    Returns:
+        ModuleResolver: the shared resolver
+    """
+    global _default_resolver
+    if _default_resolver is None:
+        _default_resolver = ModuleResolver()
+    return _default_resolver
+
+
+def delete_module_not_found(modules: List[str], resolver: ModuleResolver = None) -> List[str]:
+    """Delete all module which cannot be found
+
+    Args:
+        modules (List[str]): list of modules
+        resolver (ModuleResolver, optional): shared resolver
+
+    Returns:
+        List[str]: list of the modules which exist
+    """
+    resolver = resolver or default_resolver()
+    return [module for module in modules if resolver.resolve(module).found]
+
+
+DUMP_DIR = "SourceCode"
+DUMP_MANIFEST = "manifest.json"
+
+
+class DumpedFile(NamedTuple):
+    """A file copied into the dump folder"""
+    module: str
+    source: str
+    path: str
+    size: int
+    digest: str = None
+
+
+STORE_DIR = "store"
+
+
+class SourceStore:
+    """Content-addressed, compressed store of dumped sources shared by every run and project
+
+    objects/ab/<sha256>.xz holds each unique file content once, compressed
+    with lzma. dists/<distribution>-<version>/<module>.json is the index of
+    a dumped module: its relative paths with their hash, size and origin,
+    so a single file can be read without unpacking the others.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_written = 0
+        self.manifests_reused = 0
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], digest + '.xz')
+
+    def _manifest_path(self, key: str, module: str) -> str:
+        return os.path.join(self.root, 'dists', key, module + '.json')
+
+    def put(self, content: bytes) -> str:
+        """Add a content to the store, nothing is written when it is already there
+
+        Args:
+            content (bytes): content of a file
+
+        Returns:
+            str: sha256 of the content
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            atomic_write(object_path, lzma.compress(content, preset=1))
+            self.objects_written += 1
+        return digest
+
+    def put_file(self, source: str) -> Tuple[str, int]:
+        """Add the content of a file to the store
+
+        Args:
+            source (str): path of the file
+
+        Returns:
+            Tuple[str, int]: sha256 and size of the content
+        """
+        with open(source, 'rb') as f:
+            content = f.read()
+        return self.put(content), len(content)
+
+    def read(self, digest: str) -> bytes:
+        """Read a single content of the store
+
+        Args:
+            digest (str): sha256 of the content
+
+        Returns:
+            bytes: the content
+        """
+        with open(self._object_path(digest), 'rb') as f:
+            return lzma.decompress(f.read())
+
+    def key(self, module: str, resolver: 'ModuleResolver') -> str:
+        """Key under which the files of a module are reused: its distribution and version
+
+        Args:
+            module (str): module name
+            resolver (ModuleResolver): shared resolver
+
+        Returns:
+            str: the key, None for the project modules which have no version
+        """
+        info = resolver.resolve(module)
+        if info.kind in ('builtin', 'stdlib'):
+            return f"{sys.implementation.name}-{sysconfig.get_python_version()}-{sys.version_info.micro}"
+        distributions = resolver.distributions or distribution_index()
+        distribution = distributions.for_module(module)
+        if info.kind == 'third-party' and distribution is not None:
+            return f"{normalize_name(distribution.name)}-{distribution.version}"
+        return None
+
+    def load_manifest(self, key: str, module: str) -> dict:
+        """Load the index of a dumped module
+
+        Args:
+            key (str): distribution key
+            module (str): module name
+
+        Returns:
+            dict: relative path -> [sha256, size, origin], None when the module was never stored
+        """
+        try:
+            with open(self._manifest_path(key, module), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(os.path.exists(self._object_path(entry[0])) for entry in manifest.values()):
+            return None
+        self.manifests_reused += 1
+        return manifest
+
+    def save_manifest(self, key: str, module: str, manifest: dict) -> None:
+        """Save the index of a dumped module
+
+        Args:
+            key (str): distribution key
+            module (str): module name
+            manifest (dict): relative path -> [sha256, size, origin]
+        """
+        manifest_path = self._manifest_path(key, module)
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        atomic_write(manifest_path, json.dumps(manifest).encode())
+
+
+def atomic_write(path: str, content: bytes, mode: int = None) -> None:
+    """Write a file through a temporary file renamed over it
+
+    Args:
+        path (str): path of the file
+        content (bytes): content of the file
+        mode (int, optional): permissions of the file, those of a new file by default
+    """
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, 'wb') as f:
+        f.write(content)
+    if mode is not None:
+        os.chmod(temporary_path, mode)
+    os.replace(temporary_path, path)
+
+
+def module_files(module: str, resolver: 'ModuleResolver' = None) -> List[Tuple[str, str]]:
+    """List the files of a module from its spec, without importing it
+
+    A package yields its whole file tree, compiled caches excluded.
+
+    Args:
+        module (str): module name
+        resolver (ModuleResolver, optional): shared resolver
+
+    Returns:
+        List[Tuple[str, str]]: source paths and their path relative to the dump folder
+    """
+    resolver = resolver or default_resolver()
+    spec = resolver.find_spec(module)
+    if spec is None:
+        return []
+    origin = spec.origin if spec.has_location else getattr(spec.loader_state, 'filename', None)
+    if spec.submodule_search_locations:
+        files = []
+        for location in spec.submodule_search_locations:
+            for root, dirs, names in os.walk(location):
+                dirs[:] = [name for name in dirs if name != '__pycache__']
+                for name in names:
+                    if name.endswith(('.pyc', '.pyo')):
+                        continue
+                    source = os.path.join(root, name)
+                    files.append((source, os.path.join(module, os.path.relpath(source, location))))
+        return files
+    if origin and os.path.isfile(origin):
+        return [(origin, os.path.basename(origin))]
+    return []
+
+
+def copy_file(source: str, destination: str) -> int:
+    """Copy a file inside the kernel (copy_file_range or sendfile) when the platform allows it
+
+    Args:
+        source (str): path of the file
+        destination (str): path of the copy
+
+    Returns:
+        int: number of bytes copied
+    """
+    with open(source, 'rb') as fsrc, open(destination, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        copied = 0
+        # copy_file_range fails with EXDEV across filesystems on older kernels, sendfile takes over
+        methods = ['copy_file_range'] + (['sendfile'] if sys.platform.startswith('linux') else [])
+        for method in methods:
+            kernel_copy = getattr(os, method, None)
+            if kernel_copy is None or copied >= size:
+                continue
+            try:
+                if method == 'sendfile':
+                    # sendfile writes at the position of the copy, copy_file_range did not move it
+                    os.lseek(fdst.fileno(), copied, os.SEEK_SET)
+                while copied < size:
+                    if method == 'sendfile':
+                        sent = kernel_copy(fdst.fileno(), fsrc.fileno(), copied, size - copied)
+                    else:
+                        sent = kernel_copy(fsrc.fileno(), fdst.fileno(), size - copied, copied, copied)
+                    if not sent:
+                        break
+                    copied += sent
+            except OSError:
+                continue
+        if copied < size or size == 0:
+            fsrc.seek(copied)
+            fdst.seek(copied)
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+            copied = fdst.tell()
+    return copied
+
+
+def dump_sources(modules: List[str], destination: str = DUMP_DIR, resolver: 'ModuleResolver' = None,
+                 jobs: int = None, store: SourceStore = None, materialize: bool = True,
+                 probes: 'ProbePool' = None) -> List[DumpedFile]:
+    """Copy the complete file tree of every module into the dump folder, without importing them
+
+    Files are located from the module specs and copied by a thread pool,
+    the list of dumped files and their sizes is written to the manifest.
+    With a store, modules already stored for the same distribution version
+    are reused and the dump folder is only updated where it changed.
+
+    Args:
+        modules (List[str]): module names, duplicates allowed
+        destination (str, optional): dump folder. Defaults to "SourceCode".
+        resolver (ModuleResolver, optional): shared resolver
+        jobs (int, optional): number of copying threads. Defaults to 4 per CPU.
+        store (SourceStore, optional): content-addressed store of the sources
+        materialize (bool, optional): write the files in the dump folder, otherwise only the
+            manifest is written and the files are read from the store. Defaults to True.
+        probes (ProbePool, optional): pool importing the modules which have no file, in one batch
+
+    Returns:
+        List[DumpedFile]: the dumped files
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    resolver = resolver or default_resolver()
+    previous = read_dump_manifest(destination)
+    tasks = []
+    dumped = []
+    fileless = []
+    for module in dict.fromkeys(modules):
+        if module in sys.builtin_module_names:
+            print(f"{module} is a built-in module")
+            continue
+        key = store.key(module, resolver) if store is not None else None
+        manifest = store.load_manifest(key, module) if key else None
+        if manifest is not None:
+            dumped.extend(DumpedFile(module, origin, os.path.join(destination, relative), size, digest)
+                          for relative, (digest, size, origin) in manifest.items())
+            continue
+        files = module_files(module, resolver)
+        if not files:
+            if resolver.resolve(module).found:
+                fileless.append((module, key))
+            else:
+                print(f"Module not installed: {module}")
+            continue
+        tasks.extend((module, key, source, relative) for source, relative in files)
+    def copy_task(task: Tuple[str, str, str, str]) -> DumpedFile:
+        module, key, source, relative = task
+        path = os.path.join(destination, relative)
+        try:
+            if store is not None:
+                digest, size = store.put_file(source)
+                return DumpedFile(module, source, path, size, digest)
+            return DumpedFile(module, source, path, copy_file(source, path))
+        except OSError:
+            print(f"Cannot write source code of {module} to {path}")
+            return None
+
+    if store is None:
+        for folder in {os.path.dirname(os.path.join(destination, task[3])) for task in tasks}:
+            os.makedirs(folder, exist_ok=True)
+    workers = jobs or 4 * (os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        stored = [(task, file) for task, file in zip(tasks, executor.map(copy_task, tasks)) if file is not None]
+    if fileless:
+        probes = probes or default_probe_pool()
+        probes.probe([module for module, key in fileless], source=True)
+        for module, key in fileless:
+            file = get_source_code(module, destination, probes, store)
+            if file is not None:
+                stored.append(((module, key, file.source, os.path.relpath(file.path, destination)), file))
+    dumped.extend(file for task, file in stored)
+    STATS.count('files_dumped', len(stored))
+    STATS.count('bytes_dumped', sum(file.size for task, file in stored))
+
+    if store is not None:
+        manifests = {}
+        for (module, key, source, relative), file in stored:
+            if key:
+                manifests.setdefault((key, module), {})[relative] = [file.digest, file.size, file.source]
+        for (key, module), manifest in manifests.items():
+            store.save_manifest(key, module, manifest)
+        if materialize:
+            materialize_dump(dumped, destination, store, previous, workers)
+
+    write_dump_manifest(dumped, destination, materialize)
+    return dumped
+
+
+def read_dump_manifest(destination: str) -> dict:
+    """Read the manifest of the previous dump
+
+    Args:
+        destination (str): dump folder
+
+    Returns:
+        dict: the manifest, None when there is none
+    """
+    try:
+        with open(os.path.join(destination, DUMP_MANIFEST), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def materialize_dump(dumped: List[DumpedFile], destination: str, store: SourceStore, previous: dict,
+                     workers: int) -> None:
+    """Bring the dump folder in line with the dumped files, rewriting only what changed
+
+    Args:
+        dumped (List[DumpedFile]): the dumped files
+        destination (str): dump folder
+        store (SourceStore): store holding their content
+        previous (dict): manifest of the previous dump, None when there is none
+        workers (int): number of threads
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    previous_digests = {}
+    if previous and previous.get('materialized', True):
+        for entry in previous.get('modules', {}).values():
+            for file in entry['files']:
+                previous_digests[file['path']] = file.get('digest')
+
+    def unchanged(file: DumpedFile) -> bool:
+        relative = os.path.relpath(file.path, destination)
+        try:
+            return previous_digests.get(relative) == file.digest and os.path.getsize(file.path) == file.size
+        except OSError:
+            return False
+
+    changed = [file for file in dumped if not unchanged(file)]
+    for folder in {os.path.dirname(file.path) for file in changed}:
+        os.makedirs(folder, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda file: atomic_write(file.path, store.read(file.digest)), changed))
+
+    current = {os.path.relpath(file.path, destination) for file in dumped}
+    stale = set(previous_digests) - current
+    for relative in stale:
+        try:
+            os.remove(os.path.join(destination, relative))
+        except OSError:
+            pass
+    # Deepest folders first, so a module folder emptied by the removals goes too
+    for folder in sorted({os.path.dirname(relative) for relative in stale}, key=len, reverse=True):
+        while folder:
+            try:
+                os.rmdir(os.path.join(destination, folder))
+            except OSError:
+                break
+            folder = os.path.dirname(folder)
+
+
+def reset_dump_folder(destination: str = DUMP_DIR, store: SourceStore = None) -> None:
+    """Prepare the dump folder, it is only wiped when there is no store to reuse it from
+
+    Args:
+        destination (str, optional): dump folder. Defaults to "SourceCode".
+        store (SourceStore, optional): content-addressed store of the sources
+    """
+    if store is None:
+        print(f"Deleting {destination} folder ...")
+        if os.path.exists(destination):
+            shutil.rmtree(destination)
+    os.makedirs(destination, exist_ok=True)
+
+
+def write_dump_manifest(dumped: List[DumpedFile], destination: str, materialized: bool = True) -> None:
+    """Write the manifest of a dump: every file with its module, origin, size and content hash
+
+    Args:
+        dumped (List[DumpedFile]): the dumped files
+        destination (str): dump folder
+        materialized (bool, optional): whether the files are in the dump folder or only in the store
+    """
+    manifest = {'total_size': sum(file.size for file in dumped), 'materialized': materialized, 'modules': {}}
+    for file in dumped:
+        entry = manifest['modules'].setdefault(file.module, {'files': [], 'size': 0})
+        entry['files'].append({'path': os.path.relpath(file.path, destination), 'source': file.source,
+                               'size': file.size, 'digest': file.digest})
+        entry['size'] += file.size
+    os.makedirs(destination, exist_ok=True)
+    with open(os.path.join(destination, DUMP_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+# Seconds a probe may take, memory of a probe worker, modules sent at once and probes before a worker is replaced
+PROBE_TIMEOUT = 10.0
+PROBE_MEMORY_LIMIT = 1024 * 1024 * 1024
+PROBE_BATCH_SIZE = 16
+PROBE_RECYCLE = 64
+
+# Run by the probe workers: the first line sets sys.path and the memory limit, each next line is a batch of
+# modules, answered with one JSON line per module. The probed modules print to stderr, never in the replies.
+PROBE_WORKER = r'''
+import importlib, inspect, json, sys
+config = json.loads(sys.stdin.readline())
+sys.path[:] = config['path']
+try:
+    import resource
+    resource.setrlimit(resource.RLIMIT_AS, (config['memory'], config['memory']))
+except (ImportError, ValueError, OSError):
+    pass
+replies, sys.stdout = sys.stdout, sys.stderr
+for line in sys.stdin:
+    request = json.loads(line)
+    for name in request['modules']:
+        reply = {'module': name, 'version': None, 'source': None, 'error': None}
+        try:
+            module = importlib.import_module(name)
+            version = getattr(module, '__version__', None)
+            reply['version'] = version if isinstance(version, str) else None
+            if request['source']:
+                try:
+                    reply['source'] = inspect.getsource(module)
+                except (OSError, TypeError) as error:
+                    reply['error'] = f"{type(error).__name__}: {error}"
+        except BaseException as error:
+            reply['error'] = f"{type(error).__name__}: {error}"
+        replies.write(json.dumps(reply) + "\n")
+        replies.flush()
+'''
+
+
+class ProbeResult(NamedTuple):
+    """What importing a module in a probe worker told"""
+    module: str
+    version: str
+    source: str
+    error: str
+
+
+class _ProbeWorker:
+    """A probe subprocess, its replies are read by a thread so that they can be waited with a timeout"""
+
+    def __init__(self, path: List[str], memory_limit: int):
+        import queue
+        import subprocess
+        self.process = subprocess.Popen([sys.executable, '-c', PROBE_WORKER], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                        encoding='utf-8', bufsize=1)
+        self.replies = queue.Queue()
+        self.probes = 0
+        threading.Thread(target=self._read, daemon=True).start()
+        self.process.stdin.write(json.dumps({'path': path, 'memory': memory_limit}) + "\n")
+        self.process.stdin.flush()
+
+    def _read(self) -> None:
+        for line in self.process.stdout:
+            self.replies.put(line)
+        self.replies.put(None)
+
+    def send(self, modules: List[str], source: bool) -> None:
+        self.process.stdin.write(json.dumps({'modules': modules, 'source': source}) + "\n")
+        self.process.stdin.flush()
+
+    def receive(self, timeout: float) -> dict:
+        """Next reply, None when the worker exited or did not answer in time"""
+        import queue
+        try:
+            line = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return json.loads(line) if line is not None else None
+
+    def stop(self, kill: bool = False) -> None:
+        with contextlib.suppress(OSError):
+            if kill:
+                self.process.kill()
+            else:
+                self.process.stdin.close()
+        with contextlib.suppress(Exception):
+            self.process.wait(timeout=PROBE_TIMEOUT)
+
+
+class ProbePool:
+    """Import modules in a pool of reusable subprocess workers instead of the scanning process
+
+    A slow or hanging import is stopped after timeout seconds, a worker
+    cannot use more than memory_limit bytes (where resource is available),
+    and the imported modules live in the workers, which are replaced after
+    max_probes modules. Modules are sent in batches and every unique module
+    is probed once, results are kept for the life of the pool.
+    """
+
+    def __init__(self, path: List[str] = None, workers: int = None, timeout: float = PROBE_TIMEOUT,
+                 memory_limit: int = PROBE_MEMORY_LIMIT, batch_size: int = PROBE_BATCH_SIZE,
+                 max_probes: int = PROBE_RECYCLE):
+        self.path = list(path if path is not None else sys.path)
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.batch_size = max(1, batch_size)
+        self.max_probes = max(1, max_probes)
+        self._cache = {}
+        self._idle = []
+        self._lock = threading.Lock()
+        self.probes_run = 0
+        self.timeouts = 0
+        self.workers_started = 0
+
+    def probe(self, modules: List[str], source: bool = False) -> Dict[str, ProbeResult]:
+        """Import every unique module in the workers
+
+        Args:
+            modules (List[str]): module names, duplicates allowed
+            source (bool, optional): also get the source with inspect.getsource. Defaults to False.
+
+        Returns:
+            Dict[str, ProbeResult]: result of each module
+        """
+        modules = list(dict.fromkeys(modules))
+        missing = [module for module in modules if (module, True) not in self._cache and
+                   (source or (module, False) not in self._cache)]
+        if missing:
+            from concurrent.futures import ThreadPoolExecutor
+            batches = [missing[start:start + self.batch_size] for start in range(0, len(missing), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(batches))) as executor:
+                for results in executor.map(lambda batch: self._run_batch(batch, source), batches):
+                    for result in results:
+                        self._cache[(result.module, source)] = result
+        return {module: self._cache.get((module, True)) or self._cache[(module, False)] for module in modules}
+
+    def _acquire(self) -> _ProbeWorker:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self.workers_started += 1
+        return _ProbeWorker(self.path, self.memory_limit)
+
+    def _release(self, worker: _ProbeWorker) -> None:
+        if worker.probes >= self.max_probes:
+            # Every module imported so far stays resident in the worker
+            worker.stop()
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def _run_batch(self, batch: List[str], source: bool) -> List[ProbeResult]:
+        results = []
+        pending = list(batch)
+        while pending:
+            try:
+                worker = self._acquire()
+                chunk = pending[:self.max_probes - worker.probes]
+                worker.send(chunk, source)
+            except OSError as error:
+                return results + [ProbeResult(module, None, None, f"Cannot start a probe worker: {error}")
+                                  for module in pending]
+            for position, module in enumerate(chunk):
+                reply = worker.receive(self.timeout)
+                with self._lock:
+                    self.probes_run += 1
+                if reply is None:
+                    timed_out = worker.process.poll() is None
+                    if timed_out:
+                        with self._lock:
+                            self.timeouts += 1
+                    error = f"Import took more than {self.timeout:g} s" if timed_out else "The probe worker exited"
+                    results.append(ProbeResult(module, None, None, error))
+                    worker.stop(kill=True)
+                    # The rest of the chunk goes to a new worker
+                    pending = chunk[position + 1:] + pending[len(chunk):]
+                    break
+                results.append(ProbeResult(module, reply['version'], reply['source'], reply['error']))
+            else:
+                worker.probes += len(chunk)
+                pending = pending[len(chunk):]
+                self._release(worker)
+        return results
+
+    def close(self) -> None:
+        """Stop the idle workers"""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self) -> 'ProbePool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_default_probe_pool = None
+
+
+def default_probe_pool() -> ProbePool:
+    """Return the probe pool shared by the calls which are not given one
+
+    Returns:
+        ProbePool: the shared pool
+    """
+    global _default_probe_pool
+    if _default_probe_pool is None:
+        import atexit
+        _default_probe_pool = ProbePool()
+        # Its workers would otherwise live until the interpreter kills them
+        atexit.register(_default_probe_pool.close)
+    return _default_probe_pool
+
+
+def get_source_code(module: str, destination: str = DUMP_DIR, probes: ProbePool = None,
+                    store: SourceStore = None) -> DumpedFile:
+    """Get the source code of a module which has no file on disk (zipped, generated...)
+
+    The module is imported in a probe worker, never in this process. Its
+    source goes to source_import_<module>.txt, or only to the store when
+    there is one, materialize_dump writing the file.
+
+    Args:
+        module (str): module name
+        destination (str, optional): dump folder. Defaults to "SourceCode".
+        probes (ProbePool, optional): shared probe pool
+        store (SourceStore, optional): content-addressed store of the sources
+
+    Returns:
+        DumpedFile: the dumped source, None when it could not be written
+    """
+    if module in sys.builtin_module_names:
+        print(f"{module} is a built-in module")
+        return None
+
+    probes = probes or default_probe_pool()
+    result = probes.probe([module], source=True)[module]
+    source = result.source
+    source_file = os.path.join(destination, f"source_import_{module}.txt")
+    if source is None:
+        print("\n")
+        print("=====================================================")
+        print(f"/!\\ Cannot get source code of {module}")
+        print("=====================================================")
+        source = "Careful, the source code of this module is not available."
+    content = source.encode('utf-8', errors='surrogateescape')
+    # No file to point at, the origin tells the source was read by importing the module
+    origin = f"probe:{module}"
+    if store is not None:
+        return DumpedFile(module, origin, source_file, len(content), store.put(content))
+    try:
+        os.makedirs(destination, exist_ok=True)
+        atomic_write(source_file, content)
+    except OSError:
+        print(f"Cannot write source code of {module} to {source_file}")
+        return None
+    return DumpedFile(module, origin, source_file, len(content))
+
+
+class ScannedFile(NamedTuple):
+    """A file of the analyzed folder with the suspects found in it"""
+    name: str
+    path: str
+    line_count: int
+    matches: List[SuspectMatch]
+
+
+def display_name(file: str) -> str:
+    """Return the name of a scanned file as shown in the report (not source_import_xxx.txt)
+
+    Args:
+        file (str): file name
+
+    Returns:
+        str: display name
+    """
+    if re.search(r"source_import_(.*).txt", file):
+        file = file.replace("source_import_", "")
+        file = file.replace(".txt", "")
+    return file
+
+
+PYTHON_EXTENSIONS = ('.py', '.pyw', '.pyi')
+
+# Occurrences which use the suspect, the other kinds only mention it
+USAGE_KINDS = ('import', 'call', 'attribute', 'name')
+
+
+def classify_suspects(source: bytes, matcher: SuspectMatcher, digest: str = None) -> List[SuspectMatch]:
+    """Find the suspects of a Python source and tell how each occurrence is used
+
+    The source is matched as bytes first and only parsed when a suspect
+    occurs in it, every occurrence is then classified from the innermost node holding it:
+    'import', 'call', 'attribute', 'name', 'string', 'comment' or 'other'
+    (definition names, keywords, part of a longer identifier...), and
+    gets the qualified name of its enclosing function or class. Only whole
+    identifiers used as code are true positives.
+
+    Args:
+        source (bytes): content of the file
+        matcher (SuspectMatcher): compiled suspects
+        digest (str, optional): digest of the content, see parse_source
+
+    Returns:
+        List[SuspectMatch]: matches grouped by suspect then ordered by offset, None when the source
+            is not valid Python 3
+    """
+    occurrences = list(matcher.finditer_buffer(source, 0, len(source)))
+    if not occurrences:
+        # Nothing to classify, the plain scan of an invalid source would not find anything either
+        return []
+    try:
+        tree = parse_source(source, digest)
+    except (SyntaxError, ValueError):
+        return None
+    offsets = [offset for offset, suspect in occurrences]
+    # Kinds are taken at the last byte, 'os.system' is a call when system is called
+    ends = sorted((offset + len(suspect.encode()) - 1, position_index)
+                  for position_index, (offset, suspect) in enumerate(occurrences))
+    end_offsets = [end for end, position_index in ends]
+    line_starts = source_line_starts(source)
+    # Column offsets of the first line do not count the BOM
+    bom = 3 if source.startswith(b'\xef\xbb\xbf') else 0
+
+    def position(line_number: int, column: int) -> int:
+        return line_starts[line_number - 1] + column + (bom if line_number == 1 else 0)
+
+    kinds = [None] * len(occurrences)
+    scopes = [''] * len(occurrences)
+
+    def mark_kind(start: int, end: int, kind: str) -> None:
+        for end_index in range(bisect_left(end_offsets, start), bisect_left(end_offsets, end)):
+            kinds[ends[end_index][1]] = kind
+
+    def mark_scope(start: int, end: int, scope: str) -> None:
+        for position_index in range(bisect_left(offsets, start), bisect_left(offsets, end)):
+            scopes[position_index] = scope
+
+    strings = []
+    calls = set()
+    # Parents are marked before their children, so the innermost node wins
+    stack = [(tree, '')]
+    while stack:
+        node, scope = stack.pop()
+        children = ast.iter_child_nodes(node)
+        if getattr(node, 'end_lineno', None) is not None:
+            start = position(node.lineno, node.col_offset)
+            end = position(node.end_lineno, node.end_col_offset)
+            # Decorators are children placed before the span of their definition
+            decorators = getattr(node, 'decorator_list', None)
+            outer_start = position(decorators[0].lineno, decorators[0].col_offset) if decorators else start
+            first = bisect_left(end_offsets, outer_start)
+            if (first == len(end_offsets) or end_offsets[first] >= end) and \
+                    bisect_left(offsets, outer_start) == bisect_left(offsets, end):
+                # No occurrence starts or ends in this node nor in its children
+                continue
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                scope = f"{scope}.{node.name}" if scope else node.name
+                mark_scope(start, end, scope)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                mark_kind(start, end, 'import')
+            elif isinstance(node, ast.Call):
+                calls.add(id(node.func))
+            elif isinstance(node, ast.Attribute):
+                mark_kind(end - len(node.attr.encode()), end, 'call' if id(node) in calls else 'attribute')
+            elif isinstance(node, ast.Name):
+                mark_kind(start, end, 'call' if id(node) in calls else 'name')
+            elif isinstance(node, ast.JoinedStr):
+                mark_kind(start, end, 'string')
+                strings.append((start, end))
+                # Before Python 3.12 the literal parts of an f-string span the whole f-string
+                children = [child for child in children if not isinstance(child, ast.Constant)]
+            elif isinstance(node, ast.Constant) and isinstance(node.value, (str, bytes)):
+                mark_kind(start, end, 'string')
+                strings.append((start, end))
+        stack.extend((child, scope) for child in children)
+
+    strings.sort()
+    string_starts = [start for start, end in strings]
+    matches = {}
+    for position_index, (offset, suspect) in enumerate(occurrences):
+        line_position = bisect_right(line_starts, offset) - 1
+        kind = kinds[position_index]
+        if kind is None:
+            kind = 'other'
+            for hash_offset in (line_starts[line_position] + match.start()
+                                for match in re.finditer(b'#', source[line_starts[line_position]:offset])):
+                string_index = bisect_right(string_starts, hash_offset) - 1
+                if string_index < 0 or strings[string_index][1] <= hash_offset:
+                    kind = 'comment'
+                    break
+        end = offset + len(suspect.encode())
+        if kind in USAGE_KINDS and (_is_identifier_byte(source[offset - 1:offset]) or
+                                    _is_identifier_byte(source[end:end + 1])):
+            kind = 'other'
+        line_end = line_starts[line_position + 1] if line_position + 1 < len(line_starts) else len(source)
+        line = source[line_starts[line_position]:line_end].decode('utf-8', errors='replace').strip()
+        matches.setdefault(suspect, []).append(SuspectMatch(suspect, offset, line_position + 1, line,
+                                                            kind in USAGE_KINDS, kind,
+                                                            scopes[position_index]))
+    return [match for suspect in matcher.suspects for match in matches.get(suspect, ())]
+
+
+def _is_identifier_byte(byte: bytes) -> bool:
+    """Tell whether a byte can be part of an identifier, any byte of a non ASCII character can"""
+    return bool(byte) and (byte.isalnum() or byte == b'_' or byte[0] >= 0x80)
+
+
+# Files from this size are scanned through mmap by chunks instead of being read
+MMAP_THRESHOLD = 16 * 1024 * 1024
+MMAP_CHUNK_SIZE = 4 * 1024 * 1024
+# Longest part of a line kept around a match found through mmap, minified files are one line
+MAX_LINE_DISPLAY = 512
+# Files with a null byte in their first bytes are binaries (compiled extensions, data files)
+BINARY_SNIFF_SIZE = 8192
+
+
+def scan_source_tree(path: str, matcher: SuspectMatcher, index: ScanIndex = None, store: SourceStore = None,
+                     mmap_threshold: int = MMAP_THRESHOLD, semantic: bool = False,
+                     walker: SourceWalker = None) -> List[ScannedFile]:
+    """Walk the folder once and find the suspects of every file
+
+    Args:
+        path (str): path of the folder
+        matcher (SuspectMatcher): compiled suspects
+        index (ScanIndex, optional): index of the previous runs, only changed files are matched
+        store (SourceStore, optional): store holding the files of a dump made with --store-only
+        mmap_threshold (int, optional): files from this size are scanned through mmap, None to read them all
+        semantic (bool, optional): classify the matches of the Python files with classify_suspects
+        walker (SourceWalker, optional): walker of the folder
+
+    Returns:
+        List[ScannedFile]: one entry per file, in walking order
+    """
+    return list(iter_source_tree(path, matcher, index, store, mmap_threshold, semantic, walker))
+
+
+def iter_source_tree(path: str, matcher: SuspectMatcher, index: ScanIndex = None, store: SourceStore = None,
+                     mmap_threshold: int = MMAP_THRESHOLD, semantic: bool = False,
+                     walker: SourceWalker = None) -> Iterator[ScannedFile]:
+    """Walk the folder and yield the findings of each file as soon as it is matched
+
+    The index is pruned and flushed once the walk is exhausted.
+
+    Args:
+        path (str): path of the folder
+        matcher (SuspectMatcher): compiled suspects
+        index (ScanIndex, optional): index of the previous runs, only changed files are matched
+        store (SourceStore, optional): store holding the files of a dump made with --store-only
+        mmap_threshold (int, optional): files from this size are scanned through mmap, None to read them all
+        semantic (bool, optional): classify the matches of the Python files with classify_suspects
+        walker (SourceWalker, optional): walker of the folder, not used for a dump read from the store
+
+    Returns:
+        Iterator[ScannedFile]: one entry per file, in walking order
+    """
+    # Classified and plain findings of a file are indexed apart
+    result_kind = 'semantic' if semantic else 'findings'
+    if store is not None:
+        manifest = read_dump_manifest(path)
+        if manifest is not None and not manifest.get('materialized', True):
+            yield from _scan_store(path, matcher, index, store, manifest, semantic)
+            return
+
+    file_paths = []
+    walker = walker or SourceWalker()
+    for root, file in walker.walk(path):
+        if file == DUMP_MANIFEST and root == path:
+            continue
+        file_path = os.path.join(root, file)
+        file_paths.append(file_path)
+        stat = os.stat(file_path)
+        entry = None
+        if index is not None:
+            entry = index.lookup(result_kind, file_path, stat)
+            if entry is not None and entry.fresh:
+                scanned = decode_scanned_file(file, file_path, entry.payload)
+                if scanned is not None:
+                    yield scanned
+                continue
+
+        if mmap_threshold is not None and stat.st_size >= mmap_threshold:
+            scanned, digest = scan_mapped_file(file, file_path, matcher)
+            if scanned is not None:
+                yield scanned
+            if index is not None:
+                index.store(result_kind, file_path, stat.st_mtime_ns, stat.st_size, digest,
+                            encode_scanned_file(scanned))
+            continue
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            content = f.read(BINARY_SNIFF_SIZE)
+            if b'\0' in content:
+                # Binaries are not read further, they are indexed by the digest of their first bytes
+                STATS.count('files_read')
+                STATS.count('bytes_read', len(content))
+                scanned = None
+            else:
+                content += f.read()
+        digest = file_digest(content)
+        if entry is not None and entry.digest == digest:
+            scanned = decode_scanned_file(file, file_path, entry.payload)
+        elif b'\0' not in content[:BINARY_SNIFF_SIZE]:
+            scanned = _scan_content(file, file_path, content, matcher, semantic, digest)
+        if scanned is not None:
+            yield scanned
+        if index is not None:
+            index.store(result_kind, file_path, stat.st_mtime_ns, stat.st_size, digest, encode_scanned_file(scanned))
+
+    if index is not None:
+        index.prune(result_kind, path, file_paths)
+        index.flush()
+
+
+def _scan_store(path: str, matcher: SuspectMatcher, index: ScanIndex, store: SourceStore,
+                manifest: dict, semantic: bool = False) -> Iterator[ScannedFile]:
+    """Find the suspects of a dump which was only written to the store
+
+    Files are listed by the dump manifest and decompressed one at a time,
+    the store hash identifies the content so unchanged files are not read.
+    """
+    result_kind = 'semantic' if semantic else 'findings'
+    file_paths = []
+    for entry in manifest.get('modules', {}).values():
+        for dumped in entry['files']:
+            file_path = os.path.join(path, dumped['path'])
+            file = os.path.basename(file_path)
+            file_paths.append(file_path)
+            payload = index.lookup_digest(result_kind, file_path, dumped['digest']) if index is not None else None
+            if payload is not None:
+                scanned = decode_scanned_file(file, file_path, payload)
+                if scanned is not None:
+                    yield scanned
+                continue
+            scanned = _scan_content(file, file_path, store.read(dumped['digest']), matcher, semantic, dumped['digest'])
+            if scanned is not None:
+                yield scanned
+            if index is not None:
+                index.store(result_kind, file_path, 0, dumped['size'], dumped['digest'], encode_scanned_file(scanned))
+
+    if index is not None:
+        index.prune(result_kind, path, file_paths)
+        index.flush()
+
+
+def _scan_content(file: str, file_path: str, content: bytes, matcher: SuspectMatcher,
+                  semantic: bool = False, digest: str = None) -> ScannedFile:
+    """Find the suspects of the content of a file
+
+    Args:
+        file (str): name of the file
+        file_path (str): path of the file
+        content (bytes): content of the file
+        matcher (SuspectMatcher): compiled suspects
+        semantic (bool, optional): classify the matches when the file is Python source
+        digest (str, optional): digest of the content, see parse_source
+
+    Returns:
+        ScannedFile: the findings, None for a binary file
+    """
+    STATS.count('files_read')
+    STATS.count('bytes_read', len(content))
+    if b'\0' in content[:BINARY_SNIFF_SIZE]:
+        # Compiled extensions and data files of the dumped packages
+        return None
+    if semantic and file.endswith(PYTHON_EXTENSIONS):
+        classified = classify_suspects(content, matcher, digest)
+        if classified is not None:
+            line_count = content.count(b'\n') + (not content.endswith(b'\n') and bool(content))
+            return ScannedFile(file, file_path, line_count, classified)
+    source_code = content.decode('utf-8', errors='replace')
+    line_count = source_code.count('\n') + (not source_code.endswith('\n') and bool(source_code))
+    return ScannedFile(file, file_path, line_count, matcher.find_all(source_code))
+
+
+def scan_mapped_file(file: str, file_path: str, matcher: SuspectMatcher,
+                     chunk_size: int = MMAP_CHUNK_SIZE) -> Tuple[ScannedFile, str]:
+    """Find the suspects of a file through mmap, memory stays bounded whatever its size
+
+    The file is matched as bytes chunk after chunk, hashed and its lines
+    counted in the same pass, pages being released behind the scan. Only
+    the lines holding a match are decoded.
+
+    Args:
+        file (str): name of the file
+        file_path (str): path of the file
+        matcher (SuspectMatcher): compiled suspects
+        chunk_size (int, optional): bytes scanned at once, a multiple of mmap.PAGESIZE
+
+    Returns:
+        Tuple[ScannedFile, str]: the findings, None for a binary file, and the digest of the file
+            (of its first bytes for a binary file, as in iter_source_tree)
+    """
+    chunk_size = max(mmap.PAGESIZE, chunk_size - chunk_size % mmap.PAGESIZE)
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        STATS.count('files_mapped')
+        STATS.count('bytes_read', size)
+        if not size:
+            return ScannedFile(file, file_path, 0, []), file_digest(b'')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            head = mapped[:BINARY_SNIFF_SIZE]
+            if b'\0' in head:
+                return None, file_digest(head)
+            if hasattr(mapped, 'madvise'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            hasher = hashlib.blake2b(digest_size=16)
+            by_suspect = {}
+            line_number = 1
+            for start in range(0, size, chunk_size):
+                end = min(size, start + chunk_size)
+                position = start
+                for offset, suspect in matcher.finditer_buffer(mapped, start, end):
+                    if offset != position:
+                        line_number += mapped[position:offset].count(b'\n')
+                        position = offset
+                    by_suspect.setdefault(suspect, []).append(
+                        (offset, line_number, *_mapped_line(mapped, offset, len(suspect.encode()))))
+                line_number += mapped[position:end].count(b'\n')
+                hasher.update(mapped[start:end])
+                if hasattr(mapped, 'madvise') and end < size:
+                    # Drop the scanned pages, the overlap of the next chunk is read again from the page cache
+                    mapped.madvise(mmap.MADV_DONTNEED, start, end - start)
+            line_count = line_number - 1 + (mapped[size - 1:size] != b'\n')
+
+    matches = [SuspectMatch(suspect, offset, number, line, true_positive)
+               for suspect in matcher.suspects
+               for offset, number, line, true_positive in by_suspect.get(suspect, ())]
+    return ScannedFile(file, file_path, line_count, matches), hasher.hexdigest()
+
+
+def _mapped_line(mapped: mmap.mmap, offset: int, length: int) -> Tuple[str, bool]:
+    """Decode the line of a match found through mmap and tell whether it is a true positive
+
+    Args:
+        mapped (mmap.mmap): mapped file
+        offset (int): byte offset of the match
+        length (int): byte length of the suspect
+
+    Returns:
+        Tuple[str, bool]: the stripped line, cut around the match when too long, and the true positive flag
+    """
+    line_start = mapped.rfind(b'\n', max(0, offset - MAX_LINE_DISPLAY), offset) + 1 or max(0, offset - MAX_LINE_DISPLAY)
+    line_end = mapped.find(b'\n', offset, offset + MAX_LINE_DISPLAY)
+    if line_end == -1:
+        line_end = min(len(mapped), offset + MAX_LINE_DISPLAY)
+    # A character is at most 4 bytes, decoding them is enough to know the neighbours of the match
+    before = mapped[max(0, offset - 4):offset].decode('utf-8', errors='replace')[-1:]
+    after = mapped[offset + length:offset + length + 4].decode('utf-8', errors='replace')[:1]
+    true_positive = not before.isalpha() and not after.isalpha()
+    return mapped[line_start:line_end].decode('utf-8', errors='replace').strip(), true_positive
+
+
+def encode_scanned_file(scanned: ScannedFile) -> str:
+    """Serialize the findings of a file for the scan index
+
+    Args:
+        scanned (ScannedFile): findings of the file, None for a binary file
+
+    Returns:
+        str: JSON payload
+    """
+    if scanned is None:
+        return 'null'
+    return json.dumps([scanned.line_count, scanned.matches], separators=(',', ':'))
+
+
+def decode_scanned_file(file: str, file_path: str, payload: str) -> ScannedFile:
+    """Deserialize the findings of a file from the scan index
+
+    Args:
+        file (str): file name
+        file_path (str): path of the file
+        payload (str): JSON payload
+
+    Returns:
+        ScannedFile: findings of the file, None for a binary file
+    """
+    decoded = json.loads(payload)
+    if decoded is None:
+        return None
+    line_count, matches = decoded
+    return ScannedFile(file, file_path, line_count, [SuspectMatch(*match) for match in matches])
+
+
+REPORT_FORMATS = {'html': "report.html", 'sharded-html': "report", 'jsonl': "findings.jsonl",
+                  'sarif': "findings.sarif"}
+
+# Reports are written through a large buffer, one write call per file of findings
+REPORT_BUFFER_SIZE = 1 << 20
+
+HTML_HEAD = ("<html><head><meta charset='utf-8'><title>{title}</title><style>"
+             "table, th, td {{border: 1px solid black;border-collapse: collapse;}}</style></head><body>")
+
+FINDINGS_HEADER = ("<table><thead><tr><th>File Name</th><th>Suspect Import</th><th>Type</th><th>Line Number</th>"
+                   "<th>Line Content</th></tr></thead><tbody>")
+
+
+def _html_findings(scanned: ScannedFile, link: str) -> str:
+    """Render the table rows of the findings of a file
+
+    Args:
+        scanned (ScannedFile): findings of the file
+        link (str): target of the file name link
+
+    Returns:
+        str: the rows
+    """
+    rows = []
+    for suspect, matches in group_by_suspect(scanned.matches):
+        rows.append("<tr><td><a href='{}'>{}</a></td><td>{}</td>"
+                    "<td colspan='3' style='background-color: yellow;'>Found suspect import</td></tr>"
+                    .format(html.escape(link), html.escape(scanned.name), suspect))
+        for match in matches:
+            color = 'green' if match.true_positive else 'red'
+            if match.kind is not None:
+                kind = "<td style='color: {};'>{}{}</td>".format(
+                    color, match.kind.capitalize(), " in " + html.escape(match.scope) if match.scope else "")
+            elif match.true_positive:
+                kind = "<td style='color: green;'>True Positive</td>"
+            else:
+                kind = "<td style='color: red;'>False Positive</td>"
+            line = html.escape(match.line).replace(suspect, "<span style='color: red;'>{}</span>".format(suspect))
+            rows.append("<tr><td></td><td></td>{}<td>{}</td><td>{}</td></tr>\n".format(kind, match.line_number, line))
+    return "".join(rows)
+
+
+def write_html_report(scanned_files: List[ScannedFile], report_path: str = "report.html") -> None:
+    """Render the detection report of the scanned files
+
+    Args:
+        scanned_files (List[ScannedFile]): result of scan_source_tree
+        report_path (str, optional): path of the report. Defaults to "report.html".
+
+    Returns:
+        _type_: None
+    """
+    scanned_files = list(scanned_files)
+    lines_less_100 = [scanned.name for scanned in scanned_files if scanned.line_count < 100]
+    number_true_positives = sum(match.true_positive for scanned in scanned_files for match in scanned.matches)
+
+    with open(report_path, "w", encoding="utf-8", buffering=REPORT_BUFFER_SIZE) as outfile:
+        outfile.write(HTML_HEAD.format(title="Report ANAL"))
+        outfile.write("<h1>Detection Report</h1><div><h2>Summary</h2><ul>")
+        outfile.write("".join(f"<li>{html.escape(display_name(scanned.name))}</li>" for scanned in scanned_files))
+        outfile.write("</ul>")
+        # Create anchor to full end of the report
+        outfile.write("<a href='#end' style='color: inherit;'>↳ End of the report</a></div>")
+        outfile.write(FINDINGS_HEADER)
+        for scanned in scanned_files:
+            outfile.write(_html_findings(scanned, scanned.path))
+        outfile.write("</tbody>\n</table>\n")
+
+        if lines_less_100:
+            outfile.write("<div>\n<h3 style='color: red;'>NOTA</h3>\n")
+            outfile.write("<p>Some of the source files have less than 100 lines, "
+                          "it's possible it's a hand-made script.</p>\n")
+            outfile.write("<ul>\n" + "".join("<li>{}</li>\n".format(html.escape(file)) for file in lines_less_100)
+                          + "</ul>\n")
+            outfile.write("</div>\n")
+
+        outfile.write("<div>\n<h3>Recap of the analysis</h3>\n")
+        outfile.write("<p> The scanned folder has {} files and {} true positives.</p>\n".format(
+            len(scanned_files), number_true_positives))
+        outfile.write("</div>\n<div id='end'></div>\n</body>\n</html>\n")
+
+
+def write_sharded_html_report(scanned_files: Iterable[ScannedFile], report_dir: str = "report",
+                              root: str = None) -> None:
+    """Render the detection report as an index page and one page per file with findings
+
+    Pages are written as the files are scanned, so the size of every page
+    stays bounded whatever the size of the dump.
+
+    Args:
+        scanned_files (Iterable[ScannedFile]): findings, typically from iter_source_tree
+        report_dir (str, optional): folder of the report. Defaults to "report".
+        root (str, optional): scanned folder, names of the pages are relative to it
+    """
+    from urllib.request import pathname2url
+
+    pages_dir = os.path.join(report_dir, "files")
+    if os.path.exists(pages_dir):
+        shutil.rmtree(pages_dir)
+    os.makedirs(pages_dir)
+    rows = []
+    number_files = 0
+    number_true_positives = 0
+    for scanned in scanned_files:
+        number_files += 1
+        if not scanned.matches:
+            continue
+        true_positives = sum(match.true_positive for match in scanned.matches)
+        number_true_positives += true_positives
+        name = os.path.relpath(scanned.path, root) if root else scanned.path
+        page = f"{len(rows)}.html"
+        with open(os.path.join(pages_dir, page), "w", encoding="utf-8", buffering=REPORT_BUFFER_SIZE) as outfile:
+            outfile.write(HTML_HEAD.format(title=html.escape(name)))
+            outfile.write(f"<p><a href='../index.html'>↰ Index</a></p><h1>{html.escape(name)}</h1>"
+                          f"<p>{scanned.line_count} lines</p>")
+            # Pages live two folders away from the scanned paths, which are relative to the working directory
+            link = pathname2url(os.path.relpath(os.path.abspath(scanned.path), os.path.abspath(pages_dir)))
+            outfile.write(FINDINGS_HEADER + _html_findings(scanned, link) + "</tbody></table></body></html>\n")
+        suspects = ", ".join(suspect for suspect, matches in group_by_suspect(scanned.matches))
+        rows.append(f"<tr><td><a href='files/{page}'>{html.escape(name)}</a></td><td>{scanned.line_count}</td>"
+                    f"<td>{suspects}</td><td>{len(scanned.matches)}</td><td>{true_positives}</td></tr>\n")
+
+    with open(os.path.join(report_dir, "index.html"), "w", encoding="utf-8", buffering=REPORT_BUFFER_SIZE) as outfile:
+        outfile.write(HTML_HEAD.format(title="Report ANAL") + "<h1>Detection Report</h1>")
+        outfile.write(f"<p> The scanned folder has {number_files} files, {len(rows)} with suspects, "
+                      f"and {number_true_positives} true positives.</p>")
+        outfile.write("<table><thead><tr><th>File Name</th><th>Lines</th><th>Suspect Imports</th><th>Matches</th>"
+                      "<th>True Positives</th></tr></thead><tbody>\n")
+        outfile.writelines(rows)
+        outfile.write("</tbody></table></body></html>\n")
+
+
+def write_jsonl_report(scanned_files: Iterable[ScannedFile], report_path: str = "findings.jsonl",
+                       root: str = None) -> None:
+    """Stream the findings as JSON Lines, one object per match and a final summary object
+
+    Args:
+        scanned_files (Iterable[ScannedFile]): findings, typically from iter_source_tree
+        report_path (str, optional): path of the report. Defaults to "findings.jsonl".
+        root (str, optional): scanned folder, paths are relative to it
+    """
+    number_files = 0
+    number_matches = 0
+    number_true_positives = 0
+    with open(report_path, "w", encoding="utf-8", buffering=REPORT_BUFFER_SIZE) as outfile:
+        for scanned in scanned_files:
+            number_files += 1
+            if not scanned.matches:
+                continue
+            path = os.path.relpath(scanned.path, root) if root else scanned.path
+            outfile.write("".join(json.dumps(_jsonl_finding(path, match)) + "\n" for match in scanned.matches))
+            number_matches += len(scanned.matches)
+            number_true_positives += sum(match.true_positive for match in scanned.matches)
+        outfile.write(json.dumps({'type': 'summary', 'version': __version__, 'files': number_files,
+                                  'findings': number_matches, 'true_positives': number_true_positives}) + "\n")
+
+
+def _jsonl_finding(path: str, match: SuspectMatch) -> dict:
+    """Build the JSON Lines object of a match, kind and scope only come with a semantic scan"""
+    finding = {'type': 'finding', 'path': path, 'suspect': match.suspect, 'line': match.line_number,
+               'offset': match.offset, 'true_positive': match.true_positive, 'text': match.line}
+    if match.kind is not None:
+        finding['kind'] = match.kind
+        finding['scope'] = match.scope
+    return finding
+
+
+def write_sarif_report(scanned_files: Iterable[ScannedFile], report_path: str = "findings.sarif",
+                       root: str = None) -> None:
+    """Stream the findings as a SARIF 2.1.0 log, one result per match
+
+    Results are written before the tool section, which lists the rules of
+    the suspects actually found, so nothing but the rules is kept in memory.
+
+    Args:
+        scanned_files (Iterable[ScannedFile]): findings, typically from iter_source_tree
+        report_path (str, optional): path of the report. Defaults to "findings.sarif".
+        root (str, optional): scanned folder, artifact URIs are relative to it
+    """
+    import pathlib
+    from urllib.request import pathname2url
+
+    rules = {}
+    separator = ""
+    with open(report_path, "w", encoding="utf-8", buffering=REPORT_BUFFER_SIZE) as outfile:
+        outfile.write('{"$schema": "https://json.schemastore.org/sarif-2.1.0.json", "version": "2.1.0", '
+                      '"runs": [{"results": [\n')
+        for scanned in scanned_files:
+            if not scanned.matches:
+                continue
+            uri = pathname2url(os.path.relpath(scanned.path, root) if root else scanned.path)
+            results = []
+            for match in scanned.matches:
+                rules.setdefault(match.suspect, len(rules))
+                if match.kind is not None:
+                    text = f"{match.kind.capitalize()} of suspect module {match.suspect}"
+                else:
+                    text = f"{'Import' if match.true_positive else 'Mention'} of suspect module {match.suspect}"
+                location = {'physicalLocation': {
+                    'artifactLocation': {'uri': uri, 'uriBaseId': 'SRCROOT'},
+                    'region': {'startLine': match.line_number, 'snippet': {'text': match.line}}}}
+                if match.scope:
+                    location['logicalLocations'] = [{'fullyQualifiedName': match.scope}]
+                result = {'ruleId': f"suspect-import/{match.suspect}", 'ruleIndex': rules[match.suspect],
+                          'level': 'warning' if match.true_positive else 'note', 'message': {'text': text},
+                          'locations': [location]}
+                if match.kind is not None:
+                    result['properties'] = {'kind': match.kind}
+                results.append(json.dumps(result))
+            outfile.write(separator + ",\n".join(results))
+            separator = ",\n"
+        driver = {'name': 'Import_Anal_M58', 'version': __version__, 'rules': [
+            {'id': f"suspect-import/{suspect}", 'name': suspect,
+             'shortDescription': {'text': f"Use of the suspect module {suspect}"}} for suspect in rules]}
+        outfile.write('\n], "tool": {"driver": ' + json.dumps(driver) + '}, "originalUriBaseIds": {"SRCROOT": '
+                      + json.dumps({'uri': pathlib.Path(root or '.').resolve().as_uri() + '/'}) + '}}]}\n')
+
+
+def analyze_source_code(path: str, index: ScanIndex = None, store: SourceStore = None, report_format: str = 'html',
+                        report_path: str = None, mmap_threshold: int = MMAP_THRESHOLD, semantic: bool = False,
+                        walker: SourceWalker = None) -> None:
+    """Analyze the source code of the project
+
+    Args:
+        path (str): path of the project
+        index (ScanIndex, optional): index of the previous runs
+        store (SourceStore, optional): store holding the files of a dump made with --store-only
+        report_format (str, optional): one of REPORT_FORMATS. Defaults to 'html'.
+        report_path (str, optional): path of the report. Defaults to the one of the format.
+        mmap_threshold (int, optional): files from this size are scanned through mmap
+        semantic (bool, optional): classify every occurrence in the Python files. Defaults to False.
+        walker (SourceWalker, optional): walker of the folder
+
+    Returns:
+        _type_: None
+    """
+    report_path = report_path or REPORT_FORMATS[report_format]
+    scanned_files = iter_source_tree(path, SuspectMatcher(SUSPECT_IMPORTS), index, store, mmap_threshold, semantic,
+                                     walker)
+    if report_format == 'html':
+        write_html_report(scanned_files, report_path)
+    elif report_format == 'sharded-html':
+        write_sharded_html_report(scanned_files, report_path, path)
+    elif report_format == 'jsonl':
+        write_jsonl_report(scanned_files, report_path, path)
+    else:
+        write_sarif_report(scanned_files, report_path, path)
+    print(f"Report generated in {report_path}")
+
+
+class ImportGraph:
+    """Module to module import graph of a project
+
+    Nodes are dotted module names with their attributes, edges are kept as
+    adjacency dicts in both directions, so fan-in and fan-out are O(1).
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+        self.reverse = {}
+
+    def add_node(self, name: str, **attributes) -> None:
+        """Add a node or update its attributes
+
+        Args:
+            name (str): module name
+            **attributes: attributes of the node
+        """
+        self.nodes.setdefault(name, {}).update(attributes)
+        self.edges.setdefault(name, {})
+        self.reverse.setdefault(name, set())
+
+    def add_edge(self, source: str, target: str) -> None:
+        """Add an import of target by source, repeated imports are counted
+
+        Args:
+            source (str): importing module
+            target (str): imported module
+        """
+        for name in (source, target):
+            if name not in self.nodes:
+                self.add_node(name)
+        self.edges[source][target] = self.edges[source].get(target, 0) + 1
+        self.reverse[target].add(source)
+
+    def fan_in(self, name: str) -> int:
+        """Number of modules importing this one"""
+        return len(self.reverse[name])
+
+    def fan_out(self, name: str) -> int:
+        """Number of modules imported by this one"""
+        return len(self.edges[name])
+
+    def strongly_connected_components(self) -> List[List[str]]:
+        """Tarjan's algorithm, iterative so deep graphs do not hit the recursion limit
+
+        Returns:
+            List[List[str]]: components, in reverse topological order
+        """
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for start in self.nodes:
+            if start in index:
+                continue
+            index[start] = low[start] = len(index)
+            stack.append(start)
+            on_stack.add(start)
+            work = [(start, iter(self.edges[start]))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.edges[child])))
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components
+
+    def cycles(self) -> List[List[str]]:
+        """Groups of modules importing each other, directly or not
+
+        Returns:
+            List[List[str]]: sorted members of every import cycle
+        """
+        return [sorted(component) for component in self.strongly_connected_components()
+                if len(component) > 1 or component[0] in self.edges[component[0]]]
+
+    def collapse(self, depth: int) -> 'ImportGraph':
+        """Merge the project modules into their package at the given depth
+
+        Args:
+            depth (int): number of dotted parts kept in the project module names
+
+        Returns:
+            ImportGraph: the collapsed graph, imports between merged modules are dropped
+        """
+        def collapsed(name: str) -> str:
+            return name if self.nodes[name].get('external') else '.'.join(name.split('.')[:depth])
+
+        graph = ImportGraph()
+        for name, attributes in self.nodes.items():
+            graph.add_node(collapsed(name), external=bool(attributes.get('external')))
+        for source, targets in self.edges.items():
+            for target, count in targets.items():
+                source_package, target_package = collapsed(source), collapsed(target)
+                if source_package != target_package:
+                    graph.add_edge(source_package, target_package)
+                    graph.edges[source_package][target_package] += count - 1
+        return graph
+
+    def digest(self) -> str:
+        """Hash of the nodes and edges, identifies the graph whatever its building order
+
+        Returns:
+            str: hex digest
+        """
+        content = json.dumps([sorted(self.nodes),
+                              sorted((source, sorted(targets)) for source, targets in self.edges.items())])
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def to_dot(self, f) -> None:
+        """Write the graph in the Graphviz DOT format
+
+        Args:
+            f: text file
+        """
+        f.write("digraph imports {\n")
+        for name, attributes in self.nodes.items():
+            shape = "box" if attributes.get('external') else "ellipse"
+            f.write(f"  {json.dumps(name)} [shape={shape}];\n")
+        for source, targets in self.edges.items():
+            for target, count in targets.items():
+                f.write(f"  {json.dumps(source)} -> {json.dumps(target)} [weight={count}];\n")
+        f.write("}\n")
+
+    def to_graphml(self, f) -> None:
+        """Write the graph in the GraphML format
+
+        Args:
+            f: text file
+        """
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        f.write('  <key id="external" for="node" attr.name="external" attr.type="boolean"/>\n')
+        f.write('  <key id="path" for="node" attr.name="path" attr.type="string"/>\n')
+        f.write('  <key id="count" for="edge" attr.name="count" attr.type="int"/>\n')
+        f.write('  <graph id="imports" edgedefault="directed">\n')
+        for name, attributes in self.nodes.items():
+            f.write(f'    <node id="{html.escape(name)}">')
+            f.write(f'<data key="external">{str(bool(attributes.get("external"))).lower()}</data>')
+            if attributes.get('path'):
+                f.write(f'<data key="path">{html.escape(attributes["path"])}</data>')
+            f.write('</node>\n')
+        for source, targets in self.edges.items():
+            for target, count in targets.items():
+                f.write(f'    <edge source="{html.escape(source)}" target="{html.escape(target)}">'
+                        f'<data key="count">{count}</data></edge>\n')
+        f.write('  </graph>\n')
+        f.write('</graphml>\n')
+
+    def to_json(self, f) -> None:
+        """Write the graph, its fan-in/fan-out metrics and its cycles as JSON
+
+        Args:
+            f: text file
+        """
+        f.write(json.dumps({
+            'nodes': [dict(attributes, id=name, fan_in=self.fan_in(name), fan_out=self.fan_out(name))
+                      for name, attributes in self.nodes.items()],
+            'edges': [{'source': source, 'target': target, 'count': count}
+                      for source, targets in self.edges.items() for target, count in targets.items()],
+            'cycles': self.cycles(),
+        }))
+
+    def export(self, output: str, graph_format: str = None) -> None:
+        """Write the graph to a file, the format defaults to the extension of the file
+
+        Args:
+            output (str): path of the file
+            graph_format (str, optional): 'dot', 'graphml' or 'json'
+        """
+        graph_format = graph_format or os.path.splitext(output)[1].lstrip('.').lower() or 'dot'
+        writers = {'dot': self.to_dot, 'gv': self.to_dot, 'graphml': self.to_graphml, 'json': self.to_json}
+        if graph_format not in writers:
+            raise ValueError(f"Unknown graph format: {graph_format}")
+        with open(output, 'w') as f:
+            writers[graph_format](f)
+
+
+class GraphViewer:
+    """Interactive matplotlib view of an import graph
+
+    Nodes are one scatter collection and edges one line collection. While a
+    node is dragged it is moved to its own animated artists together with
+    its edges and label, and only those are redrawn over a saved background
+    (blitting). Layouts are cached on disk by graph digest.
+    """
+
+    def __init__(self, graph: ImportGraph, cache_dir: str = None, label_limit: int = 200, node_size: int = 300):
+        import matplotlib.pyplot as plt
+        from matplotlib.collections import LineCollection
+
+        self.plt = plt
+        self.graph = graph
+        self.cache_dir = cache_dir
+        self.node_size = node_size
+        self.names = list(graph.nodes)
+        self.index = {name: position for position, name in enumerate(self.names)}
+        self.edge_pairs = [(self.index[source], self.index[target])
+                           for source, targets in graph.edges.items() for target in targets]
+        self.incident = {position: [] for position in range(len(self.names))}
+        for edge, (source, target) in enumerate(self.edge_pairs):
+            self.incident[source].append(edge)
+            self.incident[target].append(edge)
+        self.positions = self._layout()
+
+        cyclic = {member for cycle in graph.cycles() for member in cycle}
+        self.colors = ["lightsalmon" if name in cyclic else "lightgreen" if graph.nodes[name].get('external')
+                       else "lightblue" for name in self.names]
+
+        self.fig, self.ax = plt.subplots()
+        self.ax.set_axis_off()
+        self.segments = [[self.positions[source], self.positions[target]] for source, target in self.edge_pairs]
+        self.edges_artist = LineCollection(self.segments, colors="gray", linewidths=0.5, zorder=1)
+        self.ax.add_collection(self.edges_artist)
+        self.nodes_artist = self.ax.scatter(*zip(*self.positions) if self.positions else ([], []),
+                                            s=node_size, c=self.colors, zorder=2)
+        # Level of detail: only the most imported modules are labelled on large graphs
+        labelled = sorted(range(len(self.names)),
+                          key=lambda position: -graph.fan_in(self.names[position]))[:label_limit]
+        self.labels = {position: self.ax.text(*self.positions[position], self.names[position], fontsize=8,
+                                              ha='center', va='center', zorder=3)
+                       for position in labelled}
+        self.ax.autoscale_view()
+
+        self.dragging = None
+        self.offset = (0.0, 0.0)
+        self.background = None
+        self.drag_artists = []
+        self.fig.canvas.mpl_connect('button_press_event', self.on_press)
+        self.fig.canvas.mpl_connect('motion_notify_event', self.on_motion)
+        self.fig.canvas.mpl_connect('button_release_event', self.on_release)
+
+    def _layout_path(self) -> str:
+        return os.path.join(self.cache_dir, f"layout-{self.graph.digest()[:16]}.json") if self.cache_dir else None
+
+    def _layout(self) -> list:
+        """Load the cached layout of the graph, or compute and cache it
+
+        Returns:
+            list: (x, y) of every node
+        """
+        layout_path = self._layout_path()
+        if layout_path and os.path.exists(layout_path):
+            with open(layout_path, 'r') as f:
+                cached = json.load(f)
+            if all(name in cached for name in self.names):
+                return [tuple(cached[name]) for name in self.names]
+
+        import networkx as nx
+
+        G = nx.DiGraph()
+        G.add_nodes_from(self.names)
+        G.add_edges_from((self.names[source], self.names[target]) for source, target in self.edge_pairs)
+        iterations = 50 if len(self.names) < 2000 else 15
+        try:
+            pos = nx.spring_layout(G, seed=0, iterations=iterations)
+        except ImportError:
+            # Large graphs are laid out with scipy, without it nodes start at random and can be dragged
+            pos = nx.random_layout(G, seed=0)
+        positions = [tuple(float(value) for value in pos[name]) for name in self.names]
+        self.save_layout(positions)
+        return positions
+
+    def save_layout(self, positions: list = None) -> None:
+        """Cache the current layout
+
+        Args:
+            positions (list, optional): positions to save. Defaults to the current ones.
+        """
+        layout_path = self._layout_path()
+        if not layout_path:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        positions = positions if positions is not None else self.positions
+        with open(layout_path, 'w') as f:
+            json.dump(dict(zip(self.names, positions)), f)
+
+    def node_at(self, event) -> int:
+        """Return the node under the mouse, if any
+
+        Args:
+            event (matplotlib.backend_bases.MouseEvent): the event
+
+        Returns:
+            int: position of the node, None when there is none
+        """
+        if not self.positions:
+            return None
+        pixels = self.ax.transData.transform(self.positions)
+        distances = (pixels[:, 0] - event.x) ** 2 + (pixels[:, 1] - event.y) ** 2
+        nearest = int(distances.argmin())
+        radius = (self.node_size ** 0.5) / 2 * self.fig.dpi / 72 + 2
+        return nearest if distances[nearest] <= radius ** 2 else None
+
+    def _incident_segments(self, node: int) -> list:
+        return [[self.positions[self.edge_pairs[edge][0]], self.positions[self.edge_pairs[edge][1]]]
+                for edge in self.incident[node]]
+
+    def on_press(self, event) -> None:
+        """Function called when a mouse button is pressed, moves the node under it to the animated artists
+
+        Args:
+            event (matplotlib.backend_bases.MouseEvent): The event.
+        """
+        from matplotlib.collections import LineCollection
+
+        if event.inaxes is not self.ax:
+            return
+        node = self.node_at(event)
+        if node is None:
+            return
+        self.dragging = node
+        x, y = self.positions[node]
+        self.offset = (x - event.xdata, y - event.ydata)
+
+        # Remove the node, its edges and its label from the static artists
+        sizes = [self.node_size] * len(self.names)
+        sizes[node] = 0
+        self.nodes_artist.set_sizes(sizes)
+        for edge in self.incident[node]:
+            self.segments[edge] = [(float('nan'), float('nan'))] * 2
+        self.edges_artist.set_segments(self.segments)
+        if node in self.labels:
+            self.labels[node].set_visible(False)
+
+        self.drag_artists = [
+            LineCollection(self._incident_segments(node), colors="gray", linewidths=0.5, zorder=1, animated=True),
+            self.ax.scatter([x], [y], s=self.node_size, c=[self.colors[node]], zorder=2, animated=True),
+            self.ax.text(x, y, self.names[node], fontsize=8, ha='center', va='center', zorder=3, animated=True),
+        ]
+        self.ax.add_collection(self.drag_artists[0])
+        self.fig.canvas.draw()
+        self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        self._blit()
+
+    def on_motion(self, event) -> None:
+        """Function called when the mouse is moved, redraws only the dragged node artists
+
+        Args:
+            event (matplotlib.backend_bases.MouseEvent): The event.
+        """
+        if self.dragging is None or event.inaxes is not self.ax:
+            return
+        node = self.dragging
+        x, y = event.xdata + self.offset[0], event.ydata + self.offset[1]
+        self.positions[node] = (x, y)
+        edges, point, label = self.drag_artists
+        edges.set_segments(self._incident_segments(node))
+        point.set_offsets([(x, y)])
+        label.set_position((x, y))
+        self._blit()
+
+    def _blit(self) -> None:
+        self.fig.canvas.restore_region(self.background)
+        for artist in self.drag_artists:
+            self.ax.draw_artist(artist)
+        self.fig.canvas.blit(self.ax.bbox)
+
+    def on_release(self, event) -> None:
+        """Function called when a mouse button is released, puts the node back in the static artists
+
+        Args:
+            event (matplotlib.backend_bases.MouseEvent): The event.
+        """
+        if self.dragging is None:
+            return
+        node = self.dragging
+        self.dragging = None
+        for artist in self.drag_artists:
+            artist.remove()
+        self.drag_artists = []
+        self.nodes_artist.set_offsets(self.positions)
+        self.nodes_artist.set_sizes([self.node_size])
+        for edge, segment in zip(self.incident[node], self._incident_segments(node)):
+            self.segments[edge] = segment
+        self.edges_artist.set_segments(self.segments)
+        if node in self.labels:
+            self.labels[node].set_position(self.positions[node])
+            self.labels[node].set_visible(True)
+        self.fig.canvas.draw_idle()
+        self.save_layout()
+
+    def show(self) -> None:
+        """Open the window"""
+        self.plt.show()
+
+
+def module_name(root: str, folder: str, file: str, _packages: dict = None) -> str:
+    """Dotted name of a project file relative to its root
+
+    Args:
+        root (str): root of the project
+        folder (str): folder of the file
+        file (str): file name
+        _packages (dict, optional): cache of the package parts of each folder
+
+    Returns:
+        str: module name, the package name for an __init__.py
+    """
+    if _packages is not None and folder in _packages:
+        parts = list(_packages[folder])
+    else:
+        parts = [part for part in os.path.relpath(folder, root).split(os.sep) if part not in ('.', '')]
+        if _packages is not None:
+            _packages[folder] = tuple(parts)
+    stem = os.path.splitext(file)[0]
+    if stem != '__init__' or not parts:
+        parts.append(stem)
+    return '.'.join(parts)
+
+
+def build_import_graph(result: list, root) -> ImportGraph:
+    """Build the module import graph of a project from its import records
+
+    Imports are resolved to the longest project module prefix through a dict,
+    the others become external nodes named after their top level package.
+
+    Args:
+        result (Iterable): result of get_imports, or ImportIndex.iter_files
+        root: root of the project, or list of project roots, module names are relative to them
+
+    Returns:
+        ImportGraph: the graph
+    """
+    graph = ImportGraph()
+    modules = {}
+    packages = {}
+    for file_imports, folder, file in result:
+        name = module_name(project_root(root, folder), folder, file, packages)
+        modules[name] = (file == '__init__.py', file_imports)
+        graph.add_node(name, path=os.path.join(folder, file), external=False)
+
+    def project_module(dotted: str) -> str:
+        if dotted in modules:
+            return dotted
+        parts = dotted.split('.')
+        for end in range(len(parts), 0, -1):
+            candidate = '.'.join(parts[:end])
+            if candidate in modules:
+                return candidate
+        return None
+
+    for name, (is_package, file_imports) in modules.items():
+        package = name.split('.') if is_package else name.split('.')[:-1]
+        for record in file_imports:
+            if record.level:
+                base = package[:len(package) - record.level + 1] if record.level <= len(package) + 1 else []
+                dotted = '.'.join(base + ([record.module] if record.module else []))
+            else:
+                dotted = record.module
+            # from package import submodule imports the submodule
+            targets = [f"{dotted}.{imported}" for imported in record.names if f"{dotted}.{imported}" in modules]
+            for target in targets or [project_module(dotted)]:
+                if target is None:
+                    if record.level:
+                        continue
+                    target = dotted.split('.')[0]
+                    if target not in graph.nodes:
+                        graph.add_node(target, external=True)
+                if target != name:
+                    graph.add_edge(name, target)
+    return graph
+
+
+def print_banner(text: str, **options) -> None:
+    """Print an ascii-art banner, pyfiglet is only imported here
+
+    Args:
+        text (str): text of the banner
+        **options: options of pyfiglet.figlet_format
+    """
+    import pyfiglet
+    print(pyfiglet.figlet_format(text, **options))
+
+
+def main():
+    """ Main
+    """
+    args = parse_arguments()
+    profiler = start_profiler(args.profile)
+    try:
+        run(args)
+    finally:
+        if profiler is not None:
+            stop_profiler(args.profile, profiler, args.profile_output)
+        if args.stats:
+            STATS.print_summary()
+            STATS.write(args.stats)
+            print(f"\033[32m[+] Stats written to {args.stats}\033[0m")
+
+
+def start_profiler(kind: str):
+    """Start profiling the run
+
+    Args:
+        kind (str): 'cprofile', 'tracemalloc' or None
+
+    Returns:
+        _type_: the cProfile.Profile, True for tracemalloc, None when not profiling
+    """
+    if kind == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if kind == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start(25)
+        return True
+    return None
+
+
+def stop_profiler(kind: str, profiler, output: str = None) -> None:
+    """Stop profiling, dump the profile and print its top entries
+
+    Args:
+        kind (str): 'cprofile' or 'tracemalloc'
+        profiler: value returned by start_profiler
+        output (str, optional): file of the dumped profile
+    """
+    if kind == 'cprofile':
+        import pstats
+        profiler.disable()
+        output = output or "importanal.prof"
+        profiler.dump_stats(output)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
+    else:
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        output = output or "importanal.tracemalloc"
+        snapshot.dump(output)
+        print(f"\n\033[1m Peak traced memory: {peak / 1024 / 1024:.1f} MiB\033[0m")
+        for statistic in snapshot.statistics('lineno')[:15]:
+            print(f" {statistic}")
+    print(f"\033[32m[+] Profile written to {output}\033[0m")
+
+
+def watch_project(args, roots: List[str], walker: SourceWalker, socket_path: str) -> None:
+    """Serve the imports of the project to --query until interrupted, keeping the asked outputs up to date
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+        roots (List[str]): roots of the project
+        walker (SourceWalker): walker of the roots
+        socket_path (str): socket answering the queries
+    """
+    distributions = distribution_index(None if args.no_cache else args.cache_dir)
+    watcher = ImportWatcher(roots, walker, args.jobs, distributions)
+    path = roots[0] if len(roots) == 1 else roots
+
+    def on_refresh(changed: List[str], removed: List[str]) -> None:
+        imports, resolver = watcher.imports, watcher.resolver
+        if args.requirement:
+            build_requirement_file(delete_module_not_found(imports.modules(), resolver), distributions, resolver)
+        if args.lock:
+            build_lock_file(imports.modules(), distributions, resolver, path=args.lock)
+        if args.export_index:
+            with open(args.export_index, 'w') as f:
+                json.dump(imports.to_dict(), f, indent=1)
+        if args.graph_output:
+            graph = build_import_graph(imports.iter_files(), path)
+            if args.collapse_depth:
+                graph = graph.collapse(args.collapse_depth)
+            graph.export(args.graph_output, args.graph_format)
+        print(f"\033[32m[+] {len(changed)} changed and {len(removed)} removed file(s) in "
+              f"{watcher.refresh_seconds * 1000:.0f} ms, {len(imports)} files indexed\033[0m", flush=True)
+
+    print(f"\033[1m[*] Watching {', '.join(roots)}, queries on {socket_path}, Ctrl+C to stop\033[0m", flush=True)
+    serve_watch(watcher, socket_path, args.watch, on_refresh)
+
+
+def batch_projects(args, roots: List[str], walker: SourceWalker) -> None:
+    """Scan the projects of --batch, write their results with the cross-project summary and print it
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+        roots (List[str]): roots of the projects
+        walker (SourceWalker): walker of every project
+    """
+    cache_dir = None if args.no_cache else args.cache_dir
+    with STATS.phase('scan_projects'):
+        scans = scan_projects(roots, walker, args.jobs, cache_dir)
+    with STATS.phase('resolve'):
+        distributions = distribution_index(cache_dir)
+        resolver = ModuleResolver([], distributions)
+        report = batch_report(scans, resolver, distributions)
+    STATS.count('projects', len(scans))
+    STATS.watch('modules_resolved', resolver, 'lookups')
+    summary = report['summary']
+    installed = {project['root']: [module for module, info in project['modules'].items()
+                                   if info['kind'] not in PROVIDED_KINDS + ('missing',)]
+                 for project in report['projects'] if 'error' not in project}
+    if args.lock:
+        graph = requirement_graph(distributions)
+        with STATS.phase('lock'):
+            for root, modules in installed.items():
+                build_lock_file(modules, distributions, resolver, graph,
+                                os.path.join(root, os.path.basename(args.lock)))
+        print(f"\033[32m[+] {os.path.basename(args.lock)} written in {len(installed)} project(s)\033[0m")
+    if args.restriction_level in (2, 3):
+        # Dumped once for every project, the store keeps one copy of each distribution version
+        store = None if args.no_cache else SourceStore(os.path.join(args.cache_dir, STORE_DIR))
+        dumped = set()
+        for project in report['projects']:
+            for module in installed.get(project['root'], ()):
+                info = project['modules'][module]
+                if args.restriction_level == 3 or (info['kind'] == 'third-party' and not info['version']):
+                    dumped.add(module)
+        with STATS.phase('dump'):
+            reset_dump_folder(DUMP_DIR, store)
+            with ProbePool(sys.path, args.jobs, args.probe_timeout, args.probe_memory * 1024 * 1024) as probes:
+                dump_sources(sorted(dumped), resolver=resolver, store=store, materialize=not args.store_only,
+                             probes=probes)
+    output = args.batch_output
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1)
+
+    print(f"\033[32m[+] {summary['projects']} project(s) scanned, results written to {output}\033[0m")
+    for project in report['projects']:
+        if 'error' in project:
+            print(f"\033[31m[-] {project['root']}: {project['error']}\033[0m")
+    for suspect, projects in summary['suspects'].items():
+        print(f"\033[33m[!] Suspect import {suspect} in {len(projects)} project(s): {', '.join(projects)}\033[0m")
+    for name, skew in summary['version_skew'].items():
+        versions = "; ".join(f"{version} in {len(projects)} project(s)"
+                             for version, projects in skew['versions'].items())
+        print(f"\033[33m[!] Version skew of {name} (installed {skew['installed']}): {versions}\033[0m")
+    if summary['unknown']:
+        print("\033[31m[-] Most imported unknown modules: " +
+              ", ".join(f"{entry['module']} ({entry['imports']} imports in {len(entry['projects'])} project(s))"
+                        for entry in summary['unknown']) + "\033[0m")
+
+
+def run(args) -> None:
+    """Run the analysis asked by the arguments
+
+    Args:
+        args (argparse.Namespace): parsed arguments
+    """
+    socket_path = args.socket or os.path.join(args.cache_dir, WATCH_SOCKET)
+    if args.query:
+        try:
+            answer = query_watch(socket_path, args.query[0], args.query[1] if len(args.query) > 1 else None)
+        except (OSError, ValueError):
+            print(f"\033[31m[-] No watcher answers on {socket_path}, start one with --watch\033[0m")
+            exit(1)
+        print(json.dumps(answer, indent=1))
+        exit(1 if 'error' in answer else 0)
+    # Hooks and pipes get neither the screen clear nor the banner
+    if not args.quiet and sys.stdout.isatty():
+        os.system('cls' if os.name == 'nt' else 'clear')
+        print_banner("Import_Anal_M58", font="slant", width=100)
+    if args.build_pypi_index:
+        index_path = args.pypi_index or os.path.join(args.cache_dir, PYPI_INDEX_FILE)
+        count = PypiNameIndex.build(read_project_names(args.build_pypi_index), index_path)
+        print(f"\033[32m[+] {count} project names written to {index_path}\033[0m")
+        exit(0)
+    roots = [os.path.abspath(root) for root in args.path] if args.path else [os.path.dirname(os.path.abspath(__file__))]
+    missing_roots = [root for root in roots if not os.path.isdir(root)]
+    if missing_roots:
+        print(f"\033[31m[-] Not a folder: {', '.join(missing_roots)}\033[0m")
+        exit(1)
+    path = roots[0] if len(roots) == 1 else roots
+    patterns = list(args.exclude)
+    for exclude_file in args.exclude_from:
+        patterns.extend(read_ignore_file(exclude_file))
+    walker = SourceWalker([DUMP_DIR, args.cache_dir], patterns, args.max_file_size, args.follow_symlinks,
+                          args.walk_threads)
+    STATS.watch('folders_pruned', walker, 'folders_pruned')
+    STATS.watch('files_too_large', walker, 'files_too_large')
+    if args.watch is not None:
+        watch_project(args, roots, walker, socket_path)
+        exit(0)
+    if args.batch:
+        batch_projects(args, read_project_list(args.batch), walker)
+        exit(0)
+    index = open_scan_index(None if args.no_cache else args.cache_dir, args.mmap_threshold)
+    store = None if args.no_cache else SourceStore(os.path.join(args.cache_dir, STORE_DIR))
+    STATS.watch('index_hits', index, 'hits')
+    STATS.watch('index_misses', index, 'misses')
+    STATS.watch('store_objects_written', store, 'objects_written')
+    STATS.watch('store_manifests_reused', store, 'manifests_reused')
+    imports = build_import_index(path, args.jobs, index, walker)
+    if args.export_index:
+        with open(args.export_index, 'w') as f:
+            json.dump(imports.to_dict(), f, indent=1)
+        print(f"\033[32m[+] Import index of {len(imports)} files written to {args.export_index}\033[0m")
+    with STATS.phase('resolve'):
+        distributions = distribution_index(None if args.no_cache else args.cache_dir)
+        resolver = ModuleResolver(roots, distributions)
+        imported_modules = imports.modules()
+        modules = delete_module_not_found(imported_modules, resolver)
+    STATS.count('modules_imported', imports.import_count)
+    STATS.count('modules_unique', len(imported_modules))
+    STATS.watch('modules_resolved', resolver, 'lookups')
+    # Modules which must really be imported are imported there, never in this process
+    probes = ProbePool(roots + sys.path, args.jobs, args.probe_timeout, args.probe_memory * 1024 * 1024)
+    try:
+        STATS.watch('probes_run', probes, 'probes_run')
+        STATS.watch('probe_timeouts', probes, 'timeouts')
+        STATS.watch('probe_workers_started', probes, 'workers_started')
+        if args.requirement:
+            with STATS.phase('requirements'):
+                build_requirement_file(modules, distributions, resolver)
+        if args.lock:
+            with STATS.phase('lock'):
+                graph = requirement_graph(distributions)
+                build_lock_file(modules, distributions, resolver, graph, args.lock)
+            if graph.missing:
+                print(f"\033[33m[!] Required but not installed: {', '.join(sorted(graph.missing))}\033[0m")
+    
+        if args.restriction_level == 1:
+            reset_dump_folder(DUMP_DIR)
+            for module, info in resolver.resolve_many(imported_modules).items():
+                if not info.found:
+                    print("\n")
+                    print("=====================================================")
+                    print(f"\033[33m\033[1mThe module {module} has beed dodged because it doesn't exist\033[0m")
+                    print("=====================================================")
+
+        if args.restriction_level == 2:
+            reset_dump_folder(DUMP_DIR, store)
+            versions = get_versions(modules, distributions)
+            modules_with_versions = [(module, version) for module, version in versions.items() if version]
+            modules_without_versions = [(module, version) for module, version in versions.items() if not version]
+            red_flag_modules = []
+            for module, version in modules_without_versions:
+                if module in sys.builtin_module_names:
+                    continue
+                print("Found red flag import (" + module + ") in " + ", ".join(imports.importers(module)))
+                if resolver.resolve(module).found:
+                    print("Check passed for module: " + module)
+                else:
+                    print("Module not installed: " + module)
+                red_flag_modules.append(module)
+            with STATS.phase('dump'):
+                dump_sources(red_flag_modules, resolver=resolver, store=store, materialize=not args.store_only,
+                             probes=probes)
+
+        if args.restriction_level == 3:
+            with STATS.phase('dump'):
+                reset_dump_folder(DUMP_DIR, store)
+                dump_sources(modules, resolver=resolver, store=store, materialize=not args.store_only, probes=probes)
+
+        if args.delete_red_flag:
+            if not args.dry_run:
+                reset_dump_folder(DUMP_DIR)
+            with STATS.phase('remove_imports'):
+                removed = remove_red_flag_imports(list(imports.iter_files()), path, resolver, args.jobs, args.dry_run)
+            for file_path, count in removed.items():
+                action = "Would remove" if args.dry_run else "Removed"
+                print(f"\033[32m[+] {action} {count} red flag import(s) from "
+                      f"{os.path.relpath(file_path, project_root(path, file_path))}\033[0m")
+        if args.ascii_art:
+            print_banner("Import Anal by M58")
+            exit(0)
+
+        if args.analyze_sources:
+            with STATS.phase('analyze'):
+                analyze_source_code(DUMP_DIR, index, store, args.report_format, args.report_output,
+                                    args.mmap_threshold, args.semantic, walker)
+            exit(0)
+        
+
+        if args.graph_output:
+            with STATS.phase('graph'):
+                graph = build_import_graph(imports.iter_files(), path)
+                if args.collapse_depth:
+                    graph = graph.collapse(args.collapse_depth)
+                graph.export(args.graph_output, args.graph_format)
+            cycles = graph.cycles()
+            print(f"\033[32m[+] Import graph of {len(graph.nodes)} modules written to {args.graph_output}\033[0m")
+            if cycles:
+                print(f"\033[33m[!] {len(cycles)} import cycle(s): "
+                      + "; ".join(" <-> ".join(cycle) for cycle in cycles[:10]) + "\033[0m")
+            exit(0)
+
+        if args.graph:
+            graph = build_import_graph(imports.iter_files(), path)
+            if args.collapse_depth:
+                graph = graph.collapse(args.collapse_depth)
+            GraphViewer(graph, None if args.no_cache else args.cache_dir, args.graph_labels).show()
+
+
+        if args.request_pypi:
+            if args.offline:
+                index_path = args.pypi_index or os.path.join(args.cache_dir, PYPI_INDEX_FILE)
+                try:
+                    client = PypiNameIndex(index_path)
+                except (OSError, ValueError, struct.error):
+                    # Missing, empty (mmap refuses it) or truncated snapshot
+                    print(f"\033[31m[-] No usable PyPI name index at {index_path}, "
+                          f"build it first with --build-pypi-index SOURCE\033[0m")
+                    exit(1)
+            else:
+                client = PypiClient(args.pypi_url, args.pypi_concurrency,
+                                    cache_path=None if args.no_cache else os.path.join(args.cache_dir, PYPI_CACHE_FILE))
+                STATS.watch('network_requests', client, 'requests_sent')
+                STATS.watch('pypi_cache_hits', client, 'cache_hits')
+                STATS.watch('pypi_cache_misses', client, 'cache_misses')
+            with STATS.phase('pypi'):
+                request_pypi(imported_modules, distributions, client, resolver)
+            exit(0)
+
+        # Installed without metadata, only the module itself may know its version
+        unversioned = [module for module, info in resolver.resolve_many(imported_modules).items()
+                       if info.kind == 'third-party' and not info.version]
+        with STATS.phase('probe'):
+            probed_versions = {module: result.version for module, result in probes.probe(unversioned).items()}
+        prev_root = ''
+        for file_imports, folder, file in imports.iter_files():
+            if prev_root != folder:
+                print(f"\n{folder}:")
+                print("|--" + file)
+            else:
+                print("|--" + file)
+            if not file_imports:
+                print("|   |-- \033[32mNo imports found in this file\033[0m")
+            for record in file_imports:
+                if record.level:
+                    print(f"|   |-- Import {'.' * record.level}{record.module} \033[32m(Relative import)\033[0m")
+                    continue
+                info = resolver.resolve(record.top_level)
+                if not info.found:
+                    print(f"|   |-- Import {record.module} "
+                          f"\033[31m(Module not found - Can be deleted by using -s / --delete_red_flag)\033[0m")
+                elif info.version or probed_versions.get(record.top_level):
+                    version = info.version or probed_versions[record.top_level]
+                    print(f"|   |-- Import {record.module} \033[32m({version})\033[0m")
+                elif info.kind in ('builtin', 'stdlib'):
+                    print(f"|   |-- Import {record.module} \033[32m(Standard library)\033[0m")
+                elif info.kind == 'local':
+                    print(f"|   |-- Import {record.module} \033[32m(Local module)\033[0m")
+                else:
+                    print(f"|   |-- Import {record.module} \033[33m(No version information available)\033[0m")
+            prev_root = folder
+        
+        print("--------------------------------")
+        print("\n")
+
+        print("\033[1m As asked by your arguments, the program will now:\033[0m")
+        if args.restriction_level == 1:
+            print("     - Dump source code of red print imports")
+        elif args.restriction_level == 2:
+            print("     - Dump source code of orange and red print imports")
+        elif args.restriction_level == 3:
+            print("     - Dump source code of all imports")
+        if args.requirement:
+            print("     - Create a requirement.txt file with all the import found in the project")
+        if args.delete_red_flag:
+            print("     - Delete all red flag import in files")
+        if args.ascii_art:
+            print("     - Add a complete ascii-art view of the program")
+        if args.request_pypi:
+            print("     - Request the pypi.org to get all the information about the modules")
+        print("")
+
+        if args.delete_red_flag:
+            print("\033[32m[+] All red flag imports have been deleted\033[0m")
+        if args.requirement:
+            print("\033[32m[+] A requirement.txt file has been created\033[0m")
+        if args.restriction_level == 1 or args.restriction_level == 2 or args.restriction_level == 3:
+            print("\033[32m[+] All source code has been dumped in folder named SourceCode\033[0m")
+    finally:
+        probes.close()
 
 if __name__ == "__main__":
     main()
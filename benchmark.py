@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""Benchmarks of the ImportAnal scan pipeline on deterministic synthetic projects
+
+    python benchmark.py generate CORPUS --files 1000
+    python benchmark.py run --output baseline.json
+    python benchmark.py compare baseline.json current.json --threshold 0.10
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import contextlib
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Callable, Dict, List, NamedTuple
+
+import ImportAnal
+
+
+class CorpusSpec(NamedTuple):
+    """Shape of a synthetic project"""
+    files: int
+    imports: int = 8
+    suspect_density: float = 0.02
+    mean_lines: int = 120
+    missing_ratio: float = 0.1
+    seed: int = 58
+
+
+SCALES = {
+    'small': CorpusSpec(files=100),
+    'medium': CorpusSpec(files=1000),
+    'large': CorpusSpec(files=5000),
+}
+
+# Modules imported by the synthetic files besides the standard library and the project itself
+THIRD_PARTY_MODULES = ['requests', 'colorama', 'pyfiglet', 'networkx', 'matplotlib', 'numpy', 'urllib3', 'idna']
+
+SUSPECT_LINES = [
+    "os.system(command)",
+    "result = eval(expression)",
+    "exec(code, namespace)",
+    "process = subprocess.Popen(arguments, shell=True)",
+    "# TODO: do not use pickle here",
+    "message = \"the socket is closed\"",
+    "handle = ctypes.CDLL(library)",
+]
+
+PLAIN_LINES = [
+    "value = compute(value, {n})",
+    "items.append(value * {n})",
+    "if value > {n}:",
+    "total = sum(items) + {n}",
+    "name = 'item_{n}'",
+    "# keep the order of the items",
+]
+
+
+def generate_corpus(path: str, spec: CorpusSpec) -> None:
+    """Write a synthetic project, the same spec always gives the same files
+
+    Files are spread over a package tree and import a mix of standard
+    library, third-party, project and missing modules. File lengths follow
+    a log-normal distribution around mean_lines, and suspect_density is
+    the share of lines holding a suspect string.
+
+    Args:
+        path (str): folder of the project, replaced when it exists
+        spec (CorpusSpec): shape of the project
+    """
+    generator = random.Random(spec.seed)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    standard_library = sorted(name for name in sys.stdlib_module_names if not name.startswith('_'))
+    missing = [f"missing_module_{index}" for index in range(max(1, spec.files // 20))]
+
+    modules = []
+    for index in range(spec.files):
+        depth = generator.randint(0, 3)
+        package = [f"package_{generator.randint(0, 9)}" for level in range(depth)]
+        modules.append(package + [f"module_{index}"])
+
+    for index, parts in enumerate(modules):
+        folder = os.path.join(path, *parts[:-1])
+        os.makedirs(folder, exist_ok=True)
+        lines = []
+        for import_index in range(spec.imports):
+            draw = generator.random()
+            if draw < spec.missing_ratio:
+                module = generator.choice(missing)
+            elif draw < 0.5:
+                module = generator.choice(standard_library)
+            elif draw < 0.7:
+                module = generator.choice(THIRD_PARTY_MODULES)
+            else:
+                module = ".".join(generator.choice(modules))
+            if generator.random() < 0.3:
+                lines.append(f"from {module} import name_{import_index}")
+            else:
+                lines.append(f"import {module}")
+        line_count = max(spec.imports + 1, int(generator.lognormvariate(0, 0.75) * spec.mean_lines))
+        lines.append(f"def function_{index}(value, items, command, expression, code, namespace, arguments, library):")
+        for line_index in range(line_count - len(lines)):
+            if generator.random() < spec.suspect_density:
+                line = generator.choice(SUSPECT_LINES)
+            else:
+                line = generator.choice(PLAIN_LINES).format(n=line_index)
+            # Plain lines ending with ':' open a block, the next line is indented once more
+            lines.append("    " + line + ("\n        pass" if line.endswith(':') else ""))
+        lines.append("    return value")
+        with open(os.path.join(folder, parts[-1] + ".py"), 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        for level in range(1, len(parts)):
+            init = os.path.join(path, *parts[:level], "__init__.py")
+            if not os.path.exists(init):
+                open(init, 'w').close()
+
+
+def measure(function: Callable, repeat: int) -> Dict[str, object]:
+    """Time a function, the minimum is the figure compared between runs
+
+    Args:
+        function (Callable): function without arguments
+        repeat (int): number of runs
+
+    Returns:
+        Dict[str, object]: minimum, median and every run, in seconds
+    """
+    runs = []
+    for run in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            runs.append(time.perf_counter() - start)
+    return {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}
+
+
+def measure_startup(repeat: int) -> Dict[str, object]:
+    """Time a start of the program up to its argument parsing
+
+    Args:
+        repeat (int): number of runs
+
+    Returns:
+        Dict[str, object]: minimum, median and every run, in seconds
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ImportAnal.py")
+    return measure(lambda: subprocess.run([sys.executable, script, '--version'], stdout=subprocess.DEVNULL,
+                                          check=True), repeat)
+
+
+def run_scale(name: str, spec: CorpusSpec, work_dir: str, repeat: int, jobs: int = None) -> Dict[str, dict]:
+    """Benchmark every stage of the pipeline on one synthetic project
+
+    Caches are disabled so that every run does the full work.
+
+    Args:
+        name (str): name of the scale
+        spec (CorpusSpec): shape of the project
+        work_dir (str): folder receiving the project and the files written by the stages
+        repeat (int): number of runs of each stage
+        jobs (int, optional): number of processes of get_imports
+
+    Returns:
+        Dict[str, dict]: timings by stage
+    """
+    corpus = os.path.join(work_dir, name)
+    generate_corpus(corpus, spec)
+    result = ImportAnal.get_imports(corpus, jobs)
+    modules = [record.top_level for records, folder, file in result for record in records if record.top_level]
+    distributions = ImportAnal.distribution_index()
+    found = ImportAnal.delete_module_not_found(modules, ImportAnal.ModuleResolver([corpus], distributions))
+
+    timings = {
+        'get_imports': measure(lambda: ImportAnal.get_imports(corpus, jobs), repeat),
+        'delete_module_not_found': measure(
+            lambda: ImportAnal.delete_module_not_found(modules, ImportAnal.ModuleResolver([corpus], distributions)),
+            repeat),
+        'build_requirement_file': measure(lambda: ImportAnal.build_requirement_file(found, distributions), repeat),
+        'analyze_source_code': measure(
+            lambda: ImportAnal.analyze_source_code(corpus, report_path=os.path.join(work_dir, "report.html")), repeat),
+        'build_import_graph': measure(lambda: ImportAnal.build_import_graph(result, corpus), repeat),
+    }
+    timings['get_imports']['files'] = len(result)
+    timings['delete_module_not_found']['modules'] = len(modules)
+    return timings
+
+
+def run_benchmarks(scales: List[str], repeat: int, jobs: int = None, work_dir: str = None) -> dict:
+    """Run the benchmarks of the given scales
+
+    Args:
+        scales (List[str]): names of SCALES
+        repeat (int): number of runs of each stage
+        jobs (int, optional): number of processes of get_imports
+        work_dir (str, optional): folder of the projects, a temporary one by default
+
+    Returns:
+        dict: metadata and timings, keyed by "<scale>/<stage>"
+    """
+    results = {'startup': measure_startup(max(repeat, 5))}
+    temporary = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="importanal-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    current = os.getcwd()
+    # build_requirement_file writes in the current folder
+    os.chdir(work_dir)
+    try:
+        for name in scales:
+            print(f"\033[1m[*] {name}: {SCALES[name].files} files\033[0m")
+            for stage, timing in run_scale(name, SCALES[name], work_dir, repeat, jobs).items():
+                results[f"{name}/{stage}"] = timing
+                print(f"    {stage:<26} {timing['min'] * 1000:10.1f} ms")
+    finally:
+        os.chdir(current)
+        if temporary:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        'meta': {
+            'version': ImportAnal.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': repeat,
+            'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Print the change of every benchmark and return the regressions
+
+    Args:
+        baseline (dict): reference results
+        current (dict): new results
+        threshold (float): relative slowdown of the minimum above which a benchmark regressed
+
+    Returns:
+        List[str]: names of the regressed benchmarks, those missing from the current results included
+    """
+    regressions = []
+    print(f"{'benchmark':<38} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, timing in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            print(f"{name:<38} {'-':>12} {timing['min'] * 1000:10.1f}ms {'new':>9}")
+            continue
+        change = timing['min'] / reference['min'] - 1 if reference['min'] else 0.0
+        color = "\033[31m" if change > threshold else "\033[32m" if change < -threshold else ""
+        print(f"{color}{name:<38} {reference['min'] * 1000:10.1f}ms {timing['min'] * 1000:10.1f}ms "
+              f"{change:+8.1%}\033[0m")
+        if change > threshold:
+            regressions.append(name)
+    # A benchmark which stopped running must not pass unnoticed
+    for name, reference in baseline['results'].items():
+        if name not in current['results']:
+            print(f"\033[31m{name:<38} {reference['min'] * 1000:10.1f}ms {'-':>12} {'missing':>9}\033[0m")
+            regressions.append(name)
+    return regressions
+
+
+def parse_arguments():
+    """Parse the arguments of the benchmarks
+
+    Returns:
+        _type_: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Write a synthetic project')
+    generate.add_argument('path', help='Folder of the project')
+    generate.add_argument('--files', type=int, default=1000)
+    generate.add_argument('--imports', type=int, default=CorpusSpec._field_defaults['imports'],
+                          help='Imports per file (default: %(default)s)')
+    generate.add_argument('--suspect-density', type=float, default=CorpusSpec._field_defaults['suspect_density'],
+                          help='Share of lines holding a suspect (default: %(default)s)')
+    generate.add_argument('--mean-lines', type=int, default=CorpusSpec._field_defaults['mean_lines'],
+                          help='Median length of the files (default: %(default)s)')
+    generate.add_argument('--missing-ratio', type=float, default=CorpusSpec._field_defaults['missing_ratio'],
+                          help='Share of imports of missing modules (default: %(default)s)')
+    generate.add_argument('--seed', type=int, default=CorpusSpec._field_defaults['seed'])
+
+    run = commands.add_parser('run', help='Run the benchmarks and write their results')
+    run.add_argument('--scales', default='small,medium',
+                     help=f"Comma separated scales among {', '.join(SCALES)} (default: %(default)s)")
+    run.add_argument('--repeat', type=int, default=3, help='Runs of each benchmark (default: %(default)s)')
+    run.add_argument('-j', '--jobs', type=int, default=None, help='Processes of get_imports (default: number of CPUs)')
+    run.add_argument('--work-dir', default=None, help='Keep the synthetic projects in this folder')
+    run.add_argument('-o', '--output', default='benchmark.json', help='Results file (default: %(default)s)')
+
+    compare_command = commands.add_parser('compare', help='Compare results with a baseline')
+    compare_command.add_argument('baseline', help='Reference results file')
+    compare_command.add_argument('current', help='New results file')
+    compare_command.add_argument('--threshold', type=float, default=0.10,
+                                 help='Relative slowdown reported as a regression (default: %(default)s)')
+    return parser.parse_args()
+
+
+def main():
+    """ Main
+    """
+    args = parse_arguments()
+    if args.command == 'generate':
+        generate_corpus(args.path, CorpusSpec(args.files, args.imports, args.suspect_density, args.mean_lines,
+                                              args.missing_ratio, args.seed))
+        print(f"\033[32m[+] Synthetic project of {args.files} files written to {args.path}\033[0m")
+    elif args.command == 'run':
+        scales = [scale.strip() for scale in args.scales.split(',') if scale.strip()]
+        unknown = [scale for scale in scales if scale not in SCALES]
+        if unknown:
+            exit(f"Unknown scales: {', '.join(unknown)}")
+        results = run_benchmarks(scales, args.repeat, args.jobs, args.work_dir and os.path.abspath(args.work_dir))
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"\033[32m[+] Results written to {args.output}\033[0m")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"\033[31m[!] {len(regressions)} regression(s), slower by more than {args.threshold:.0%} "
+                  f"or missing\033[0m")
+            exit(1)
+        print("\033[32m[+] No regression\033[0m")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,673 @@
+import os
+import json
+import mmap
+import sys
+import threading
+import time
+
+import pytest
+
+import ImportAnal
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def imported_modules(result):
+    return sorted((folder, file, tuple(record.module for record in records)) for records, folder, file in result)
+
+
+def test_startup_does_not_import_heavy_modules():
+    import subprocess
+    # -S keeps out the modules imported by the .pth files of the environment
+    result = subprocess.run([sys.executable, '-S', '-X', 'importtime', ImportAnal.__file__, '--version'],
+                            capture_output=True, text=True, check=True)
+    imported = {line.rsplit('|', 1)[1].strip() for line in result.stderr.splitlines()
+                if line.startswith('import time:') and '|' in line}
+    assert 'ImportAnal.py' in result.stdout and 'sqlite3' in imported
+    for heavy in ('requests', 'matplotlib', 'networkx', 'pathlib', 'colorama', 'pyfiglet', 'packaging',
+                  'concurrent.futures', 'xml', 'socket'):
+        assert heavy not in imported
+
+
+def test_dump_does_not_change_the_next_run(tmp_path):
+    project = str(tmp_path)
+    dump = os.path.join(project, ImportAnal.DUMP_DIR)
+    cache = os.path.join(project, ImportAnal.CACHE_DIR)
+    write(os.path.join(project, 'main.py'), b"import json\nimport colorama\n")
+    walker = ImportAnal.SourceWalker([dump, cache])
+
+    first = ImportAnal.get_imports(project, jobs=1, walker=walker)
+    ImportAnal.dump_sources(['colorama'], dump)
+    first_manifest = ImportAnal.read_dump_manifest(dump)
+    assert first_manifest
+
+    second = ImportAnal.get_imports(project, jobs=1, walker=walker)
+    assert imported_modules(second) == imported_modules(first)
+
+    ImportAnal.dump_sources(['colorama'], dump)
+    assert ImportAnal.read_dump_manifest(dump) == first_manifest
+
+
+def scanned_tree(project):
+    write(os.path.join(project, 'lib', 'mod.py'), b"import pickle\n")
+    return list(ImportAnal.iter_source_tree(os.path.join(project, 'lib'), ImportAnal.SuspectMatcher(['pickle'])))
+
+
+def test_sharded_report_links_to_the_scanned_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    report = os.path.join('out', 'report')
+    ImportAnal.write_sharded_html_report(scanned_tree('.'), report, 'lib')
+    with open(os.path.join(report, 'files', '0.html'), encoding='utf-8') as f:
+        page = f.read()
+    link = page.split("<a href='")[2].split("'")[0]
+    target = os.path.normpath(os.path.join(report, 'files', link))
+    assert os.path.samefile(target, os.path.join('lib', 'mod.py'))
+
+
+def test_sarif_base_uri_is_a_file_uri(tmp_path):
+    project = str(tmp_path)
+    report = os.path.join(project, 'findings.sarif')
+    ImportAnal.write_sarif_report(scanned_tree(project), report, project)
+    with open(report, encoding='utf-8') as f:
+        log = json.load(f)
+    base = log['runs'][0]['originalUriBaseIds']['SRCROOT']['uri']
+    assert base == tmp_path.resolve().as_uri() + '/'
+    assert log['runs'][0]['results'][0]['locations'][0]['physicalLocation']['artifactLocation']['uri'] == 'lib/mod.py'
+
+
+def test_mapped_scan_matches_the_in_memory_scan(tmp_path):
+    matcher = ImportAnal.SuspectMatcher(['sh', 'shelve', 'os', 'os.system', 'pickle'])
+    page = mmap.PAGESIZE
+    content = bytearray(b"x = 1\n" * (3 * page // 6))
+    # Overlapping suspects across each chunk boundary, and one ending exactly on it
+    for boundary in (page, 2 * page):
+        content[boundary - 3:boundary + 7] = b"shelve.os;"
+    content[3 * page - 6:3 * page] = b"pickle"
+    content += b"\nos.system('ls')\n"
+    path = tmp_path / 'big.py'
+    path.write_bytes(bytes(content))
+
+    mapped, digest = ImportAnal.scan_mapped_file('big.py', str(path), matcher, chunk_size=page)
+    in_memory = ImportAnal._scan_content('big.py', str(path), bytes(content), matcher)
+    assert digest == ImportAnal.file_digest(bytes(content))
+    assert mapped.line_count == in_memory.line_count
+    assert mapped.matches == in_memory.matches
+    assert {'sh', 'shelve', 'os', 'os.system', 'pickle'} <= {match.suspect for match in mapped.matches}
+
+
+def test_scan_index_hits_and_misses(tmp_path):
+    source = str(tmp_path / 'project' / 'mod.py')
+    write(source, b"import json\n")
+    cache_dir = str(tmp_path / 'cache')
+
+    def scan(mmap_threshold=None):
+        index = ImportAnal.open_scan_index(cache_dir, mmap_threshold)
+        result = ImportAnal.get_imports(str(tmp_path / 'project'), 1, index)
+        index.close()
+        return [record.module for record in result[0][0]], index
+
+    assert scan()[0] == ['json']
+    modules, index = scan()
+    assert modules == ['json'] and (index.hits, index.misses) == (1, 0)
+
+    # Same size and mtime, only the content hash tells the change
+    stat = os.stat(source)
+    write(source, b"import math\n")
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    modules, index = scan()
+    assert modules == ['json'] and index.hits == 1
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    modules, index = scan()
+    assert modules == ['math'] and (index.hits, index.misses) == (0, 0)
+
+    modules, index = scan(1024)
+    assert modules == ['math'] and (index.hits, index.misses) == (0, 1)
+    assert ImportAnal.index_signature(['eval']) != ImportAnal.index_signature(['eval'], 1024)
+    assert ImportAnal.index_signature(['eval']) != ImportAnal.index_signature(['exec'])
+
+
+def test_binary_files_are_indexed_as_empty(tmp_path):
+    tree = tmp_path / 'tree'
+    write(str(tree / 'lib.so'), b"\x7fELF\0\0pickle" + b"\0" * 100000)
+    write(str(tree / 'mod.py'), b"import pickle\n")
+    index = ImportAnal.ScanIndex(str(tmp_path / 'index.sqlite'), 'test')
+    matcher = ImportAnal.SuspectMatcher(['pickle'])
+
+    first = ImportAnal.scan_source_tree(str(tree), matcher, index)
+    assert [scanned.name for scanned in first] == ['mod.py']
+    second = ImportAnal.scan_source_tree(str(tree), matcher, index)
+    assert second == first
+    assert index.hits == 2
+
+
+def test_resolver_kinds(tmp_path):
+    write(str(tmp_path / 'localmod.py'), b"")
+    write(str(tmp_path / 'localpkg' / '__init__.py'), b"")
+    write(str(tmp_path / 'localpkg' / 'sub.py'), b"")
+    # Namespace package: no __init__.py
+    write(str(tmp_path / 'namespace' / 'part.py'), b"")
+    resolver = ImportAnal.ModuleResolver([str(tmp_path)])
+    kinds = {name: info.kind for name, info in resolver.resolve_many(
+        ['sys', 'json', 'json.decoder', 'localmod', 'localpkg.sub', 'namespace', 'namespace.part', 'colorama',
+         'not_a_real_module_xyz', 'localpkg.missing', 'json.not_there']).items()}
+    assert kinds == {'sys': 'builtin', 'json': 'stdlib', 'json.decoder': 'stdlib', 'localmod': 'local',
+                     'localpkg.sub': 'local', 'namespace': 'local', 'namespace.part': 'local',
+                     'colorama': 'third-party', 'not_a_real_module_xyz': 'missing', 'localpkg.missing': 'missing',
+                     'json.not_there': 'missing'}
+    assert resolver.resolve('namespace').origin == str(tmp_path / 'namespace')
+    assert resolver.resolve('namespace.part').origin == str(tmp_path / 'namespace' / 'part.py')
+    assert resolver.resolve('colorama').version == ImportAnal.distribution_index().get('colorama').version
+    assert resolver.resolve('localmod').version is None and resolver.resolve('sys').origin == 'built-in'
+    lookups = resolver.lookups
+    assert resolver.resolve('json') is resolver.resolve('json') and resolver.lookups == lookups + 2
+    assert 'localmod' not in sys.modules and 'namespace' not in sys.modules
+
+
+def test_requirements_leave_out_provided_modules(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write(str(tmp_path / 'localmod.py'), b"")
+    resolver = ImportAnal.ModuleResolver([str(tmp_path)])
+    ImportAnal.build_requirement_file(['json', 'sys', 'localmod', 'colorama'], resolver=resolver)
+    with open('requirements.txt') as f:
+        requirements = [line.split('==')[0] for line in f.read().splitlines()]
+    assert requirements == ['colorama']
+
+
+def fake_distributions():
+    Distribution = ImportAnal.Distribution
+    return ImportAnal.DistributionIndex(
+        {'web-client': Distribution('Web_Client', '2.0'), 'urllib3': Distribution('urllib3', '2.1'),
+         'idna': Distribution('idna', '3.4'), 'pysocks': Distribution('PySocks', '1.7')},
+        {'webclient': ['web-client'], 'urllib3': ['urllib3'], 'idna': ['idna'], 'socks': ['pysocks']},
+        {'web-client': ['urllib3 (<3,>=1.21)', 'idna>=2.5', "PySocks!=1.5.7; extra == 'socks'",
+                        'pywin32; sys_platform == "win32"', 'colorama; python_version < "3"', 'absent-dep'],
+         'urllib3': ["idna; extra == 'secure'"], 'idna': [], 'pysocks': []})
+
+
+def test_lock_file_pins_the_closure_with_markers(tmp_path):
+    graph = ImportAnal.RequirementGraph(fake_distributions())
+    assert graph.closure(['Web_Client']) == {'absent-dep': ['web-client'], 'idna': ['web-client'],
+                                             'urllib3': ['web-client'], 'web-client': []}
+    assert graph.missing == {'absent-dep'}
+    assert ('pysocks', frozenset()) in graph.dependencies('web-client', ['socks'])
+    resolver = ImportAnal.ModuleResolver([str(tmp_path)])
+    first = ImportAnal.build_lock_file(['webclient.api', 'json', 'idna'], fake_distributions(), resolver,
+                                       graph, str(tmp_path / 'first.txt'))
+    second = ImportAnal.build_lock_file(['idna', 'webclient'], fake_distributions(), resolver,
+                                        graph, str(tmp_path / 'second.txt'))
+    assert first == second
+    assert [line for line in first.splitlines() if not line.startswith('#')] == [
+        '    # via web-client', 'idna==3.4', '    # via web-client', 'urllib3==2.1', '    # via web-client',
+        'Web_Client==2.0']
+
+
+def test_marker_fallback_agrees_with_the_reference():
+    environment = dict(ImportAnal.marker_environment(), extra='Socks')
+    evaluate = ImportAnal._evaluate_marker_fallback
+    assert evaluate("extra == 'socks'", environment)
+    assert evaluate('python_version >= "3.8" and (sys_platform == "win32" or os_name != "nt_x")', environment)
+    assert not evaluate('python_version < "3" or platform_system == "Nothing"', environment)
+    assert evaluate('"linux" not in "win32" and python_full_version ~= "3.0"', environment)
+
+
+class RecordingClient:
+    def __init__(self):
+        self.queried = []
+
+    def exists_many(self, names):
+        self.queried.extend(names)
+        return {name: False for name in names}
+
+
+def test_pypi_is_not_queried_for_provided_modules(tmp_path):
+    write(str(tmp_path / 'localmod.py'), b"")
+    resolver = ImportAnal.ModuleResolver([str(tmp_path)])
+    client = RecordingClient()
+    unknown = ImportAnal.request_pypi(['json', 'sys', 'localmod', 'colorama', 'not_a_real_module_xyz'],
+                                      client=client, resolver=resolver)
+    assert client.queried == ['not_a_real_module_xyz']
+    assert unknown == ['not_a_real_module_xyz']
+
+
+def test_extract_imports_records():
+    source = b"""import os, json as j
+from . import sibling
+from ..pkg.mod import (
+    first,
+    second as alias,
+)
+if os.name == 'nt':
+    import winreg
+try:
+    import ujson
+except ImportError:
+    from json import loads
+def load():
+    import pickle
+match sys.argv:
+    case ['x']:
+        import marshal
+    case _:
+        pass
+"""
+    Record = ImportAnal.ImportRecord
+    assert ImportAnal.extract_imports(source) == [
+        Record('os', (), 0, 1, False), Record('json', (), 0, 1, False), Record('', ('sibling',), 1, 2, False),
+        Record('pkg.mod', ('first', 'second'), 2, 3, False), Record('winreg', (), 0, 8, True),
+        Record('ujson', (), 0, 10, True), Record('json', ('loads',), 0, 12, True),
+        Record('pickle', (), 0, 14, True), Record('marshal', (), 0, 17, True)]
+    assert ImportAnal.extract_imports(source)[0].top_level == 'os'
+    assert ImportAnal.extract_imports(source)[3].top_level == ''
+
+
+def test_extract_imports_falls_back_to_lines_on_syntax_errors():
+    source = b"""import os, sys
+print "python 2"
+from .compat import (urlopen,  # comment
+    quote)
+    import socket
+from ..util import *
+"""
+    Record = ImportAnal.ImportRecord
+    assert ImportAnal.extract_imports(source) == [
+        Record('os', (), 0, 1, False), Record('sys', (), 0, 1, False),
+        Record('compat', ('urlopen', 'quote'), 1, 3, False), Record('socket', (), 0, 5, True),
+        Record('util', ('*',), 2, 6, False)]
+
+
+def test_pypi_name_index_lookups(tmp_path):
+    write(str(tmp_path / 'simple.html'), b"<html><body><a href='/simple/requests/'>requests</a>\n"
+                                         b"<a href='/simple/zope-interface/'>zope.interface</a>\n"
+                                         b"<a href='/simple/pyyaml/'>PyYAML</a>\n<a>Flask_Login</a>\n"
+                                         b"<a>a</a><a>zzz</a><a>requests</a></body></html>")
+    write(str(tmp_path / 'simple.json'), json.dumps({'projects': [{'name': 'Django'}, {'name': 'six'}]}).encode())
+    write(str(tmp_path / 'names.txt'), b"# comment\nnumpy\n\nscipy\n")
+    assert ImportAnal.read_project_names(str(tmp_path / 'simple.json')) == ['Django', 'six']
+    assert ImportAnal.read_project_names(str(tmp_path / 'names.txt')) == ['numpy', 'scipy']
+    names = ImportAnal.read_project_names(str(tmp_path / 'simple.html'))
+    path = str(tmp_path / 'index' / 'pypi.idx')
+    assert ImportAnal.PypiNameIndex.build(names, path) == 6
+
+    index = ImportAnal.PypiNameIndex(path)
+    try:
+        assert len(index) == 6
+        for present in ('requests', 'REQUESTS', 'pyyaml', 'PyYAML', 'zope.interface', 'zope_interface',
+                        'Zope-Interface', 'flask-login', 'Flask.Login', 'a', 'zzz'):
+            assert present in index
+        for absent in ('request', 'requestss', 'zope', 'flask', '', '0', 'zzzz', 'yaml'):
+            assert absent not in index
+        assert index.exists_many(['six', 'PyYAML', 'six']) == {'six': False, 'PyYAML': True}
+    finally:
+        index.close()
+
+    write(str(tmp_path / 'broken.idx'), b"not an index")
+    with pytest.raises(ValueError):
+        ImportAnal.PypiNameIndex(str(tmp_path / 'broken.idx'))
+
+
+def test_remove_imports_keeps_longer_names_and_other_aliases():
+    source = b"import Xtra\nimport X, Y\nfrom X.sub import name\nimport X.sub as alias\n"
+    cleaned, removed = ImportAnal.remove_imports(source, ['X'])
+    assert cleaned == b"import Xtra\nimport Y\n"
+    assert removed == 3
+
+
+def test_remove_imports_on_semicolon_lines():
+    cleaned, removed = ImportAnal.remove_imports(b"import X; import os\nx = 1; import X\n", ['X'])
+    assert removed == 2
+    assert compile(cleaned, 'cleaned', 'exec')
+    assert b"import os" in cleaned and b"x = 1" in cleaned and b"X" not in cleaned
+
+
+def test_remove_imports_fills_emptied_blocks():
+    source = b"try:\n    import X\nexcept ImportError:\n    X = None\n\ndef load():\n    import X\n"
+    cleaned, removed = ImportAnal.remove_imports(source, ['X'])
+    assert removed == 2
+    compile(cleaned, 'cleaned', 'exec')
+    assert cleaned.count(b"pass") == 2
+
+
+def test_remove_imports_keeps_bom_and_crlf():
+    source = b"\xef\xbb\xbfimport X\r\nimport os\r\nprint(os.name)\r\n"
+    cleaned, removed = ImportAnal.remove_imports(source, ['X'])
+    assert removed == 1
+    assert cleaned == b"\xef\xbb\xbfimport os\r\nprint(os.name)\r\n"
+
+
+def test_matcher_finds_what_a_find_loop_finds():
+    suspects = ['sh', 'shelve', 'os', 'os.system', 'socket', 'so']
+    text = "import shelve, socket\nos.system('sh')\nshshelve os.systemos\n"
+    expected = []
+    for suspect in suspects:
+        position = text.find(suspect)
+        while position != -1:
+            expected.append((position, suspect))
+            position = text.find(suspect, position + 1)
+    matcher = ImportAnal.SuspectMatcher(suspects)
+    assert sorted(matcher.finditer(text)) == sorted(expected)
+    assert sorted(matcher.finditer_buffer(text.encode(), 0, len(text))) == sorted(expected)
+
+
+def walked_tree(tmp_path):
+    for relative in ('app/main.py', 'app/pkg/mod.py', 'app/data/big.py', 'app/docs/conf.py', 'app/docs/keep.py',
+                     'app/.git/hook.py', 'app/node_modules/x/y.py', 'app/env/lib/site.py', 'app/env/pyvenv.cfg',
+                     'app/notes.txt', 'other/tool.py'):
+        write(str(tmp_path / relative), b"import json\n")
+    write(str(tmp_path / 'app' / 'data' / 'big.py'), b"x = 1\n" * 1000)
+    return str(tmp_path / 'app'), str(tmp_path / 'other')
+
+
+CLASSIFIED_SOURCE = b"""import subprocess  # subprocess here
+from os import system
+
+
+@subprocess.wraps
+class Runner:
+    def run(self, command):
+        label = f"{subprocess.PIPE} subprocess"
+        system(command)
+        return eval(command)
+
+    def subprocess_name(self):
+        return "# subprocess"
+"""
+
+
+def test_classify_suspects_kinds_and_scopes():
+    matcher = ImportAnal.SuspectMatcher(['subprocess', 'eval', 'system'])
+    expected = [('subprocess', 1, 'import', ''), ('subprocess', 1, 'comment', ''), ('subprocess', 5, 'name', ''),
+                ('subprocess', 8, 'name', 'Runner.run'), ('subprocess', 8, 'string', 'Runner.run'),
+                ('subprocess', 12, 'other', 'Runner.subprocess_name'),
+                ('subprocess', 13, 'string', 'Runner.subprocess_name'), ('eval', 10, 'call', 'Runner.run'),
+                ('system', 2, 'import', ''), ('system', 9, 'call', 'Runner.run')]
+    for newline in (b"\n", b"\r\n", b"\r"):
+        source = CLASSIFIED_SOURCE.replace(b"\n", newline)
+        matches = ImportAnal.classify_suspects(source, matcher)
+        assert [(match.suspect, match.line_number, match.kind, match.scope) for match in matches] == expected
+        assert [match.true_positive for match in matches] == [kind in ImportAnal.USAGE_KINDS
+                                                              for suspect, line, kind, scope in expected]
+        assert all(source[match.offset:].startswith(match.suspect.encode()) for match in matches)
+        assert matches[3].line == 'label = f"{subprocess.PIPE} subprocess"'
+
+
+def test_walker_prunes_environments_and_ignored_paths(tmp_path):
+    app, other = walked_tree(tmp_path)
+    for threads in (1, 4):
+        walker = ImportAnal.SourceWalker(ignore=['docs/', '!docs/keep.py', '*.txt'], max_file_size=1000,
+                                         threads=threads)
+        walked = [os.path.relpath(os.path.join(folder, file), app) for folder, file in walker.walk(app)]
+        assert walked == ['main.py', os.path.join('pkg', 'mod.py')]
+        assert walker.files_too_large == 1
+        assert walker.folders_pruned == 4
+
+
+def test_ignore_rules_follow_gitignore():
+    rules = ImportAnal.IgnoreRules(['*.log', '/build', 'tests/**/fixtures', 'cache/', '!important.log'])
+    assert rules.ignored('a/b/debug.log', False)
+    assert not rules.ignored('a/important.log', False)
+    assert rules.ignored('build', True) and not rules.ignored('src/build', True)
+    assert rules.ignored('tests/fixtures', True) and rules.ignored('tests/unit/deep/fixtures', True)
+    assert rules.ignored('src/cache', True) and not rules.ignored('src/cache', False)
+
+
+def test_walker_survives_symlink_loops(tmp_path):
+    write(str(tmp_path / 'root' / 'pkg' / 'mod.py'), b"")
+    os.symlink(str(tmp_path / 'root'), str(tmp_path / 'root' / 'pkg' / 'loop'))
+    walker = ImportAnal.SourceWalker(follow_symlinks=True)
+    assert [file for folder, file in walker.walk(str(tmp_path / 'root'))] == ['mod.py']
+    assert walker.links_skipped == 1
+
+
+def test_get_imports_walks_every_root(tmp_path):
+    app, other = walked_tree(tmp_path)
+    result = ImportAnal.get_imports([app, other, app], jobs=1)
+    assert sorted(file for records, folder, file in result) == ['big.py', 'conf.py', 'keep.py', 'main.py', 'mod.py',
+                                                               'tool.py']
+
+
+def test_import_index_answers_queries_like_the_records():
+    result = [
+        ([ImportAnal.ImportRecord('os.path', (), 0, 1, False), ImportAnal.ImportRecord('json', (), 0, 2, True),
+          ImportAnal.ImportRecord('os', (), 0, 3, False)], '/p', 'a.py'),
+        ([ImportAnal.ImportRecord('pkg', ('mod',), 1, 1, False), ImportAnal.ImportRecord('os', (), 0, 2, False)],
+         '/p/pkg', 'b.py'),
+        ([], '/p', 'c.py'),
+    ]
+    imports = ImportAnal.ImportIndex.from_result(result)
+    assert list(imports.iter_files()) == result
+    assert imports.modules() == ['os', 'json']
+    assert imports.importers('os') == [os.path.join('/p', 'a.py'), os.path.join('/p/pkg', 'b.py')]
+    assert imports.importers('missing') == []
+    assert imports.count('os') == 3 and imports.import_count == 4
+    assert imports.top(1) == [('os', 3)]
+    assert imports.to_dict()['modules']['json'] == {'count': 1, 'files': [os.path.join('/p', 'a.py')]}
+
+
+def test_import_index_replaces_and_removes_files():
+    record = ImportAnal.ImportRecord
+    imports = ImportAnal.ImportIndex.from_result([
+        ([record('os', (), 0, 1, False), record('json', (), 0, 2, False)], '/p', 'a.py'),
+        ([record('os', (), 0, 1, False)], '/p', 'b.py'),
+        ([record('re', (), 0, 1, False)], '/p', 'c.py'),
+    ])
+    imports.add('/p', 'a.py', [record('re', (), 0, 1, False), record('pkg', (), 1, 2, False)])
+    assert len(imports) == 3 and imports.import_count == 3
+    assert imports.count('os') == 1 and imports.count('json') == 0 and imports.count('re') == 2
+    assert imports.importers('re') == [os.path.join('/p', 'c.py'), os.path.join('/p', 'a.py')]
+    assert 'json' not in imports.modules() and 'json' not in imports.to_dict()['modules']
+    assert imports.remove('/p', 'b.py') and not imports.remove('/p', 'b.py')
+    assert len(imports) == 2 and imports.importers('os') == [] and imports.modules() == ['re']
+    assert [file for records, folder, file in imports.iter_files()] == ['c.py', 'a.py']
+    imports.remove('/p', 'c.py')
+    assert list(imports.iter_files()) == [([record('re', (), 0, 1, False), record('pkg', (), 1, 2, False)], '/p',
+                                           'a.py')]
+    assert imports.top(5) == [('re', 1)] and imports.import_count == 1
+
+
+def test_probe_pool_isolates_imports(tmp_path):
+    write(str(tmp_path / 'hangs.py'), b"import time\ntime.sleep(60)\n")
+    write(str(tmp_path / 'noisy.py'), b"print('hello')\n__version__ = '1.2'\n")
+    write(str(tmp_path / 'broken.py'), b"raise RuntimeError('nope')\n")
+    with ImportAnal.ProbePool([str(tmp_path)] + sys.path, workers=1, timeout=2, max_probes=2) as probes:
+        results = probes.probe(['noisy', 'hangs', 'broken', 'json', 'noisy'], source=True)
+        assert results['noisy'].version == '1.2' and 'hello' in results['noisy'].source
+        assert 'more than' in results['hangs'].error
+        assert results['broken'].error.startswith('RuntimeError')
+        assert results['json'].source and results['json'].error is None
+        assert probes.timeouts == 1 and probes.workers_started >= 2
+        probes_run = probes.probes_run
+        assert probes.probe(['json', 'noisy'])['noisy'].version == '1.2'
+        assert probes.probes_run == probes_run
+    assert 'noisy' not in sys.modules
+
+
+def test_watcher_only_parses_changed_files(tmp_path, monkeypatch):
+    write(str(tmp_path / 'a.py'), b"import json\n")
+    write(str(tmp_path / 'b.py'), b"import colorama\n")
+    watcher = ImportAnal.ImportWatcher([str(tmp_path)], jobs=1)
+    assert len(watcher.refresh()[0]) == 2
+    assert watcher.refresh() == ([], [])
+
+    write(str(tmp_path / 'b.py'), b"import not_a_real_module_xyz\n")
+    os.remove(str(tmp_path / 'a.py'))
+    write(str(tmp_path / 'c.py'), b"import b\n")
+    changed, removed = watcher.refresh()
+    assert sorted(map(os.path.basename, changed)) == ['b.py', 'c.py'] and removed == [str(tmp_path / 'a.py')]
+    assert watcher.query({'command': 'modules'}) == {'modules': ['not_a_real_module_xyz', 'b']}
+    assert watcher.query({'command': 'missing'}) == {'modules': ['not_a_real_module_xyz']}
+    assert watcher.query({'command': 'resolve', 'argument': 'b'})['kind'] == 'local'
+    assert 'error' in watcher.query({'command': 'count'})
+
+
+def test_watch_socket_answers_queries(tmp_path):
+    write(str(tmp_path / 'project' / 'a.py'), b"import json\n")
+    watcher = ImportAnal.ImportWatcher([str(tmp_path / 'project')], jobs=1)
+    socket_path = str(tmp_path / 'watch.sock')
+    server = threading.Thread(target=ImportAnal.serve_watch, args=(watcher, socket_path, 0.05), daemon=True)
+    server.start()
+    for attempt in range(100):
+        if os.path.exists(socket_path) and watcher.refreshes:
+            break
+        time.sleep(0.05)
+    answer = ImportAnal.query_watch(socket_path, 'importers', 'json')
+    assert answer == {'module': 'json', 'files': [str(tmp_path / 'project' / 'a.py')]}
+
+
+def test_batch_summarizes_projects(tmp_path):
+    write(str(tmp_path / 'a' / 'main.py'),
+          b"import colorama\nimport mylocal\nfrom os import system\nimport ghost_xyz\n")
+    write(str(tmp_path / 'a' / 'mylocal.py'), b"")
+    write(str(tmp_path / 'a' / 'requirements.txt'), b"colorama==0.0.1\n")
+    write(str(tmp_path / 'b' / 'tool.py'), b"import colorama, subprocess\nimport ghost_xyz.sub\nimport mylocal\n")
+    roots = [str(tmp_path / 'a'), str(tmp_path / 'b'), str(tmp_path / 'missing')]
+    scans = ImportAnal.scan_projects(roots, jobs=2)
+    report = ImportAnal.batch_report(scans)
+    a, b, missing = report['projects']
+    assert a['modules']['mylocal']['kind'] == 'local' and b['modules']['mylocal']['kind'] == 'missing'
+    assert a['suspects'] == {'os.system': ['main.py']} and b['suspects'] == {'subprocess': ['tool.py']}
+    assert missing == {'root': roots[2], 'error': 'Not a folder'}
+    summary = report['summary']
+    assert summary['suspects'] == {'os.system': {roots[0]: ['main.py']}, 'subprocess': {roots[1]: ['tool.py']}}
+    assert list(summary['version_skew']['colorama']['versions']['0.0.1']) == [roots[0]]
+    assert summary['unknown'] == [{'module': 'ghost_xyz', 'imports': 2, 'projects': roots[:2]},
+                                  {'module': 'mylocal', 'imports': 1, 'projects': [roots[1]]}]
+
+
+def write_graph_fixture(root):
+    write(os.path.join(root, 'pkg', '__init__.py'), b"from . import a\n")
+    write(os.path.join(root, 'pkg', 'a.py'), b"from .b import helper\nimport requests.adapters\n")
+    write(os.path.join(root, 'pkg', 'b.py'), b"import pkg.a\nfrom pkg.sub import c\n")
+    write(os.path.join(root, 'pkg', 'sub', '__init__.py'), b"")
+    write(os.path.join(root, 'pkg', 'sub', 'c.py'), b"from .. import b\nfrom ..a import x\n")
+    write(os.path.join(root, 'main.py'), b"import pkg\nimport os, os.path\n")
+
+
+GRAPH_EDGES = {('main', 'pkg'): 1, ('main', 'os'): 2, ('pkg', 'pkg.a'): 1, ('pkg.a', 'pkg.b'): 1,
+               ('pkg.a', 'requests'): 1, ('pkg.b', 'pkg.a'): 1, ('pkg.b', 'pkg.sub.c'): 1,
+               ('pkg.sub.c', 'pkg.b'): 1, ('pkg.sub.c', 'pkg.a'): 1}
+
+
+def test_import_graph_resolves_relative_and_submodule_imports(tmp_path):
+    write_graph_fixture(str(tmp_path))
+    graph = ImportAnal.build_import_graph(ImportAnal.get_imports(str(tmp_path), 1), str(tmp_path))
+    edges = {(source, target): count for source, targets in graph.edges.items() for target, count in targets.items()}
+    assert edges == GRAPH_EDGES
+    assert sorted(name for name, attributes in graph.nodes.items() if attributes['external']) == ['os', 'requests']
+    assert graph.cycles() == [['pkg.a', 'pkg.b', 'pkg.sub.c']]
+    assert graph.fan_in('pkg.a') == 3 and graph.fan_out('main') == 2
+
+    collapsed = graph.collapse(1)
+    assert {source: dict(targets) for source, targets in collapsed.edges.items()} == {
+        'main': {'pkg': 1, 'os': 2}, 'pkg': {'requests': 1}, 'os': {}, 'requests': {}}
+    assert collapsed.cycles() == []
+
+
+def test_import_graph_exports_round_trip(tmp_path):
+    import re
+    import xml.etree.ElementTree as ElementTree
+    write_graph_fixture(str(tmp_path / 'project'))
+    graph = ImportAnal.build_import_graph(ImportAnal.get_imports(str(tmp_path / 'project'), 1),
+                                          str(tmp_path / 'project'))
+    external = {'os', 'requests'}
+
+    graph.export(str(tmp_path / 'graph.json'))
+    with open(tmp_path / 'graph.json') as f:
+        exported = json.load(f)
+    assert {node['id'] for node in exported['nodes'] if node['external']} == external
+    assert {(edge['source'], edge['target']): edge['count'] for edge in exported['edges']} == GRAPH_EDGES
+    assert exported['cycles'] == [['pkg.a', 'pkg.b', 'pkg.sub.c']]
+
+    graph.export(str(tmp_path / 'graph.dot'))
+    with open(tmp_path / 'graph.dot') as f:
+        dot = f.read()
+    nodes = dict(re.findall(r'^  "([^"]+)" \[shape=(\w+)\];$', dot, re.M))
+    assert {name for name, shape in nodes.items() if shape == 'box'} == external and set(nodes) == set(graph.nodes)
+    assert {(source, target): int(count) for source, target, count in
+            re.findall(r'^  "([^"]+)" -> "([^"]+)" \[weight=(\d+)\];$', dot, re.M)} == GRAPH_EDGES
+
+    graph.export(str(tmp_path / 'graph.xml'), 'graphml')
+    namespace = {'g': 'http://graphml.graphdrawing.org/xmlns'}
+    document = ElementTree.parse(str(tmp_path / 'graph.xml')).getroot().find('g:graph', namespace)
+    assert {node.get('id') for node in document.findall('g:node', namespace)
+            if node.find("g:data[@key='external']", namespace).text == 'true'} == external
+    assert {(edge.get('source'), edge.get('target')): int(edge.find('g:data', namespace).text)
+            for edge in document.findall('g:edge', namespace)} == GRAPH_EDGES
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="sendfile to a file is Linux only")
+def test_copy_file_falls_back_to_sendfile(tmp_path, monkeypatch):
+    content = os.urandom(300000)
+    write(str(tmp_path / 'source.bin'), content)
+    calls = []
+
+    def copy_file_range(*args):
+        # First chunk copied, then the kernel refuses as across filesystems
+        if not calls:
+            calls.append('copy_file_range')
+            return os.pwrite(args[1], content[:1000], 0)
+        raise OSError(18, "Invalid cross-device link")
+
+    sendfile = os.sendfile
+
+    def counting_sendfile(*args):
+        calls.append('sendfile')
+        return sendfile(*args)
+
+    monkeypatch.setattr(os, 'copy_file_range', copy_file_range, raising=False)
+    monkeypatch.setattr(os, 'sendfile', counting_sendfile)
+    assert ImportAnal.copy_file(str(tmp_path / 'source.bin'), str(tmp_path / 'copy.bin')) == len(content)
+    assert calls[:2] == ['copy_file_range', 'sendfile']
+    with open(tmp_path / 'copy.bin', 'rb') as f:
+        assert f.read() == content
+
+
+def test_dump_reuses_the_store_and_records_every_file(tmp_path):
+    import zipfile
+    with zipfile.ZipFile(str(tmp_path / 'mods.zip'), 'w') as archive:
+        archive.writestr('zipped_mod.py', "X = 1\n")
+    resolver = ImportAnal.ModuleResolver([str(tmp_path / 'mods.zip')])
+    destination = str(tmp_path / 'dump')
+
+    def dump(modules):
+        store = ImportAnal.SourceStore(str(tmp_path / 'store'))
+        with ImportAnal.ProbePool([str(tmp_path / 'mods.zip')] + sys.path, 1) as probes:
+            ImportAnal.dump_sources(modules, destination, resolver, store=store, probes=probes)
+        on_disk = {os.path.relpath(os.path.join(folder, name), destination)
+                   for folder, dirs, names in os.walk(destination) for name in names} - {'manifest.json'}
+        manifest = ImportAnal.read_dump_manifest(destination)
+        listed = {file['path'] for entry in manifest['modules'].values() for file in entry['files']}
+        assert listed == on_disk
+        return store, manifest
+
+    store, manifest = dump(['json', 'zipped_mod'])
+    assert store.objects_written == len(manifest['modules']['json']['files']) + 1
+    assert 'source_import_zipped_mod.txt' in {file['path'] for file in manifest['modules']['zipped_mod']['files']}
+    with open(os.path.join(destination, 'source_import_zipped_mod.txt')) as f:
+        assert f.read() == "X = 1\n"
+
+    store, manifest = dump(['json'])
+    assert store.objects_written == 0 and store.manifests_reused == 1
+    assert list(manifest['modules']) == ['json']
+    assert not os.path.exists(os.path.join(destination, 'source_import_zipped_mod.txt'))
+
+
+def test_batch_with_more_projects_than_workers(tmp_path):
+    roots = []
+    for number in range(6):
+        root = str(tmp_path / f'project{number}')
+        for module in range(20):
+            write(os.path.join(root, f'mod{module}.py'), f"import json\nimport ghost_{number}\n".encode())
+        roots.append(root)
+    cache_dir = str(tmp_path / 'cache')
+    for attempt in range(2):
+        scans = ImportAnal.scan_projects(roots, jobs=2, cache_dir=cache_dir)
+        assert [scan.error for scan in scans] == [None] * 6
+        assert [scan.imports.modules() for scan in scans] == [['json', f'ghost_{number}'] for number in range(6)]
+    index = ImportAnal.open_scan_index(cache_dir)
+    count, = index.connection.execute("SELECT count(*) FROM entries WHERE kind = 'imports'").fetchone()
+    index.close()
+    assert count == 120